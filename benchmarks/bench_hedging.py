@@ -0,0 +1,115 @@
+"""
+Run hedged threat model requests against local mock model servers.
+
+Starts one OpenAI compatible HTTP server per model in each scenario, e.g. a
+slow primary with a fast backup, and runs hedging.run_hedged against them
+through the LM Studio adapter. Reports which model won, how long it took,
+how many threats came back, whether the result was truncated, and which
+servers saw their request cancelled.
+
+Usage:
+    python benchmarks/bench_hedging.py [--hedge-after SECONDS]
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from providers import ProviderConfig
+from threat_model import create_threat_model_prompt, get_threat_model_hedged
+
+THREAT = {"Threat Type": "Spoofing", "Scenario": "Stolen session cookie", "Potential Impact": "Account takeover"}
+COMPLETE = json.dumps({"threat_model": [THREAT] * 3, "improvement_suggestions": []})
+# Missing the fields THREAT_MODEL_SCHEMA requires
+INVALID = json.dumps({"threat_model": [{"Threat Type": "Spoofing"}], "improvement_suggestions": []})
+
+def truncated(threats):
+    """A response cut off after `threats` complete threats."""
+    return json.dumps({"threat_model": [THREAT] * (threats + 1)})[:-30]
+
+# Each scenario lists the behaviour of every model in the chain as (status, seconds to stream the body, body)
+SCENARIOS = {
+    'slow primary': [(200, 6.0, COMPLETE), (200, 0.3, COMPLETE)],
+    'fast primary': [(200, 0.2, COMPLETE), (200, 0.2, COMPLETE)],
+    'primary error': [(500, 0, ''), (200, 0.2, COMPLETE)],
+    'invalid primary': [(200, 0.1, INVALID), (200, 0.2, COMPLETE)],
+    'truncated primary': [(200, 0.1, truncated(1)), (200, 0.2, COMPLETE)],
+    'all truncated': [(200, 0.1, truncated(1)), (200, 0.2, truncated(2))],
+    'all failing': [(500, 0, ''), (200, 0.1, INVALID)],
+}
+
+def start_server(behaviour, cancelled):
+    """Serve one model, streaming its body in small chunks. Adds the port to `cancelled` if the client disconnects."""
+    status, seconds, body = behaviour
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            if status != 200:
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.end_headers()
+                self.wfile.write(b'{"error": {"message": "mock server error"}}')
+                return
+
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/event-stream')
+            self.end_headers()
+            pieces = [body[index:index + 10] for index in range(0, len(body), 10)]
+            try:
+                for piece in pieces:
+                    time.sleep(seconds / len(pieces))
+                    chunk = {"id": "mock", "object": "chat.completion.chunk", "created": 0, "model": "mock",
+                             "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                    self.wfile.flush()
+                self.wfile.write(b"data: [DONE]\n\n")
+            except (BrokenPipeError, ConnectionResetError):
+                cancelled.add(self.server.server_port)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def run_scenario(behaviours, prompt, hedge_after):
+    cancelled = set()
+    servers = [start_server(behaviour, cancelled) for behaviour in behaviours]
+    configs = [
+        ProviderConfig("LM Studio Server", f"model-{index}", endpoint=f"http://127.0.0.1:{server.server_port}")
+        for index, server in enumerate(servers)
+    ]
+    start = time.perf_counter()
+    try:
+        result, winner = get_threat_model_hedged(configs, prompt, hedge_after=hedge_after)
+        outcome = (winner.model, len(result.output["threat_model"]), result.partial)
+    except Exception as e:
+        outcome = (f"failed: {type(e).__name__}", 0, False)
+    seconds = time.perf_counter() - start
+    # Give cancelled requests time to notice the closed connection
+    time.sleep(1)
+    for server in servers:
+        server.shutdown()
+    cancelled_models = [config.model for config, server in zip(configs, servers) if server.server_port in cancelled]
+    return outcome, seconds, cancelled_models
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--hedge-after', type=float, default=1.0, help='Seconds before a backup request is started')
+    args = parser.parse_args()
+
+    prompt = create_threat_model_prompt("Web application", "SSO", "Yes", "None", "A web shop")
+    print(f"{'scenario':<20}{'winner':<30}{'seconds':>8}{'threats':>9}{'partial':>9}  cancelled")
+    for name, behaviours in SCENARIOS.items():
+        (winner, threats, partial), seconds, cancelled_models = run_scenario(behaviours, prompt, args.hedge_after)
+        print(f"{name:<20}{winner:<30}{seconds:>8.1f}{threats:>9}{str(partial):>9}  {', '.join(cancelled_models) or '-'}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Measure how long the app takes to start, and check it loads no provider SDK.
+
+Renders the login page in a fresh interpreter under `python -X importtime`
+and reports the slowest top-level imports. Fails if any provider SDK was
+imported, since llm_clients.load_sdk() only imports them when a model is
+first called. For reference, it also reports what each SDK would add to
+startup if it were imported up front.
+
+Usage:
+    python benchmarks/bench_imports.py [--repeat N] [--top N]
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from llm_clients import SDK_REGISTRY
+
+SDK_MODULES = sorted({module for module, _ in SDK_REGISTRY.values()})
+
+# Runs the app the way `streamlit run start.py` does for a visitor who isn't logged in
+RENDER_LOGIN = '''
+import json, sys
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file("start.py", default_timeout=60)
+app.session_state.logged_in = False
+app.run()
+print(json.dumps({
+    "exceptions": [str(exception.value) for exception in app.exception],
+    "loaded": [module for module in %r if module in sys.modules],
+}))
+'''
+
+IMPORTTIME_LINE = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+def run_importtime(code):
+    """Run code in a fresh interpreter and return (stdout, {top-level module: cumulative µs})."""
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', code],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if process.returncode != 0:
+        raise RuntimeError(process.stderr.strip().splitlines()[-1] if process.stderr.strip() else 'failed')
+    modules = {}
+    for line in process.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        # Top-level imports are indented by one space, nested ones by more
+        if match and len(match.group(3)) == 1:
+            modules[match.group(4)] = modules.get(match.group(4), 0) + int(match.group(2))
+    return process.stdout, modules
+
+def best_of(code, repeat):
+    best = None
+    for _ in range(repeat):
+        stdout, modules = run_importtime(code)
+        if best is None or sum(modules.values()) < sum(best[1].values()):
+            best = (stdout, modules)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per measurement, the fastest is reported')
+    parser.add_argument('--top', type=int, default=10, help='Number of slowest imports to list')
+    args = parser.parse_args()
+
+    stdout, modules = best_of(RENDER_LOGIN % SDK_MODULES, args.repeat)
+    page = json.loads(stdout.strip().splitlines()[-1])
+    for exception in page['exceptions']:
+        print(f"login page raised: {exception}")
+
+    _, app_modules = best_of('import main, auth', args.repeat)
+    print(f"import main, auth: {sum(app_modules.values()) / 1000:.0f} ms")
+    print(f"\n{'module':<40}{'cumulative ms':>14}")
+    for module, micros in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{module:<40}{micros / 1000:>14.1f}")
+
+    print(f"\n{'provider SDK':<40}{'import ms':>14}")
+    for module in SDK_MODULES:
+        try:
+            _, sdk_modules = best_of(f'import {module}', args.repeat)
+            print(f"{module:<40}{sum(sdk_modules.values()) / 1000:>14.1f}")
+        except RuntimeError as e:
+            print(f"{module:<40}{'not installed':>14}  ({e})")
+
+    if page['exceptions']:
+        sys.exit(1)
+    if page['loaded']:
+        print(f"\nFAIL: the login page imported {', '.join(page['loaded'])}")
+        sys.exit(1)
+    print("\nOK: the login page imports no provider SDK")
+
+if __name__ == '__main__':
+    main()
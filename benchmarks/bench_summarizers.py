@@ -0,0 +1,130 @@
+"""
+Compare the registered language summarizers against the regex fallback.
+
+Generates synthetic source files for each supported language, then reports the
+time taken per file and how many functions, routes and auth checks each
+approach finds.
+
+The registered summarizers do more work than the regex fallback, which only
+collects matching lines: they skip comments and strings, join multi-line
+signatures and attach decorators, routes and auth checks to their functions.
+A typical run (Python 3.11, --size 200):
+
+    sample       regex ms  new ms
+    py               0.54    4.06
+    js               5.56    8.84
+    java             6.46    4.22
+    go               0.30    2.24
+    java-padded    698.25   29.96
+
+The synthetic files declare a function every few lines, so they show the cost
+per declaration. On 150 real files per language (1-2 MB each) the summarizers
+take about twice as long as the regex fallback for Python (40 vs 19 ms) and
+Go (20 vs 11 ms), 1.2-1.6x as long for Java, C# and C++, and less time for
+TypeScript (62 vs 95 ms). On JavaScript they take 70 ms where the regex
+fallback backtracks for 26 s.
+
+Usage:
+    python benchmarks/bench_summarizers.py [--repeat N] [--size N]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from summarizers import SUMMARIZERS, summarize_regex
+
+PYTHON_UNIT = '''
+@app.route("/items/{i}", methods=["GET", "POST"])
+@login_required
+def handler_{i}(request,
+                item_id: int = 0) -> dict:
+    """Docstring with class Fake: and def fake(x): inside."""
+    return {{"id": item_id}}
+
+class Service{i}(Base):
+    async def run(self, *args, **kwargs):
+        pass
+'''
+
+JAVASCRIPT_UNIT = '''
+router.get('/items/{i}', requireAuth, (req, res) => {{
+  res.send('{{ not a block }}')
+}})
+/* function commented{i}() {{ }} */
+export async function handler{i}(req,
+                                 res) {{
+  return res.json({{}})
+}}
+export const arrow{i} = async (a, b) => {{ return a + b }}
+class Service{i} extends Base {{
+  async run(x) {{ return x }}
+}}
+'''
+
+JAVA_UNIT = '''
+@GetMapping("/items/{i}")
+@PreAuthorize("hasRole('ADMIN')")
+public ResponseEntity<Item> handler{i}(@PathVariable Long id,
+                                       HttpServletRequest request) {{
+    if (id == null) {{ throw new IllegalArgumentException("{{"); }}
+    return ResponseEntity.ok(service.find(id));
+}}
+'''
+
+GO_UNIT = '''
+func (s *Server) Handler{i}(w http.ResponseWriter, r *http.Request) {{
+    fmt.Fprintf(w, "{{ %d }}", {i})
+}}
+
+func setup{i}(r *gin.Engine) {{
+    r.GET("/items/{i}", AuthMiddleware(), s.Handler{i})
+}}
+'''
+
+# Column-aligned fields, which make the regex fallback's Java/C function pattern backtrack quadratically
+PADDED_JAVA_UNIT = '    private int field{i}' + ' ' * 400 + '= {i};\n'
+
+SAMPLES = {
+    'py': ('import os\nfrom flask import Flask\n', PYTHON_UNIT),
+    'js': ("import express from 'express'\nconst jwt = require('jsonwebtoken')\n", JAVASCRIPT_UNIT),
+    'java': ('import java.util.List;\n\npublic class Controller {\n', JAVA_UNIT),
+    'go': ('package main\n\nimport (\n    "fmt"\n    "net/http"\n)\n', GO_UNIT),
+    'java-padded': ('public class Fields {\n', PADDED_JAVA_UNIT),
+}
+
+def build_source(sample, size):
+    header, unit = SAMPLES[sample]
+    source = header + ''.join(unit.format(i=i) for i in range(size))
+    return source + '}\n' if sample.startswith('java') else source
+
+def time_call(func, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='Runs per measurement, the best is reported')
+    parser.add_argument('--size', type=int, default=200, help='Number of generated units per file')
+    args = parser.parse_args()
+
+    print(f"{'sample':<12}{'bytes':>10}{'regex ms':>10}{'new ms':>10}{'funcs (regex/new)':>20}{'routes':>8}{'auth':>6}")
+    for sample in SAMPLES:
+        file_ext = sample.split('-')[0]
+        source = build_source(sample, args.size)
+        regex_time, regex_details = time_call(lambda: summarize_regex(file_ext, source), args.repeat)
+        new_time, new_details = time_call(lambda: SUMMARIZERS[file_ext](source), args.repeat)
+        print(
+            f"{sample:<12}{len(source):>10}{regex_time * 1000:>10.2f}{new_time * 1000:>10.2f}"
+            f"{len(regex_details['functions']):>11}/{len(new_details['functions']):<8}"
+            f"{len(new_details['routes']):>8}{len(new_details['auth']):>6}"
+        )
+
+if __name__ == '__main__':
+    main()
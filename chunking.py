@@ -0,0 +1,166 @@
+import json
+import math
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from providers import TaskResult, merge_outputs, merge_results, run_task
+from response_cache import response_cache_key
+from threat_model import json_to_markdown, with_threat_ids
+from tokens import estimate_tokens_batch
+
+# Estimated tokens of threats sent in one request. Test cases are the most verbose
+# output, a few hundred tokens per threat, and this keeps them within max_tokens=4000.
+# Every task uses the same chunks, so their prompts still share a cached prefix.
+THREAT_CHUNK_TOKENS = 800
+
+# Most chunks of one task in flight at once. The provider's rate limiter still applies.
+MAX_CHUNK_WORKERS = 8
+
+
+def chunk_threats(threats, model="gpt-4o", max_tokens=THREAT_CHUNK_TOKENS):
+    """
+    Split a threat list into consecutive chunks of roughly equal token size.
+
+    Chunks are balanced rather than filled one after the other, since the
+    chunks run in parallel and the largest one decides how long a task takes.
+
+    Args:
+        threats (list): Threats as in the threat model's "threat_model" array
+        model (str): Model used to estimate token counts
+        max_tokens (int): Estimated size a chunk should stay around. Chunks
+            can exceed it by up to half a threat.
+
+    Returns:
+        list: Lists of threats, in their original order. Empty if there are no threats.
+    """
+    threats = list(threats)
+    rows = [" | ".join(str(value) for value in threat.values()) for threat in threats]
+    sizes = estimate_tokens_batch(rows, model)
+    total = sum(sizes)
+    if total <= max_tokens:
+        return [threats] if threats else []
+
+    count = math.ceil(total / max_tokens)
+    target = total / count
+    chunks = [[] for _ in range(count)]
+    start = 0
+    for threat, size in zip(threats, sizes):
+        # Each threat goes to the chunk its middle falls into
+        chunks[min(int((start + size / 2) / target), count - 1)].append(threat)
+        start += size
+    return [chunk for chunk in chunks if chunk]
+
+def run_chunked(task, config, chunks, create_prompt, cache=None, on_chunk=None, max_workers=MAX_CHUNK_WORKERS):
+    """
+    Run a threat-based task on every chunk of the threat list in parallel and merge the results.
+
+    Each chunk is a separate run_task call with its own retries, so the task
+    takes about as long as its slowest chunk however many threats there are,
+    and no single response has to fit every threat in the output token limit.
+
+    Args:
+        task (TaskSpec): The task to run
+        config (ProviderConfig): Provider, model and credentials
+        chunks (list): Lists of threats, see chunk_threats()
+        create_prompt (callable): Builds the task prompt from a Markdown threat table
+        cache (ResponseCache): Optional response cache passed to run_task
+        on_chunk (callable): Called from the calling thread as on_chunk(results)
+            whenever a chunk finishes, where results holds a TaskResult for each
+            finished chunk and None for the rest, e.g. to show progress
+        max_workers (int): Maximum number of concurrent model calls
+
+    Returns:
+        TaskResult: The merged result, see merge_results()
+
+    Raises:
+        Exception: The error of the first chunk that failed. Chunks that haven't started are dropped.
+    """
+    prompts = [create_prompt(json_to_markdown(chunk, [])) for chunk in chunks]
+    if len(prompts) == 1:
+        return run_task(task, config, prompts[0], cache)
+
+    results = [None] * len(prompts)
+    pool = ThreadPoolExecutor(max_workers=max(1, min(int(max_workers), len(prompts))), thread_name_prefix="chunk")
+    try:
+        futures = {pool.submit(run_task, task, config, prompt, cache): index for index, prompt in enumerate(prompts)}
+        for future in as_completed(futures):
+            results[futures[future]] = future.result()
+            if on_chunk is not None:
+                on_chunk(results)
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    return merge_results(task, results)
+
+def _threat_result_key(task, config, create_prompt, threat_id):
+    # The task's prompt is part of the key, so changing the instructions invalidates stored results.
+    # The prompts only contain the threats, not the application, so a stored part is
+    # reused for any application with a threat of identical text.
+    return response_cache_key(task, config, create_prompt(threat_id))
+
+def run_incremental(task, config, threats, create_prompt, store=None, cache=None, run=None, on_chunk=None):
+    """
+    Run a threat-based task, reusing the stored results of threats that haven't changed.
+
+    Each threat's part of the output is stored under its ID, which is derived
+    from the threat's content, see threat_model.threat_id(). Only threats
+    without a stored part are sent to the model, so refreshing one STRIDE
+    category only re-scores the threats that actually changed. The output is
+    put back together in threat order. As the task prompts only contain the
+    threats, parts are shared between applications with identical threats.
+
+    Args:
+        task (TaskSpec): The task to run. Parts are only stored if it has a split function.
+        config (ProviderConfig): Provider, model and credentials
+        threats (list): The threat model's threats
+        create_prompt (callable): Builds the task prompt from a Markdown threat table
+        store (ResponseCache): Keeps the per-threat results. Nothing is reused if None.
+        cache (ResponseCache): Optional response cache passed to run_task
+        run (callable): Runs the task for a list of threats and returns a TaskResult.
+            Defaults to run_chunked() on chunk_threats() of them.
+        on_chunk (callable): Passed to run_chunked() by the default run
+
+    Returns:
+        tuple: (result, reused) with the TaskResult covering every threat and
+               the number of threats whose stored result was reused
+    """
+    threats = with_threat_ids(threats)
+    if run is None:
+        def run(pending):
+            return run_chunked(task, config, chunk_threats(pending, config.model) or [[]], create_prompt, cache, on_chunk)
+    if store is None or task.split is None:
+        return run(threats), 0
+
+    keys = {threat["ID"]: _threat_result_key(task, config, create_prompt, threat["ID"]) for threat in threats}
+    parts = {}
+    for threat_id, key in keys.items():
+        # Not counted in the cache stats, which are about model responses
+        stored = store.get(key, count=False)
+        if stored is not None:
+            try:
+                parts[threat_id] = json.loads(stored[0])
+            except (TypeError, ValueError):
+                continue
+    reused = sum(1 for threat in threats if threat["ID"] in parts)
+    pending = [threat for threat in threats if threat["ID"] not in parts]
+
+    result = None
+    unattributed = []
+    if pending:
+        result = run(pending)
+        pending_ids = {threat["ID"] for threat in pending}
+        produced = {}
+        for threat_id, part in task.split(result.output):
+            if threat_id in pending_ids:
+                produced.setdefault(threat_id, []).append(part)
+            elif threat_id not in keys:
+                # Kept in the output, but not stored since it can't be matched to a threat
+                unattributed.append(part)
+        for threat_id, outputs in produced.items():
+            parts[threat_id] = merge_outputs(task, outputs)
+            store.put(keys[threat_id], json.dumps(parts[threat_id]))
+
+    ordered = [parts[threat_id] for threat_id in dict.fromkeys(threat["ID"] for threat in threats) if threat_id in parts]
+    output = merge_outputs(task, ordered + unattributed)
+    if result is None:
+        return TaskResult(output=output, text="", cached=True), reused
+    result.output = output
+    return result, reused
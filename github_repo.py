@@ -0,0 +1,507 @@
+import base64
+import sqlite3
+import tarfile
+import threading
+import time
+from collections import defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+import requests
+from github import Github, GithubException
+
+from repo_cache import get_repo_cache
+from summarizers import summarize_file
+from token_budget import pack_summaries, score_summary
+from tokens import estimate_tokens, estimate_tokens_batch
+
+# Download timeout for repository archives, in seconds (connect, read)
+ARCHIVE_TIMEOUT = (10, 120)
+
+# Skip archive members larger than this, they are almost always generated or vendored code
+MAX_ARCHIVE_MEMBER_BYTES = 2 * 1024 * 1024
+
+# Below this many files the contents API is cheaper than downloading the whole archive
+ARCHIVE_MIN_FILES = 20
+
+# Default number of files fetched and summarized in parallel
+DEFAULT_FETCH_WORKERS = 8
+
+# How many times a single file is retried after hitting a GitHub rate limit
+MAX_RATE_LIMIT_RETRIES = 3
+
+# Fallback wait when GitHub signals a secondary rate limit without a Retry-After header
+DEFAULT_RATE_LIMIT_WAIT = 60
+
+# Token budget of a repository description when none is configured
+DEFAULT_ANALYSIS_TOKEN_LIMIT = 64000
+
+# Number of file summaries whose tokens are counted in a single encoder call
+TOKEN_COUNT_BATCH_SIZE = 64
+
+# Stop fetching repository files once the summaries collected are this many times the token budget
+CANDIDATE_BUDGET_FACTOR = 3
+
+def fetch_repo_archive(repo, ref, paths, timeout=ARCHIVE_TIMEOUT):
+    """
+    Download a repository as a single tarball and extract the requested files.
+
+    The archive is streamed straight from GitHub through tarfile's sequential
+    reader, so only one member is held in memory at a time and the whole
+    download costs a single REST call regardless of how many files are needed.
+
+    Args:
+        repo: PyGithub Repository object
+        ref (str): Branch, tag or commit SHA to download
+        paths (iterable): Repository-relative paths of the files to extract
+        timeout (tuple): Connect and read timeouts for the archive download
+
+    Returns:
+        dict: Mapping of file path to decoded text content. Files that are missing
+              from the archive, too large, or not valid UTF-8 are omitted.
+
+    Raises:
+        github.GithubException: If the archive link cannot be obtained
+        requests.exceptions.RequestException: If the archive download fails
+        tarfile.TarError: If the archive cannot be read
+    """
+    wanted = set(paths)
+    archive_url = repo.get_archive_link("tarball", ref=ref)
+
+    contents = {}
+    with requests.get(archive_url, stream=True, timeout=timeout) as response:
+        response.raise_for_status()
+        # Undo any transfer encoding so tarfile sees the raw gzip stream
+        response.raw.decode_content = True
+
+        with tarfile.open(fileobj=response.raw, mode="r|gz") as archive:
+            for member in archive:
+                if not member.isfile() or member.size > MAX_ARCHIVE_MEMBER_BYTES:
+                    continue
+
+                # GitHub prefixes every member with a single "<owner>-<repo>-<sha>/" directory
+                _, _, path = member.name.partition('/')
+                if path not in wanted:
+                    continue
+
+                file_obj = archive.extractfile(member)
+                if file_obj is None:
+                    continue
+                try:
+                    contents[path] = file_obj.read().decode()
+                except UnicodeDecodeError:
+                    # Skip binary files, matching the per-file fallback behaviour
+                    continue
+
+                if len(contents) == len(wanted):
+                    break
+
+    return contents
+
+
+def rate_limit_wait(exc):
+    """
+    Work out how long to wait after a GitHub rate limit response.
+
+    Honours the Retry-After header used for secondary rate limits, and the
+    x-ratelimit-reset timestamp sent when the primary quota is exhausted.
+
+    Args:
+        exc (GithubException): The exception raised by PyGithub
+
+    Returns:
+        float: Seconds to wait, or None if the error is not a rate limit
+    """
+    if exc.status not in (403, 429):
+        return None
+
+    headers = {key.lower(): value for key, value in (exc.headers or {}).items()}
+    retry_after = headers.get('retry-after')
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0)
+        except ValueError:
+            return DEFAULT_RATE_LIMIT_WAIT
+
+    if headers.get('x-ratelimit-remaining') == '0' and 'x-ratelimit-reset' in headers:
+        try:
+            return max(float(headers['x-ratelimit-reset']) - time.time(), 0) + 1
+        except ValueError:
+            return DEFAULT_RATE_LIMIT_WAIT
+
+    # Secondary rate limits are reported as 403s that mention the limit in the message
+    if 'rate limit' in str(exc.data).lower():
+        return DEFAULT_RATE_LIMIT_WAIT
+
+    return None
+
+
+class RateLimitGate:
+    """
+    Shared pause point for worker threads.
+
+    When one worker is rate limited every other worker waits too, instead of
+    each of them tripping the same limit in turn.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._resume_at = 0.0
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.monotonic() + seconds)
+
+    def wait(self):
+        while True:
+            with self._lock:
+                remaining = self._resume_at - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(remaining)
+
+
+def fetch_file_content(repo, ref, path, gate=None):
+    """
+    Fetch and decode a single file through the GitHub contents API.
+
+    Args:
+        repo: PyGithub Repository object
+        ref (str): Branch, tag or commit SHA to read from
+        path (str): Repository-relative path of the file
+        gate (RateLimitGate): Optional gate shared with other workers
+
+    Returns:
+        str: The decoded file content
+
+    Raises:
+        github.GithubException: If the file cannot be fetched
+        UnicodeDecodeError: If the file is not valid UTF-8
+    """
+    gate = gate or RateLimitGate()
+    for attempt in range(MAX_RATE_LIMIT_RETRIES + 1):
+        gate.wait()
+        try:
+            content = repo.get_contents(path, ref=ref)
+            return base64.b64decode(content.content).decode()
+        except GithubException as e:
+            wait = rate_limit_wait(e)
+            if wait is None or attempt == MAX_RATE_LIMIT_RETRIES:
+                raise
+            gate.pause(wait)
+
+
+def process_repo_files(repo, ref, paths, process, contents=None, max_workers=DEFAULT_FETCH_WORKERS, skip_fetch=None):
+    """
+    Fetch and process repository files on a bounded thread pool.
+
+    Results are yielded in the same order as `paths`, so callers that stop
+    once a budget is reached always stop at the same file. Only a small
+    window of files is in flight at once, and files that have not started yet
+    are cancelled when the caller stops iterating.
+
+    Args:
+        repo: PyGithub Repository object
+        ref (str): Branch, tag or commit SHA to read from
+        paths (list): Repository-relative paths, in the order results are wanted
+        process (callable): Called as process(path, content) on a worker thread
+        contents (dict): Optional pre-fetched path to content mapping (e.g. from
+                         fetch_repo_archive). When given, no API calls are made and
+                         paths missing from it are skipped.
+        max_workers (int): Maximum number of files fetched and processed concurrently
+        skip_fetch (set): Paths whose content is not needed, e.g. because a cached
+                          result exists. `process` is called with content=None.
+
+    Yields:
+        tuple: (path, result) where result is the return value of `process`, or
+               None if the file could not be fetched, decoded or processed
+    """
+    gate = RateLimitGate()
+    skip_fetch = skip_fetch or set()
+
+    def run(path):
+        try:
+            if path in skip_fetch:
+                content = None
+            elif contents is not None:
+                if path not in contents:
+                    return None
+                content = contents[path]
+            else:
+                content = fetch_file_content(repo, ref, path, gate)
+            return process(path, content)
+        except Exception:
+            # Skip files that can't be fetched or decoded
+            return None
+
+    max_workers = max(1, int(max_workers))
+    window = max_workers * 2
+    path_iter = iter(paths)
+
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="github-fetch") as pool:
+        pending = deque()
+        try:
+            for path in path_iter:
+                pending.append((path, pool.submit(run, path)))
+                if len(pending) >= window:
+                    break
+
+            while pending:
+                path, future = pending.popleft()
+                next_path = next(path_iter, None)
+                if next_path is not None:
+                    pending.append((next_path, pool.submit(run, next_path)))
+                yield path, future.result()
+        finally:
+            # The caller stopped early (e.g. token budget reached), drop queued work
+            for _, future in pending:
+                future.cancel()
+
+def resolve_head_commit(repo_url, github_api_key):
+    """
+    Return the SHA of the head of a GitHub repository's default branch.
+
+    This is the commit describe_repository() would analyse, so it tells
+    whether a previous description of the repository is still current.
+
+    Args:
+        repo_url (str): URL of the repository, e.g. https://github.com/owner/repo
+        github_api_key (str): GitHub API token
+    """
+    parts = repo_url.split('/')
+    repo = Github(github_api_key).get_repo(f"{parts[-2]}/{parts[-1]}")
+    return repo.get_branch(repo.default_branch).commit.sha
+
+def describe_repository(repo_url, github_api_key, token_limit=DEFAULT_ANALYSIS_TOKEN_LIMIT, token_estimation_model="gpt-4o",
+                        fetch_workers=DEFAULT_FETCH_WORKERS, archive_fetch=True, use_cache=True,
+                        on_progress=None, on_warning=None):
+    """
+    Summarize a GitHub repository's default branch into an application description for threat modelling.
+
+    The README comes first, followed by summaries of the most relevant code
+    files that fit in the token limit. Analyses are cached per commit, and
+    file summaries per blob, so unchanged repositories and files aren't
+    fetched or summarized again.
+
+    Args:
+        repo_url (str): URL of the repository, e.g. https://github.com/owner/repo
+        github_api_key (str): GitHub API token
+        token_limit (int): Token budget of the description, 70% of which is used
+        token_estimation_model (str): Model whose tokenizer is used to count tokens
+        fetch_workers (int): Files downloaded and summarized in parallel
+        archive_fetch (bool): Download the branch as one archive when enough files are needed
+        use_cache (bool): Use the on-disk analysis and summary cache
+        on_progress (callable): Called as on_progress(fraction, status) while the files are analyzed
+        on_warning (callable): Called with a message about anything that limits the analysis
+
+    Returns:
+        str: The application description
+    """
+    if on_progress is None:
+        on_progress = lambda fraction, status: None
+    if on_warning is None:
+        on_warning = lambda message: None
+
+    # Extract owner and repo name from URL
+    parts = repo_url.split('/')
+    owner = parts[-2]
+    repo_name = parts[-1]
+
+    # Initialize PyGithub
+    # Size the connection pool for the parallel file fetches, and leave request
+    # pacing to the rate limit handling in process_repo_files
+    g = Github(
+        github_api_key,
+        pool_size=fetch_workers,
+        seconds_between_requests=None
+    )
+
+    # Get the repository
+    repo = g.get_repo(f"{owner}/{repo_name}")
+
+    # Get the default branch
+    default_branch = repo.default_branch
+
+    # Resolve the branch head so analyses can be cached per commit
+    commit_sha = repo.get_branch(default_branch).commit.sha
+
+    # Analyze files
+    file_summaries = defaultdict(list)
+
+    # Return a previous analysis of the same commit straight from the on-disk cache
+    repo_cache = None
+    if use_cache:
+        try:
+            repo_cache = get_repo_cache()
+        except (OSError, sqlite3.Error):
+            # Caching is best effort, e.g. the cache directory may not be writable
+            repo_cache = None
+    if repo_cache is not None:
+        cached_description = repo_cache.get_analysis(repo.full_name, commit_sha, token_limit, token_estimation_model)
+        if cached_description is not None:
+            return cached_description
+
+    # Get the tree of the default branch
+    tree = repo.get_git_tree(commit_sha, recursive=True)
+
+    # Reserve some tokens for the model's response (typically 20-30% of the context window)
+    # This ensures the model has enough space to generate a response
+    analysis_token_limit = int(token_limit * 0.7)
+
+    on_progress(0, "Analyzing repository structure...")
+
+    # Get all code files
+    code_files = [file for file in tree.tree if file.type == "blob" and file.path.endswith(
+        ('.py', '.js', '.ts', '.jsx', '.tsx', '.html', '.css', '.java', '.go', '.rb', '.c', '.cpp', '.h', '.cs', '.php')
+    )]
+
+    # Reuse summaries of files whose blob is unchanged since a previous analysis
+    blob_shas = {file.path: file.sha for file in code_files}
+    cached_summaries = repo_cache.get_file_summaries(blob_shas) if repo_cache is not None else {}
+    new_summaries = {}
+    uncached_paths = [file.path for file in code_files if file.path not in cached_summaries]
+
+    # Download the whole branch as a single archive rather than one API call per file,
+    # unless only a handful of files changed since the last analysis
+    archive_contents = None
+    if archive_fetch and len(uncached_paths) >= ARCHIVE_MIN_FILES:
+        on_progress(0, "Downloading repository archive...")
+        try:
+            archive_contents = fetch_repo_archive(
+                repo,
+                commit_sha,
+                uncached_paths + ["README.md", "readme.md"]
+            )
+        except (GithubException, requests.exceptions.RequestException, tarfile.TarError):
+            # Fall back to fetching files individually through the contents API
+            archive_contents = None
+
+    # First, get the README to prioritize it
+    readme_content = ""
+    readme_tokens = 0
+    if archive_contents is not None:
+        readme_content = archive_contents.get("README.md") or archive_contents.get("readme.md") or ""
+        if readme_content:
+            readme_tokens = estimate_tokens(readme_content, token_estimation_model)
+        else:
+            on_warning("No README.md found in the repository.")
+    else:
+        try:
+            readme_file = repo.get_contents("README.md", ref=commit_sha)
+            readme_content = base64.b64decode(readme_file.content).decode()
+            readme_tokens = estimate_tokens(readme_content, token_estimation_model)
+        except:
+            try:
+                # Try lowercase readme.md as fallback
+                readme_file = repo.get_contents("readme.md", ref=commit_sha)
+                readme_content = base64.b64decode(readme_file.content).decode()
+                readme_tokens = estimate_tokens(readme_content, token_estimation_model)
+            except:
+                on_warning("No README.md found in the repository.")
+
+    # Calculate how many tokens we can use for code analysis
+    # Reserve at least 30% of the token limit for code analysis
+    code_token_limit = max(int(analysis_token_limit * 0.3), analysis_token_limit - readme_tokens)
+
+    # If README is too large, truncate it
+    if readme_tokens > analysis_token_limit * 0.7:
+        # Truncate README to 70% of the analysis token limit
+        truncation_ratio = (analysis_token_limit * 0.7) / readme_tokens
+        max_readme_chars = int(len(readme_content) * truncation_ratio)
+        readme_content = readme_content[:max_readme_chars] + "...\n(README truncated due to length)\n\n"
+        readme_tokens = estimate_tokens(readme_content, token_estimation_model)
+
+    # Update progress
+    on_progress(0.2, "Analyzing code files...")
+
+    # Sort files by importance, using the same path signals the summary packer scores on
+    code_files.sort(key=lambda file: -score_summary(file.path, ""))
+
+    file_count = len(code_files)
+
+    # Download and summarize files on a worker pool. Results come back in
+    # sorted order so the token limit cut-off is deterministic.
+    def summarize_repo_file(path, content):
+        summary = cached_summaries.get(path)
+        if summary is None:
+            summary = summarize_file(path, content)
+            new_summaries[path] = summary
+        return summary
+
+    file_results = process_repo_files(
+        repo,
+        commit_sha,
+        [file.path for file in code_files],
+        summarize_repo_file,
+        contents=archive_contents,
+        max_workers=fetch_workers,
+        skip_fetch=set(cached_summaries)
+    )
+
+    # Collect summaries in priority order. Once there is comfortably more material
+    # than fits in the budget, stop fetching and let the packer choose the best subset.
+    result_batches = iter(lambda: list(islice(file_results, TOKEN_COUNT_BATCH_SIZE)), [])
+    candidates = []
+    candidate_tokens = 0
+    fetched_files = 0
+    unreadable_files = 0
+    for batch in result_batches:
+        fetched_files += len(batch)
+
+        # Update progress
+        progress_percent = 0.2 + (0.7 * (fetched_files / file_count))
+        on_progress(min(progress_percent, 1.0), f"Analyzing file {fetched_files}/{file_count}: {batch[-1][0]}")
+
+        # Skip files that can't be fetched or decoded
+        batch_candidates = [(file_path, summary) for file_path, summary in batch if summary is not None]
+        unreadable_files += len(batch) - len(batch_candidates)
+        candidates.extend(batch_candidates)
+        candidate_tokens += sum(estimate_tokens_batch([summary for _, summary in batch_candidates], token_estimation_model))
+
+        if candidate_tokens > code_token_limit * CANDIDATE_BUDGET_FACTOR:
+            file_results.close()
+            break
+
+    # Pick the summaries, shrinking some where needed, that give the most value within the budget
+    on_progress(0.9, "Selecting the most relevant files...")
+    packed_summaries, pack_stats = pack_summaries(candidates, code_token_limit, token_estimation_model)
+    for file_path, summary in packed_summaries:
+        file_summaries[file_path.split('.')[-1]].append(summary)
+    processed_files = len(packed_summaries)
+
+    if pack_stats['shrunk']:
+        file_summaries["info"].append(f"{pack_stats['shrunk']} file summaries were shortened to fit the token limit.")
+    if processed_files + unreadable_files < file_count:
+        file_summaries["info"].append(f"Analysis truncated: {file_count - processed_files - unreadable_files} more files not analyzed due to token limit.")
+
+    if repo_cache is not None:
+        repo_cache.put_file_summaries(blob_shas, new_summaries)
+
+    # Compile the analysis into a system description
+    system_description = f"Repository: {repo_url}\n\n"
+
+    if readme_content:
+        system_description += "README.md Content:\n"
+        system_description += readme_content + "\n\n"
+
+    for file_type, summaries in file_summaries.items():
+        system_description += f"{file_type.upper()} Files:\n"
+        for summary in summaries:
+            system_description += summary + "\n"
+        system_description += "\n"
+
+    # Add token usage information
+    estimated_total_tokens = estimate_tokens(system_description, token_estimation_model)
+    system_description += "\nRepository Analysis Summary:\n"
+    system_description += f"- Files analyzed: {processed_files} of {file_count} total files\n"
+    system_description += f"- Token usage estimate: ~{estimated_total_tokens} tokens\n"
+    system_description += f"- Token limit configured: {token_limit} tokens\n"
+
+    # Show a warning if we're close to the token limit
+    if estimated_total_tokens > token_limit * 0.9:
+        on_warning(f"⚠️ The GitHub analysis is using approximately {estimated_total_tokens} tokens, which is close to your configured limit of {token_limit}. Consider increasing the token limit in the sidebar settings if you need more comprehensive analysis.")
+
+    if repo_cache is not None:
+        repo_cache.put_analysis(repo.full_name, commit_sha, token_limit, token_estimation_model, system_description)
+
+    return system_description
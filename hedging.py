@@ -0,0 +1,185 @@
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import CancelledError, ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from providers import stream_task
+from retry import get_retry_policy, retry_call
+
+# Latency percentile of the primary model after which a backup request is started
+HEDGE_PERCENTILE = 0.95
+
+# Hedge delay, in seconds, used until enough latencies have been recorded for a model
+DEFAULT_HEDGE_DELAY = 60.0
+
+# Latencies needed before the percentile is trusted, and how many recent ones are kept
+MIN_LATENCY_SAMPLES = 5
+LATENCY_WINDOW = 50
+
+# How often the coordinator checks whether a request asked for a backup to be started
+HEDGE_POLL_INTERVAL = 0.25
+
+
+class LatencyTracker:
+    """Recent successful call latencies per provider, model and task, shared by all sessions."""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, key, seconds):
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=self.window)).append(seconds)
+
+    def percentile(self, key, fraction):
+        """Return the latency at `fraction` (e.g. 0.95), or None if there are too few samples."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, math.ceil(fraction * len(samples)) - 1)]
+
+
+LATENCY = LatencyTracker()
+
+def _latency_key(task, config):
+    return config.provider, config.model, task.name
+
+def hedge_delay(task, config, hedge_after=None):
+    """
+    Seconds to give a request before racing a backup against it.
+
+    Args:
+        task (TaskSpec): The task being run
+        config (ProviderConfig): The provider and model of the running request
+        hedge_after (float): Fixed delay. If None or 0, the model's HEDGE_PERCENTILE
+            latency for this task is used, or DEFAULT_HEDGE_DELAY until it is known.
+    """
+    if hedge_after:
+        return float(hedge_after)
+    learned = LATENCY.percentile(_latency_key(task, config), HEDGE_PERCENTILE)
+    return learned if learned is not None else DEFAULT_HEDGE_DELAY
+
+
+def _run_leg(task, config, prompt, cache, cancelled, failing):
+    """
+    Run one provider's request, streaming so that it can be abandoned between chunks.
+
+    Sets `failing` as soon as an attempt fails, so the next provider in the
+    chain can start while this one backs off and retries.
+    """
+    def attempt():
+        # Don't retry on behalf of a request that has already lost
+        if cancelled.is_set():
+            raise CancelledError()
+        stream = stream_task(task, config, prompt, cache=cache)
+        chunks = iter(stream)
+        try:
+            for _ in chunks:
+                if cancelled.is_set():
+                    raise CancelledError()
+        finally:
+            # Closes the provider's response, so a cancelled request stops generating
+            chunks.close()
+        if cancelled.is_set():
+            raise CancelledError()
+        return stream.result
+
+    return retry_call(attempt, get_retry_policy(config.provider),
+                      on_retry=lambda attempt, wait, exc: failing.set())
+
+def _complete_items(task, result):
+    """Number of complete items a truncated response kept, see providers.TaskResult.partial."""
+    return len(result.output.get(task.stream_array_key, []))
+
+def run_hedged(task, configs, prompt, cache=None, hedge_after=None, validate=None):
+    """
+    Run a task against a chain of providers, returning the first valid response.
+
+    The first config is the primary. The next one in the chain is started when
+    the running requests have been going for longer than the hedge delay
+    (hedging), or as soon as one of them fails (failover). Every request that
+    is still running is cancelled once a valid response arrives. A truncated
+    response also starts the next provider, but is kept in case no complete
+    one arrives.
+
+    Args:
+        task (TaskSpec): The task to run
+        configs (list): ProviderConfigs in order of preference
+        prompt (str): The task prompt
+        cache (ResponseCache): Optional response cache
+        hedge_after (float): Fixed hedge delay in seconds, see hedge_delay()
+        validate (callable): Called with the parsed output, returns whether the
+            complete response is usable. Truncated responses are not validated.
+
+    Returns:
+        tuple: (result, config) with the winning TaskResult and the ProviderConfig that produced it.
+               If every response was truncated or failed, the truncated one with the most
+               complete items is returned, with result.partial set.
+
+    Raises:
+        Exception: The last error if every provider in the chain failed without a truncated response
+    """
+    configs = list(configs)
+    cancelled = threading.Event()
+    # Set when the most recently started request fails an attempt
+    failing = threading.Event()
+    pool = ThreadPoolExecutor(max_workers=len(configs), thread_name_prefix="hedge")
+    pending = {}
+    errors = []
+    # The truncated (result, config) with the most complete items so far
+    best_partial = None
+    next_config = 0
+    next_start = None
+
+    def start_next():
+        nonlocal next_config, next_start, failing
+        config = configs[next_config]
+        next_config += 1
+        failing = threading.Event()
+        pending[pool.submit(_run_leg, task, config, prompt, cache, cancelled, failing)] = (config, time.monotonic())
+        # No more backups to start once the last provider is running
+        next_start = time.monotonic() + hedge_delay(task, config, hedge_after) if next_config < len(configs) else None
+
+    try:
+        start_next()
+        while pending:
+            if next_start is None:
+                # Every provider has started, so just wait for one of them to finish
+                timeout = None
+            else:
+                timeout = max(min(next_start - time.monotonic(), HEDGE_POLL_INTERVAL), 0)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                config, started = pending.pop(future)
+                error = future.exception()
+                if error is None:
+                    result = future.result()
+                    if result.partial:
+                        if best_partial is None or _complete_items(task, result) > _complete_items(task, best_partial[0]):
+                            best_partial = result, config
+                        error = ValueError(f"{config.provider} {config.model} returned a truncated response")
+                    elif validate is not None and not validate(result.output):
+                        error = ValueError(f"{config.provider} {config.model} returned an invalid response")
+                    else:
+                        LATENCY.record(_latency_key(task, config), time.monotonic() - started)
+                        return result, config
+                errors.append(error)
+                if next_config < len(configs):
+                    # Fail over to the next provider straight away
+                    start_next()
+
+            slow = next_start is not None and time.monotonic() >= next_start
+            if next_config < len(configs) and (failing.is_set() or slow):
+                start_next()
+
+        if best_partial is not None:
+            return best_partial
+        raise errors[-1]
+    finally:
+        # Stop the losers at their next chunk and drop anything that hasn't started
+        cancelled.set()
+        pool.shutdown(wait=False, cancel_futures=True)
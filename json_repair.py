@@ -0,0 +1,358 @@
+import json
+from dataclasses import dataclass, field
+
+# Repairs reported by repair_json
+REPAIR_CODE_FENCE = "code fence"
+REPAIR_LEADING_TEXT = "leading text"
+REPAIR_TRAILING_TEXT = "trailing text"
+REPAIR_COMMENTS = "comments"
+REPAIR_TRAILING_COMMAS = "trailing commas"
+REPAIR_MISSING_COMMAS = "missing commas"
+REPAIR_MISMATCHED_BRACKETS = "mismatched brackets"
+REPAIR_TRUNCATED = "truncated"
+
+
+class JsonCleaner:
+    """
+    Remove the non-JSON noise models add, one chunk at a time.
+
+    Drops // and /* */ comments and trailing commas before a closing bracket,
+    leaving string contents untouched. Because it keeps its state between
+    calls to feed(), it works on streamed text where a comment or a trailing
+    comma may be split across chunks.
+
+    Attributes:
+        comments_removed (int): Number of comments dropped so far
+        trailing_commas_removed (int): Number of trailing commas dropped so far
+    """
+
+    def __init__(self):
+        self.in_string = False
+        self.escape = False
+        self.comment = None
+        self.pending_slash = False
+        self.pending_star = False
+        self.pending_comma = None
+        self.comments_removed = 0
+        self.trailing_commas_removed = 0
+
+    def feed(self, text):
+        """
+        Clean the next chunk of text.
+
+        Returns:
+            str: The cleaned text that is certain so far. A trailing slash or
+                 comma is held back until the next chunk shows what follows it.
+        """
+        out = []
+        for char in text:
+            self.push(char, out)
+        return ''.join(out)
+
+    def flush(self):
+        """Return anything still held back at the end of the text."""
+        out = []
+        self.finish(out)
+        return ''.join(out)
+
+    def push(self, char, out):
+        """Clean one character, appending whatever can be emitted to `out`."""
+        if self.in_string:
+            if self.escape:
+                self.escape = False
+            elif char == '\\':
+                self.escape = True
+            elif char == '"':
+                self.in_string = False
+            # Nothing is held back inside a string
+            out.append(char)
+            return
+
+        if self.comment == '//':
+            if char == '\n':
+                self.comment = None
+                self._emit(char, out)
+            return
+        if self.comment == '/*':
+            if self.pending_star and char == '/':
+                self.comment = None
+                self.pending_star = False
+            else:
+                self.pending_star = char == '*'
+            return
+
+        if self.pending_slash:
+            self.pending_slash = False
+            if char in '/*':
+                self.comment = '//' if char == '/' else '/*'
+                self.comments_removed += 1
+                return
+            self._emit('/', out)
+
+        if char == '/':
+            self.pending_slash = True
+            return
+        self._emit(char, out)
+        if char == '"':
+            self.in_string = True
+
+    def finish(self, out):
+        """Append anything still held back at the end of the text to `out`."""
+        if self.pending_slash:
+            self._emit('/', out)
+            self.pending_slash = False
+        if self.pending_comma is not None:
+            out.append(self.pending_comma)
+            self.pending_comma = None
+
+    def _emit(self, char, out):
+        if self.pending_comma is not None:
+            if char.isspace():
+                self.pending_comma += char
+                return
+            if char in '}]':
+                # Trailing comma, keep only the whitespace after it
+                out.append(self.pending_comma[1:])
+                self.trailing_commas_removed += 1
+            else:
+                out.append(self.pending_comma)
+            self.pending_comma = None
+        if char == ',' and not self.in_string:
+            self.pending_comma = ','
+            return
+        out.append(char)
+
+
+def clean_json_text(text):
+    """
+    Remove comments and trailing commas from JSON text, leaving strings untouched.
+
+    Args:
+        text (str): JSON text as written by a model
+
+    Returns:
+        str: Text that json.loads accepts if the remaining structure is valid
+    """
+    cleaner = JsonCleaner()
+    return cleaner.feed(text) + cleaner.flush()
+
+
+@dataclass
+class JsonRepair:
+    """
+    The outcome of repair_json.
+
+    Attributes:
+        text (str): The repaired JSON text
+        repairs (list): The REPAIR_* names of every repair that was needed, empty if none
+    """
+    text: str
+    repairs: list = field(default_factory=list)
+
+    @property
+    def truncated(self):
+        """Whether the JSON was cut off and had to be closed."""
+        return REPAIR_TRUNCATED in self.repairs
+
+
+class _Repairer:
+    """Single pass over model output, see repair_json."""
+
+    def __init__(self):
+        self.out = []
+        self.repairs = []
+        self.stack = []
+        # For each open container, what comes next: key, colon, value or comma
+        self.expect = []
+        self.in_string = False
+        self.escape = False
+        self.string_is_key = False
+        # (length of out, open containers) at points where the JSON could be cut and closed
+        self.safe_points = []
+        self.done = False
+
+    def note(self, repair):
+        if repair not in self.repairs:
+            self.repairs.append(repair)
+
+    def mark_safe(self):
+        self.safe_points.append((len(self.out), tuple(self.stack)))
+
+    def value_done(self):
+        if self.expect:
+            self.expect[-1] = 'comma'
+
+    def char(self, c):
+        out = self.out
+        if self.in_string:
+            out.append(c)
+            if self.escape:
+                self.escape = False
+            elif c == '\\':
+                self.escape = True
+            elif c == '"':
+                self.in_string = False
+                if self.string_is_key:
+                    self.expect[-1] = 'colon'
+                else:
+                    self.value_done()
+                    self.mark_safe()
+            return
+
+        if c.isspace():
+            out.append(c)
+            return
+
+        expect = self.expect[-1] if self.expect else 'value'
+        if c in '{["' and expect == 'comma':
+            # Two values with nothing between them, e.g. }{ in a list of objects
+            out.append(',')
+            self.note(REPAIR_MISSING_COMMAS)
+            expect = self.expect[-1] = 'key' if self.stack[-1] == '{' else 'value'
+
+        if c in '{[':
+            out.append(c)
+            self.stack.append(c)
+            self.expect.append('key' if c == '{' else 'value')
+            self.mark_safe()
+        elif c in '}]':
+            if not self.stack:
+                return
+            opener = self.stack.pop()
+            self.expect.pop()
+            closer = '}' if opener == '{' else ']'
+            if c != closer:
+                self.note(REPAIR_MISMATCHED_BRACKETS)
+            out.append(closer)
+            if not self.stack:
+                self.done = True
+                return
+            self.value_done()
+            self.mark_safe()
+        elif c == '"':
+            out.append(c)
+            self.in_string = True
+            self.string_is_key = expect == 'key'
+        elif c == ',':
+            if expect == 'comma':
+                self.mark_safe()
+            out.append(c)
+            if self.stack:
+                self.expect[-1] = 'key' if self.stack[-1] == '{' else 'value'
+        elif c == ':':
+            out.append(c)
+            if self.expect:
+                self.expect[-1] = 'value'
+        else:
+            # Part of a number, true, false or null
+            out.append(c)
+            if expect == 'value':
+                self.value_done()
+
+    def close_truncated(self):
+        """Cut the output back to the last point where the JSON was complete, then close it."""
+        self.note(REPAIR_TRUNCATED)
+        index = len(self.safe_points) - 1
+        while index > 0:
+            length, stack = self.safe_points[index]
+            # Don't keep an empty object or list that was only just opened inside a list
+            just_opened = length and self.out[length - 1] in '{[' and len(stack) > 1 and stack[-2] == '['
+            if not just_opened:
+                break
+            index -= 1
+        length, stack = self.safe_points[index] if self.safe_points else (0, ())
+        del self.out[length:]
+        while self.out and self.out[-1].isspace():
+            self.out.pop()
+        if self.out and self.out[-1] == ',':
+            self.out.pop()
+        self.out.extend('}' if opener == '{' else ']' for opener in reversed(stack))
+
+
+def repair_json(text):
+    """
+    Extract and repair the JSON value in model output in a single pass.
+
+    Handles the usual ways models break JSON: markdown code fences and
+    prose around the value, // and /* */ comments, trailing commas, missing
+    commas between values, mismatched closing brackets, and output that was
+    cut off, which is closed after the last complete value. String contents
+    are never changed.
+
+    Args:
+        text (str): The model output
+
+    Returns:
+        JsonRepair: The repaired text and the repairs that were applied. If the
+                    output contains no object or array it is returned unchanged.
+    """
+    starts = [index for index in (text.find('{'), text.find('[')) if index >= 0]
+    if not starts:
+        return JsonRepair(text)
+    start = min(starts)
+
+    repairer = _Repairer()
+    prefix = text[:start]
+    if '```' in prefix:
+        repairer.note(REPAIR_CODE_FENCE)
+    elif prefix.strip():
+        repairer.note(REPAIR_LEADING_TEXT)
+
+    cleaner = JsonCleaner()
+    cleaned = []
+    end = len(text)
+    for index in range(start, len(text)):
+        cleaner.push(text[index], cleaned)
+        # The cleaner may emit several characters at once, e.g. a held back comma and whitespace
+        for c in ''.join(cleaned):
+            repairer.char(c)
+            if repairer.done:
+                break
+        cleaned.clear()
+        if repairer.done:
+            end = index + 1
+            break
+    else:
+        cleaner.finish(cleaned)
+        for c in ''.join(cleaned):
+            if not repairer.done:
+                repairer.char(c)
+
+    if cleaner.comments_removed:
+        repairer.note(REPAIR_COMMENTS)
+    if cleaner.trailing_commas_removed:
+        repairer.note(REPAIR_TRAILING_COMMAS)
+    if not repairer.done:
+        repairer.close_truncated()
+
+    suffix = text[end:].strip()
+    if suffix.startswith('```'):
+        repairer.note(REPAIR_CODE_FENCE)
+    elif suffix:
+        repairer.note(REPAIR_TRAILING_TEXT)
+
+    return JsonRepair(''.join(repairer.out), repairer.repairs)
+
+
+def parse_json(text):
+    """
+    Parse the JSON value in model output, repairing it if needed.
+
+    Well-formed output is parsed directly, so the repair pass only runs when
+    json.loads fails.
+
+    Args:
+        text (str): The model output
+
+    Returns:
+        tuple: (value, repairs) where repairs lists the REPAIR_* names applied
+
+    Raises:
+        json.JSONDecodeError: If the output can't be repaired into valid JSON
+    """
+    try:
+        return json.loads(text), []
+    except json.JSONDecodeError:
+        pass
+    repair = repair_json(text)
+    return json.loads(repair.text), repair.repairs
@@ -0,0 +1,126 @@
+import json
+
+from json_repair import JsonCleaner
+
+
+class JsonArrayStream:
+    """
+    Incrementally extract the objects of one array from streamed JSON.
+
+    Each object in the array is parsed and returned as soon as its closing
+    brace arrives, so results can be shown while the model is still writing
+    and are not lost if the stream is cut off. Comments and trailing commas
+    are tolerated, and text before the JSON such as a markdown fence is
+    ignored.
+
+    Args:
+        key (str): Name of the array in the top-level object, e.g. "threat_model".
+                   If None, the top-level value itself is expected to be the array.
+
+    Attributes:
+        items (list): Every object parsed so far
+    """
+
+    def __init__(self, key=None):
+        self.key = key
+        self.items = []
+        self._cleaner = JsonCleaner()
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+        self._string = []
+        self._last_string = None
+        self._current_key = None
+        self._array_depth = None
+        self._element = None
+
+    def feed(self, text):
+        """
+        Consume the next chunk of the stream.
+
+        Returns:
+            list: Objects completed by this chunk, in order
+        """
+        return self._consume(self._cleaner.feed(text))
+
+    def close(self):
+        """Consume anything held back at the end of the stream and return newly completed objects."""
+        return self._consume(self._cleaner.flush())
+
+    def _consume(self, text):
+        completed = []
+        for char in text:
+            if self._element is not None:
+                self._element.append(char)
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == '\\':
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    self._last_string = ''.join(self._string)
+                else:
+                    self._string.append(char)
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string = []
+            elif char == ':':
+                self._current_key = self._last_string
+            elif char == '{':
+                if self._array_depth is not None and len(self._stack) == self._array_depth and self._element is None:
+                    self._element = ['{']
+                self._stack.append('{')
+            elif char == '[':
+                self._stack.append('[')
+                if self._array_depth is None and self._is_target_array():
+                    self._array_depth = len(self._stack)
+            elif char in '}]':
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                if char == '}' and self._element is not None and len(self._stack) == self._array_depth:
+                    item = self._parse_element()
+                    if item is not None:
+                        self.items.append(item)
+                        completed.append(item)
+                elif char == ']' and self._array_depth is not None and len(self._stack) < self._array_depth:
+                    # The target array is finished, ignore the rest of the document
+                    self._array_depth = -1
+            elif char == ',':
+                self._current_key = None
+        return completed
+
+    def _is_target_array(self):
+        if self.key is None:
+            return len(self._stack) == 1
+        return len(self._stack) == 2 and self._stack[0] == '{' and self._current_key == self.key
+
+    def _parse_element(self):
+        text = ''.join(self._element)
+        self._element = None
+        try:
+            item = json.loads(text)
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
+
+
+def extract_array_items(text, key=None):
+    """
+    Recover every complete object of an array from JSON text, even if the text is cut off.
+
+    Args:
+        text (str): JSON text, possibly incomplete
+        key (str): Name of the array in the top-level object, or None for a top-level array
+
+    Returns:
+        list: The complete objects found
+    """
+    stream = JsonArrayStream(key)
+    stream.feed(text)
+    stream.close()
+    return stream.items
@@ -0,0 +1,179 @@
+import atexit
+import hashlib
+import importlib
+import threading
+from collections import OrderedDict
+
+import requests
+from requests.adapters import HTTPAdapter
+
+# Maximum number of SDK clients kept alive. Each holds its own connection pool,
+# so the least recently used one is dropped once this many distinct
+# provider/credential/endpoint combinations have been seen.
+MAX_CLIENTS = 32
+
+# Connection pool size for the shared requests session (Ollama, image analysis)
+HTTP_POOL_SIZE = 16
+
+# Provider SDKs, imported on first use so that a deployment only loads the SDK of the
+# providers it actually calls, and the login page loads none. Maps the name used with
+# load_sdk() to the module and, for client classes, the attribute to take from it.
+SDK_REGISTRY = {
+    "OpenAI": ("openai", "OpenAI"),
+    "AzureOpenAI": ("openai", "AzureOpenAI"),
+    "Anthropic": ("anthropic", "Anthropic"),
+    "Mistral": ("mistralai", "Mistral"),
+    "Groq": ("groq", "Groq"),
+    "genai": ("google.generativeai", None),
+}
+
+_clients = OrderedDict()
+_clients_lock = threading.Lock()
+_session = None
+_session_lock = threading.Lock()
+
+def load_sdk(name):
+    """
+    Import a provider SDK, or a class from it, the first time it is needed.
+
+    Args:
+        name (str): A key of SDK_REGISTRY, e.g. "Anthropic"
+
+    Returns:
+        The SDK module, or the class named in SDK_REGISTRY
+    """
+    module_name, attribute = SDK_REGISTRY[name]
+    # Python caches imported modules, so only the first call pays for the import
+    module = importlib.import_module(module_name)
+    return getattr(module, attribute) if attribute else module
+
+def credential_fingerprint(secret):
+    """Hash a credential so raw API keys are never used as registry keys."""
+    return hashlib.sha256((secret or '').encode()).hexdigest()
+
+def _get_client(key, factory):
+    """
+    Return the cached client for key, creating it with factory() on first use.
+
+    Args:
+        key (tuple): Provider name followed by the endpoint and credential fingerprint
+        factory (callable): Builds a new client
+
+    Returns:
+        The shared client
+    """
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+
+    # Build outside the lock, constructing an SDK client can be slow
+    client = factory()
+    with _clients_lock:
+        existing = _clients.get(key)
+        if existing is not None:
+            # Another thread won the race, keep its client
+            _close_client(client)
+            return existing
+        _clients[key] = client
+        if len(_clients) > MAX_CLIENTS:
+            # Don't close the evicted client here, a request may still be using it.
+            # Its connections are released when it is garbage collected.
+            _clients.popitem(last=False)
+    return client
+
+# SDK clients are built with max_retries=0 so that retry.retry_call alone decides
+# when and how long to back off, instead of both layers retrying
+def get_openai_client(api_key, base_url=None):
+    """
+    Return a shared OpenAI client. Also used for OpenAI compatible servers such as LM Studio.
+
+    Args:
+        api_key (str): The API key
+        base_url (str): Optional base URL of an OpenAI compatible server
+
+    Returns:
+        OpenAI: A client reused across calls, reruns and sessions
+    """
+    key = ('openai', base_url, credential_fingerprint(api_key))
+    return _get_client(key, lambda: load_sdk("OpenAI")(api_key=api_key, base_url=base_url, max_retries=0))
+
+def get_azure_openai_client(azure_endpoint, api_key, api_version):
+    """Return a shared Azure OpenAI client for the endpoint, key and API version."""
+    key = ('azure', azure_endpoint, api_version, credential_fingerprint(api_key))
+    return _get_client(key, lambda: load_sdk("AzureOpenAI")(
+        azure_endpoint=azure_endpoint,
+        api_key=api_key,
+        api_version=api_version,
+        max_retries=0,
+    ))
+
+def get_anthropic_client(api_key):
+    """Return a shared Anthropic client for the API key."""
+    key = ('anthropic', credential_fingerprint(api_key))
+    return _get_client(key, lambda: load_sdk("Anthropic")(api_key=api_key, max_retries=0))
+
+def get_mistral_client(api_key):
+    """Return a shared Mistral client for the API key."""
+    key = ('mistral', credential_fingerprint(api_key))
+    # The Mistral SDK has no max_retries, an explicit None retry_config turns its retries off
+    return _get_client(key, lambda: load_sdk("Mistral")(api_key=api_key, retry_config=None))
+
+def get_groq_client(api_key):
+    """Return a shared Groq client for the API key."""
+    key = ('groq', credential_fingerprint(api_key))
+    return _get_client(key, lambda: load_sdk("Groq")(api_key=api_key, max_retries=0))
+
+def get_http_session():
+    """
+    Return the process-wide requests session used for raw HTTP calls.
+
+    Keeps connections to Ollama, LM Studio and the OpenAI REST API alive between
+    requests instead of opening a new connection (and TLS handshake) per call.
+
+    Returns:
+        requests.Session: The shared session
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+def _close_client(client):
+    close = getattr(client, 'close', None)
+    if close is None:
+        # Mistral clients are closed through their context manager
+        close = getattr(client, '__exit__', None)
+        if close is None:
+            return
+        try:
+            close(None, None, None)
+        except Exception:
+            pass
+        return
+    try:
+        close()
+    except Exception:
+        pass
+
+def close_all_clients():
+    """Close every pooled client and the shared session. Registered to run at interpreter exit."""
+    global _session
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for client in clients:
+        _close_client(client)
+
+    with _session_lock:
+        if _session is not None:
+            _session.close()
+            _session = None
+
+atexit.register(close_all_clients)
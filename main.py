@@ -3,21 +3,79 @@
 import base64
 import streamlit as st
 import streamlit.components.v1 as components
-from github import Github
-from collections import defaultdict
-import re
 import os
+import sqlite3
 from dotenv import load_dotenv
-from openai import OpenAI
 import requests
 import json
 import auth as auth
-
-from threat_model import create_threat_model_prompt, get_threat_model, get_threat_model_azure, get_threat_model_google, get_threat_model_mistral, get_threat_model_ollama, get_threat_model_anthropic, get_threat_model_lm_studio, get_threat_model_groq, json_to_markdown, get_image_analysis, create_image_analysis_prompt
-from attack_tree import create_attack_tree_prompt, get_attack_tree, get_attack_tree_azure, get_attack_tree_mistral, get_attack_tree_ollama, get_attack_tree_anthropic, get_attack_tree_lm_studio, get_attack_tree_groq, get_attack_tree_google
-from mitigations import create_mitigations_prompt, get_mitigations, get_mitigations_azure, get_mitigations_google, get_mitigations_mistral, get_mitigations_ollama, get_mitigations_anthropic, get_mitigations_lm_studio, get_mitigations_groq
-from test_cases import create_test_cases_prompt, get_test_cases, get_test_cases_azure, get_test_cases_google, get_test_cases_mistral, get_test_cases_ollama, get_test_cases_anthropic, get_test_cases_lm_studio, get_test_cases_groq
-from dread import create_dread_assessment_prompt, get_dread_assessment, get_dread_assessment_azure, get_dread_assessment_google, get_dread_assessment_mistral, get_dread_assessment_ollama, get_dread_assessment_anthropic, get_dread_assessment_lm_studio, get_dread_assessment_groq, dread_json_to_markdown
+from github_repo import describe_repository, DEFAULT_FETCH_WORKERS, DEFAULT_ANALYSIS_TOKEN_LIMIT
+from response_cache import get_response_cache, MemoryResponseCache, RESPONSE_CACHE_BACKENDS
+from report import generate_report, REPORT_SECTIONS, SKIPPED_SECTION_ERROR
+from model_discovery import get_local_models
+
+from providers import ProviderConfig, run_task, stream_task, merge_outputs, USAGE_STATS, AZURE_API_VERSION
+from retry import get_retry_policy, retry_call, RETRY_STATS
+from rate_limit import rate_limit_stats
+from threat_model import (
+    create_threat_model_prompt, THREAT_MODEL_TASK, json_to_markdown, get_image_analysis, create_image_analysis_prompt,
+    get_threat_model_hedged, get_threat_model_by_category, with_threat_ids, get_threat_categories, replace_threat_categories,
+    STRIDE_CATEGORIES
+)
+from attack_tree import create_attack_tree_prompt, ATTACK_TREE_TASK
+from mitigations import create_mitigations_prompt, MITIGATIONS_TASK
+from test_cases import create_test_cases_prompt, TEST_CASES_TASK
+from dread import create_dread_assessment_prompt, DREAD_TASK, dread_json_to_markdown
+from chunking import chunk_threats, run_chunked, run_incremental
+
+# Session state keys holding each hosted provider's API key, used to build backup model configs
+PROVIDER_API_KEY_STATE = {
+    "OpenAI API": 'openai_api_key',
+    "Anthropic API": 'anthropic_api_key',
+    "Google AI API": 'google_api_key',
+    "Mistral API": 'mistral_api_key',
+    "Groq API": 'groq_api_key',
+}
+
+# Define token limits for specific model+provider combinations
+# Format: {"provider:model": {"default": default_value, "max": max_value}}
+MODEL_TOKEN_LIMITS = {
+    # OpenAI models
+    "OpenAI API:gpt-4.5-preview": {"default": 64000, "max": 128000},
+    "OpenAI API:gpt-4o": {"default": 64000, "max": 128000},
+    "OpenAI API:gpt-4o-mini": {"default": 64000, "max": 128000},
+    "OpenAI API:o1": {"default": 64000, "max": 200000},
+    "OpenAI API:o3-mini": {"default": 64000, "max": 200000},
+
+    # Claude models
+    "Anthropic API:claude-3-7-sonnet-latest": {"default": 64000, "max": 200000},
+    "Anthropic API:claude-3-7-sonnet-thinking": {"default": 64000, "max": 200000},
+    "Anthropic API:claude-3-5-sonnet-latest": {"default": 64000, "max": 200000},
+    "Anthropic API:claude-3-5-haiku-latest": {"default": 64000, "max": 200000},
+
+    # Mistral models
+    "Mistral API:mistral-large-latest": {"default": 64000, "max": 131000},
+    "Mistral API:mistral-small-latest": {"default": 16000, "max": 32000},
+
+    # Google models
+    "Google AI API:gemini-2.0-flash": {"default": 120000, "max": 1000000},
+    "Google AI API:gemini-2.0-flash-lite": {"default": 120000, "max": 1000000},
+    "Google AI API:gemini-1.5-pro": {"default": 240000, "max": 2000000},
+
+    # Groq models
+    "Groq API:deepseek-r1-distill-llama-70b": {"default": 64000, "max": 128000},
+    "Groq API:llama-3.3-70b-versatile": {"default": 64000, "max": 128000},
+    "Groq API:llama-3.1-8b-instant": {"default": 64000, "max": 128000},
+    "Groq API:mixtral-8x7b-32768": {"default": 16000, "max": 32000},
+    "Groq API:gemma-9b-it": {"default": 4000, "max": 8192},
+
+    # Azure models - conservative defaults
+    "Azure OpenAI Service:default": {"default": 64000, "max": 128000},
+
+    # Ollama and LM Studio - conservative defaults
+    "Ollama:default": {"default": 8000, "max": 32000},
+    "LM Studio Server:default": {"default": 8000, "max": 32000}
+}
 
 # Inject custom CSS
 st.markdown("""
@@ -31,87 +89,79 @@ def core_app():
 
     # ------------------ Helper Functions ------------------ #
 
-    # Function to get available models from LM Studio Server
+    # Function to get available models from LM Studio Server. The list is served from memory and
+    # refreshed in the background, see model_discovery, so only the first lookup waits for the server.
     def get_lm_studio_models(endpoint):
-        try:
-            client = OpenAI(
-                base_url=f"{endpoint}/v1",
-                api_key="not-needed"
-            )
-            models = client.models.list()
-            return [model.id for model in models.data]
-        except requests.exceptions.ConnectionError:
+        discovered = get_local_models("LM Studio Server", endpoint)
+        if discovered.error is None:
+            return discovered.models
+        if discovered.models:
+            # The server answered before, so keep offering the models it had
+            st.caption(f"LM Studio Server is not responding. Showing the models it had {discovered.age:.0f}s ago.")
+            return discovered.models
+        if isinstance(discovered.error, requests.exceptions.ConnectionError):
             st.error("""Unable to connect to LM Studio Server. Please ensure:
     1. LM Studio is running and the local server is started
     2. The endpoint URL is correct (default: http://localhost:1234)
     3. No firewall is blocking the connection""")
-            return ["local-model"]
-        except Exception as e:
-            st.error(f"""Error fetching models from LM Studio Server: {e}
+        else:
+            st.error(f"""Error fetching models from LM Studio Server: {discovered.error}
         
     Please check:
     1. LM Studio is properly configured and running
     2. You have loaded a model in LM Studio
     3. The server is running in local inference mode""")
-            return ["local-model"]
+        return ["local-model"]
 
     def get_ollama_models(ollama_endpoint):
         """
         Get list of available models from Ollama.
+
+        The list is served from memory and refreshed in the background, see
+        model_discovery, so only the first lookup waits for Ollama.
     
         Args:
             ollama_endpoint (str): The URL of the Ollama endpoint (e.g., 'http://localhost:11434')
         
         Returns:
             list: List of available model names
-        
-        Raises:
-            requests.exceptions.RequestException: If there's an error communicating with the Ollama endpoint
         """
-        if not ollama_endpoint.endswith('/'):
-            ollama_endpoint = ollama_endpoint + '/'
-    
-        url = ollama_endpoint + "api/tags"
-    
-        try:
-            response = requests.get(url, timeout=10)  # Add timeout
-            response.raise_for_status()  # Raise exception for bad status codes
-            models_data = response.json()
-        
-            # Extract model names from the response
-            model_names = [model['name'] for model in models_data['models']]
-            if not model_names:
+        discovered = get_local_models("Ollama", ollama_endpoint)
+        if discovered.error is None:
+            if not discovered.models:
                 st.warning("""No models found in Ollama. Please ensure you have:
     1. Pulled at least one model using 'ollama pull <model_name>'
     2. The model download completed successfully""")
                 return ["local-model"]
-            return model_names
-            
-        except requests.exceptions.ConnectionError:
+            return discovered.models
+        if discovered.models:
+            # Ollama answered before, so keep offering the models it had
+            st.caption(f"Ollama is not responding. Showing the models it had {discovered.age:.0f}s ago.")
+            return discovered.models
+
+        error = discovered.error
+        if isinstance(error, requests.exceptions.ConnectionError):
             st.error("""Unable to connect to Ollama. Please ensure:
     1. Ollama is installed and running
     2. The endpoint URL is correct (default: http://localhost:11434)
     3. No firewall is blocking the connection""")
-            return ["local-model"]
-        except requests.exceptions.Timeout:
+        elif isinstance(error, requests.exceptions.Timeout):
             st.error("""Request to Ollama timed out. Please check:
     1. Ollama is responding and not overloaded
     2. Your network connection is stable
     3. The endpoint URL is accessible""")
-            return ["local-model"]
-        except (KeyError, json.JSONDecodeError):
+        elif isinstance(error, (KeyError, json.JSONDecodeError)):
             st.error("""Received invalid response from Ollama. Please verify:
     1. You're running a compatible version of Ollama
     2. The endpoint URL is pointing to Ollama and not another service""")
-            return ["local-model"]
-        except Exception as e:
-            st.error(f"""Unexpected error fetching Ollama models: {str(e)}
+        else:
+            st.error(f"""Unexpected error fetching Ollama models: {str(error)}
         
     Please check:
     1. Ollama is properly installed and running
     2. You have pulled at least one model
     3. You have sufficient system resources""")
-            return ["local-model"]
+        return ["local-model"]
 
     # Function to get user input for the application description and key details
     def get_input():
@@ -145,274 +195,29 @@ def core_app():
 
         return input_text
 
-    def estimate_tokens(text, model="gpt-4o"):
-        """
-        Estimate the number of tokens in a text string.
-        Uses tiktoken for OpenAI models, or falls back to a character-based approximation.
-    
-        Args:
-            text: The text to estimate tokens for
-            model: The model to use for estimation (default: gpt-4o)
-        
-        Returns:
-            Estimated token count
-        """
-        try:
-            # Try to use tiktoken for accurate estimation
-            enc = tiktoken.encoding_for_model(model)
-            return len(enc.encode(text))
-        except (ImportError, KeyError, ValueError):
-            # Fall back to character-based approximation
-            # Different languages have different token densities
-            # English: ~4 chars per token, Chinese: ~1-2 chars per token
-            return len(text) // 4  # Conservative estimate for English text
-
+    # Function to describe a GitHub repository with the settings from the sidebar, showing progress while it runs
     def analyze_github_repo(repo_url):
-        # Extract owner and repo name from URL
-        parts = repo_url.split('/')
-        owner = parts[-2]
-        repo_name = parts[-1]
-
-        # Initialize PyGithub
-        g = Github(st.session_state.get('github_api_key', ''))
-
-        # Get the repository
-        repo = g.get_repo(f"{owner}/{repo_name}")
-
-        # Get the default branch
-        default_branch = repo.default_branch
-
-        # Get the tree of the default branch
-        tree = repo.get_git_tree(default_branch, recursive=True)
-
-        # Analyze files
-        file_summaries = defaultdict(list)
-        total_tokens = 0
-    
-        # Get the configured token limit from session state, or use a default
-        token_limit = st.session_state.get('token_limit', 64000)
-    
-        # Get the selected model for token estimation
-        model_provider = st.session_state.get('model_provider', 'OpenAI API')
-        selected_model = st.session_state.get('selected_model', 'gpt-4o')
-    
-        # Determine which model to use for token estimation
+        # Count tokens with the selected model's tokenizer where it is known
         token_estimation_model = "gpt-4o"  # Default fallback
-        if model_provider == "OpenAI API":
-            token_estimation_model = selected_model
-    
-        # Reserve some tokens for the model's response (typically 20-30% of the context window)
-        # This ensures the model has enough space to generate a response
-        analysis_token_limit = int(token_limit * 0.7)
-    
-        # Progress bar for GitHub analysis
-        progress_bar = st.progress(0)
-        status_text = st.empty()
-        status_text.text("Analyzing repository structure...")
-    
-        # First, get the README to prioritize it
-        readme_content = ""
-        readme_tokens = 0
-        try:
-            readme_file = repo.get_contents("README.md", ref=default_branch)
-            readme_content = base64.b64decode(readme_file.content).decode()
-            readme_tokens = estimate_tokens(readme_content, token_estimation_model)
-        except:
-            try:
-                # Try lowercase readme.md as fallback
-                readme_file = repo.get_contents("readme.md", ref=default_branch)
-                readme_content = base64.b64decode(readme_file.content).decode()
-                readme_tokens = estimate_tokens(readme_content, token_estimation_model)
-            except:
-                st.warning("No README.md found in the repository.")
-    
-        # Calculate how many tokens we can use for code analysis
-        # Reserve at least 30% of the token limit for code analysis
-        code_token_limit = max(int(analysis_token_limit * 0.3), analysis_token_limit - readme_tokens)
-    
-        # If README is too large, truncate it
-        if readme_tokens > analysis_token_limit * 0.7:
-            # Truncate README to 70% of the analysis token limit
-            truncation_ratio = (analysis_token_limit * 0.7) / readme_tokens
-            max_readme_chars = int(len(readme_content) * truncation_ratio)
-            readme_content = readme_content[:max_readme_chars] + "...\n(README truncated due to length)\n\n"
-            readme_tokens = estimate_tokens(readme_content, token_estimation_model)
-    
-        # Update progress
-        progress_bar.progress(0.2)
-        status_text.text("Analyzing code files...")
-    
-        # Get all code files
-        code_files = [file for file in tree.tree if file.type == "blob" and file.path.endswith(
-            ('.py', '.js', '.ts', '.html', '.css', '.java', '.go', '.rb', '.c', '.cpp', '.h', '.cs', '.php')
-        )]
-    
-        # Sort files by importance (you can customize this logic)
-        # For example, prioritize main files, configuration files, etc.
-        def file_importance(file):
-            # Lower score means higher importance
-            if file.path.lower() in ['main.py', 'app.py', 'index.js', 'package.json', 'config.json']:
-                return 0
-            if 'test' in file.path.lower() or 'spec' in file.path.lower():
-                return 3
-            if file.path.endswith(('.py', '.js', '.ts', '.java', '.go')):
-                return 1
-            return 2
-    
-        code_files.sort(key=file_importance)
-    
-        # Process files until we reach the token limit
-        total_tokens = readme_tokens
-        file_count = len(code_files)
-        processed_files = 0
-    
-        for i, file in enumerate(code_files):
-            # Update progress
-            progress_percent = 0.2 + (0.8 * (i / file_count))
-            progress_bar.progress(min(progress_percent, 1.0))
-            status_text.text(f"Analyzing file {i+1}/{file_count}: {file.path}")
-        
-            try:
-                content = repo.get_contents(file.path, ref=default_branch)
-                decoded_content = base64.b64decode(content.content).decode()
-            
-                # Summarize the file content
-                summary = summarize_file(file.path, decoded_content)
-                summary_tokens = estimate_tokens(summary, token_estimation_model)
-            
-                # Check if adding this summary would exceed our token limit
-                if total_tokens + summary_tokens > analysis_token_limit:
-                    # If we're about to exceed the limit, add a note and stop processing
-                    file_summaries["info"].append(f"Analysis truncated: {file_count - i} more files not analyzed due to token limit.")
-                    break
-            
-                file_summaries[file.path.split('.')[-1]].append(summary)
-                total_tokens += summary_tokens
-                processed_files += 1
-            except Exception as e:
-                # Skip files that can't be decoded
-                continue
-    
-        # Clear progress indicators
-        progress_bar.empty()
-        status_text.empty()
-    
-        # Compile the analysis into a system description
-        system_description = f"Repository: {repo_url}\n\n"
-    
-        if readme_content:
-            system_description += "README.md Content:\n"
-            system_description += readme_content + "\n\n"
-
-        for file_type, summaries in file_summaries.items():
-            system_description += f"{file_type.upper()} Files:\n"
-            for summary in summaries:
-                system_description += summary + "\n"
-            system_description += "\n"
-    
-        # Add token usage information
-        estimated_total_tokens = estimate_tokens(system_description, token_estimation_model)
-        system_description += f"\nRepository Analysis Summary:\n"
-        system_description += f"- Files analyzed: {processed_files} of {file_count} total files\n"
-        system_description += f"- Token usage estimate: ~{estimated_total_tokens} tokens\n"
-        system_description += f"- Token limit configured: {token_limit} tokens\n"
-    
-        # Show a warning if we're close to the token limit
-        if estimated_total_tokens > token_limit * 0.9:
-            st.warning(f"⚠️ The GitHub analysis is using approximately {estimated_total_tokens} tokens, which is close to your configured limit of {token_limit}. Consider increasing the token limit in the sidebar settings if you need more comprehensive analysis.")
-    
-        return system_description
+        if st.session_state.get('model_provider', 'OpenAI API') == "OpenAI API":
+            token_estimation_model = st.session_state.get('selected_model', 'gpt-4o')
 
-    def summarize_file(file_path, content):
-        """
-        Summarize a file's content by extracting key components.
-        Adapts the level of detail based on file size and importance.
-    
-        Args:
-            file_path: Path to the file
-            content: Content of the file
-        
-        Returns:
-            A string summary of the file
-        """
-        # Determine file type
-        file_ext = file_path.split('.')[-1].lower() if '.' in file_path else ''
-    
-        # Initialize summary
-        summary = f"File: {file_path}\n"
-    
-        # For very large files, be more selective
-        is_large_file = len(content) > 10000
-    
-        # Extract imports based on file type
-        imports = []
-        if file_ext in ['py']:
-            imports = re.findall(r'^import .*|^from .* import .*', content, re.MULTILINE)
-        elif file_ext in ['js', 'ts']:
-            imports = re.findall(r'^import .*|^const .* = require\(.*\)|^import .* from .*', content, re.MULTILINE)
-        elif file_ext in ['java']:
-            imports = re.findall(r'^import .*;', content, re.MULTILINE)
-        elif file_ext in ['go']:
-            imports = re.findall(r'^import \(.*?\)|^import ".*"', content, re.MULTILINE | re.DOTALL)
-    
-        # Extract functions based on file type
-        functions = []
-        if file_ext in ['py']:
-            functions = re.findall(r'def .*\(.*\):', content, re.MULTILINE)
-        elif file_ext in ['js', 'ts']:
-            functions = re.findall(r'function .*\(.*\) {|const .* = \(.*\) =>|.*: function\(.*\)', content, re.MULTILINE)
-        elif file_ext in ['java', 'c', 'cpp', 'cs']:
-            functions = re.findall(r'(public|private|protected|static|\s) +[\w\<\>\[\]]+\s+(\w+) *\([^\)]*\) *(\{?|[^;])', content, re.MULTILINE)
-            functions = [' '.join(f).strip() for f in functions]
-        elif file_ext in ['go']:
-            functions = re.findall(r'func .*\(.*\).*{', content, re.MULTILINE)
-    
-        # Extract classes based on file type
-        classes = []
-        if file_ext in ['py']:
-            classes = re.findall(r'class .*:', content, re.MULTILINE)
-        elif file_ext in ['js', 'ts']:
-            classes = re.findall(r'class .* {', content, re.MULTILINE)
-        elif file_ext in ['java', 'c', 'cpp', 'cs']:
-            classes = re.findall(r'(public|private|protected|static|\s) +(class|interface) +(\w+)', content, re.MULTILINE)
-            classes = [' '.join(c).strip() for c in classes]
-    
-        # Add imports to summary (limit based on file size)
-        import_limit = 5 if not is_large_file else 3
-        if imports:
-            summary += "Imports:\n" + "\n".join(imports[:import_limit])
-            if len(imports) > import_limit:
-                summary += f"\n... ({len(imports) - import_limit} more imports)"
-            summary += "\n"
-    
-        # Add classes to summary (limit based on file size)
-        class_limit = 5 if not is_large_file else 3
-        if classes:
-            summary += "Classes:\n" + "\n".join(classes[:class_limit])
-            if len(classes) > class_limit:
-                summary += f"\n... ({len(classes) - class_limit} more classes)"
-            summary += "\n"
-    
-        # Add functions to summary (limit based on file size)
-        function_limit = 10 if not is_large_file else 5
-        if functions:
-            summary += "Functions:\n" + "\n".join(functions[:function_limit])
-            if len(functions) > function_limit:
-                summary += f"\n... ({len(functions) - function_limit} more functions)"
-            summary += "\n"
-    
-        # For configuration files (JSON, YAML, etc.), try to extract key information
-        if file_ext in ['json', 'yaml', 'yml', 'toml', 'ini']:
-            # Just include a snippet of the beginning for config files
-            config_preview = content[:500] + ("..." if len(content) > 500 else "")
-            summary += "Configuration Content Preview:\n" + config_preview + "\n"
-    
-        # For README or documentation files, include a brief excerpt
-        if 'readme' in file_path.lower() or file_ext in ['md', 'rst', 'txt']:
-            doc_preview = content[:300] + ("..." if len(content) > 300 else "")
-            summary += "Content Preview:\n" + doc_preview + "\n"
-    
-        return summary
+        progress = st.empty()
+        try:
+            return describe_repository(
+                repo_url,
+                st.session_state.get('github_api_key', ''),
+                token_limit=st.session_state.get('token_limit', DEFAULT_ANALYSIS_TOKEN_LIMIT),
+                token_estimation_model=token_estimation_model,
+                fetch_workers=st.session_state.get('github_fetch_workers', DEFAULT_FETCH_WORKERS),
+                archive_fetch=st.session_state.get('github_archive_fetch', True),
+                use_cache=st.session_state.get('github_cache', True),
+                on_progress=lambda fraction, status: progress.progress(fraction, text=status),
+                on_warning=st.warning,
+            )
+        finally:
+            # Clear progress indicators
+            progress.empty()
 
     # Function to render Mermaid diagram
     def mermaid(code: str, height: int = 500) -> None:
@@ -430,6 +235,129 @@ def core_app():
             height=height,
         )
 
+    # Function to show the thinking or reasoning a model returned alongside its output, any JSON repairs and prompt cache use
+    def show_reasoning(result):
+        if result is None:
+            return
+        if result.repairs:
+            st.caption("Fixed up the model's JSON: " + ", ".join(result.repairs))
+        if result.usage and (result.usage['cache_read_tokens'] or result.usage['cache_write_tokens']):
+            st.caption(
+                f"Prompt cache: {result.usage['cache_read_tokens']:,} of {result.usage['input_tokens']:,} input tokens read from the cache, "
+                f"{result.usage['cache_write_tokens']:,} written"
+            )
+        if result.thinking:
+            with st.expander("View Claude's thinking process"):
+                st.markdown(result.thinking)
+        if result.reasoning:
+            with st.expander("View model's reasoning process"):
+                st.markdown(result.reasoning)
+
+    # Function to say how many threats' results were reused instead of being generated again
+    def show_reused_threats(reused_threats):
+        if reused_threats:
+            st.caption(f"Reused the results of {reused_threats} unchanged threats, only new or changed threats were sent to the model.")
+
+    # Function to display a threat model with a download button
+    def show_threat_model(threat_model):
+        st.json(threat_model)
+        st.download_button(
+            label="Download Threat Model",
+            data=json.dumps(threat_model, indent=4),
+            file_name="threat_model.json",
+            mime="application/json",
+        )
+
+    # Function to display an attack tree's Mermaid code and diagram
+    def show_attack_tree(mermaid_code):
+        # Display the generated attack tree code
+        st.write("Attack Tree Code:")
+        st.code(mermaid_code)
+
+        # Visualise the attack tree using the Mermaid custom component
+        st.write("Attack Tree Diagram Preview:")
+        mermaid(mermaid_code)
+
+        col1, col2, col3, col4, col5 = st.columns([1,1,1,1,1])
+
+        with col1:
+            # Add a button to allow the user to download the Mermaid code
+            st.download_button(
+                label="Download Diagram Code",
+                data=mermaid_code,
+                file_name="attack_tree.md",
+                mime="text/plain",
+                help="Download the Mermaid code for the attack tree diagram."
+            )
+
+        with col2:
+            # Add a button to allow the user to open the Mermaid Live editor
+            st.link_button("Open Mermaid Live", "https://mermaid.live")
+
+        with col3:
+            # Blank placeholder
+            st.write("")
+
+        with col4:
+            # Blank placeholder
+            st.write("")
+
+        with col5:
+            # Blank placeholder
+            st.write("")
+
+    # Function to display mitigations with a download button
+    def show_mitigations(mitigations_markdown):
+        st.markdown(mitigations_markdown)
+
+        st.markdown("")
+
+        # Add a button to allow the user to download the mitigations as a Markdown file
+        st.download_button(
+            label="Download Mitigations",
+            data=mitigations_markdown,
+            file_name="mitigations.md",
+            mime="text/markdown",
+        )
+
+    # Function to display a DREAD assessment as a Markdown table with a download button
+    def show_dread_assessment(dread_assessment):
+        # Convert the DREAD assessment JSON to Markdown
+        dread_assessment_markdown = dread_json_to_markdown(dread_assessment)
+
+        # Add debug information about the assessment
+        if not dread_assessment.get("Risk Assessment"):
+            st.warning("Debug: The DREAD assessment response is empty. Please ensure you have generated a threat model first.")
+
+        # Display the DREAD assessment with a header
+        st.markdown("## DREAD Risk Assessment")
+        st.markdown("The table below shows the DREAD risk assessment for each identified threat. The Risk Score is calculated as the average of the five DREAD categories.")
+
+        # Display the DREAD assessment in Markdown format
+        st.markdown(dread_assessment_markdown, unsafe_allow_html=False)
+
+        # Add a button to allow the user to download the DREAD assessment as a Markdown file
+        st.download_button(
+            label="Download DREAD Risk Assessment",
+            data=dread_assessment_markdown,
+            file_name="dread_assessment.md",
+            mime="text/markdown",
+        )
+
+    # Function to display Gherkin test cases with a download button
+    def show_test_cases(test_cases_markdown):
+        st.markdown(test_cases_markdown)
+
+        st.markdown("")
+
+        # Add a button to allow the user to download the test cases as a Markdown file
+        st.download_button(
+            label="Download Test Cases",
+            data=test_cases_markdown,
+            file_name="test_cases.md",
+            mime="text/markdown",
+        )
+
     def load_env_variables():
         # Try to load from .env file
         if os.path.exists('.env'):
@@ -481,51 +409,10 @@ def core_app():
         lm_studio_endpoint = os.getenv('LM_STUDIO_ENDPOINT', 'http://localhost:1234')
         st.session_state['lm_studio_endpoint'] = lm_studio_endpoint
 
-    # Call this function at the start of your app
-    load_env_variables()
-
-    # ------------------ Model Token Limits ------------------ #
-
-    # Define token limits for specific model+provider combinations
-    # Format: {"provider:model": {"default": default_value, "max": max_value}}
-    model_token_limits = {
-        # OpenAI models
-        "OpenAI API:gpt-4.5-preview": {"default": 64000, "max": 128000},
-        "OpenAI API:gpt-4o": {"default": 64000, "max": 128000},
-        "OpenAI API:gpt-4o-mini": {"default": 64000, "max": 128000},
-        "OpenAI API:o1": {"default": 64000, "max": 200000},
-        "OpenAI API:o3-mini": {"default": 64000, "max": 200000},
-    
-        # Claude models
-        "Anthropic API:claude-3-7-sonnet-latest": {"default": 64000, "max": 200000},
-        "Anthropic API:claude-3-7-sonnet-thinking": {"default": 64000, "max": 200000},
-        "Anthropic API:claude-3-5-sonnet-latest": {"default": 64000, "max": 200000},
-        "Anthropic API:claude-3-5-haiku-latest": {"default": 64000, "max": 200000},
-    
-        # Mistral models
-        "Mistral API:mistral-large-latest": {"default": 64000, "max": 131000},
-        "Mistral API:mistral-small-latest": {"default": 16000, "max": 32000},
-    
-        # Google models
-        "Google AI API:gemini-2.0-flash": {"default": 120000, "max": 1000000},
-        "Google AI API:gemini-2.0-flash-lite": {"default": 120000, "max": 1000000},
-        "Google AI API:gemini-1.5-pro": {"default": 240000, "max": 2000000},
-    
-        # Groq models
-        "Groq API:deepseek-r1-distill-llama-70b": {"default": 64000, "max": 128000},
-        "Groq API:llama-3.3-70b-versatile": {"default": 64000, "max": 128000},
-        "Groq API:llama-3.1-8b-instant": {"default": 64000, "max": 128000},
-        "Groq API:mixtral-8x7b-32768": {"default": 16000, "max": 32000},
-        "Groq API:gemma-9b-it": {"default": 4000, "max": 8192},
-    
-        # Azure models - conservative defaults
-        "Azure OpenAI Service:default": {"default": 64000, "max": 128000},
-    
-        # Ollama and LM Studio - conservative defaults
-        "Ollama:default": {"default": 8000, "max": 32000},
-        "LM Studio Server:default": {"default": 8000, "max": 32000}
-    }
- 
+    # The environment doesn't change while the app is running, so it is only read once per session
+    if not st.session_state.get('env_loaded'):
+        load_env_variables()
+        st.session_state['env_loaded'] = True
 
     # Define callback for model provider change
     def on_model_provider_change():
@@ -535,8 +422,8 @@ def core_app():
     
         # Set the token limit to the default for the new provider
         provider_key = f"{new_provider}:default"
-        if provider_key in model_token_limits:
-            st.session_state.token_limit = model_token_limits[provider_key]["default"]
+        if provider_key in MODEL_TOKEN_LIMITS:
+            st.session_state.token_limit = MODEL_TOKEN_LIMITS[provider_key]["default"]
         else:
             # Fallback to a conservative default
             st.session_state.token_limit = 8000
@@ -577,13 +464,13 @@ def core_app():
         model_key = f"{model_provider}:{selected_model}"
     
         # If we have a specific limit for this model, use it
-        if model_key in model_token_limits:
-            st.session_state.token_limit = model_token_limits[model_key]["default"]
+        if model_key in MODEL_TOKEN_LIMITS:
+            st.session_state.token_limit = MODEL_TOKEN_LIMITS[model_key]["default"]
         else:
             # Otherwise use a provider default
             provider_key = f"{model_provider}:default"
-            if provider_key in model_token_limits:
-                st.session_state.token_limit = model_token_limits[provider_key]["default"]
+            if provider_key in MODEL_TOKEN_LIMITS:
+                st.session_state.token_limit = MODEL_TOKEN_LIMITS[provider_key]["default"]
     
         # Reset the current_model_key to force token limit update in Advanced Settings
         if 'current_model_key' in st.session_state:
@@ -591,12 +478,18 @@ def core_app():
 
     # ------------------ Sidebar ------------------ #
 
-    st.sidebar.image("logo.png")
+    # Statistics captions in the sidebar, filled in by whichever part of the app last called a model
+    stats_placeholders = {}
 
-    # Add instructions on how to use the app to the sidebar
-    #st.sidebar.header("How to use TARA")
+    # The sidebar is a fragment, so changing a setting reruns only the sidebar. Everything the
+    # tabs need from it is kept in the session state and read when a tab runs a task.
+    @st.fragment
+    def sidebar():
+        st.image("logo.png")
+
+        # Add instructions on how to use the app to the sidebar
+        #st.sidebar.header("How to use TARA")
 
-    with st.sidebar:
         # Add model selection input field to the sidebar
         model_provider = st.selectbox(
             "Select your preferred model provider:",
@@ -626,7 +519,7 @@ def core_app():
                 st.session_state['openai_api_key'] = openai_api_key
 
             # Add model selection input field to the sidebar
-            selected_model = st.selectbox(
+            st.selectbox(
                 "Select the model you would like to use:",
                 ["gpt-4.5-preview", "gpt-4o", "gpt-4o-mini", "o1", "o3-mini"],
                 key="selected_model",
@@ -653,7 +546,7 @@ def core_app():
                 st.session_state['anthropic_api_key'] = anthropic_api_key
 
             # Add model selection input field to the sidebar
-            anthropic_model = st.selectbox(
+            st.selectbox(
                 "Select the model you would like to use:",
                 ["claude-3-7-sonnet-latest", "claude-3-7-sonnet-thinking", "claude-3-5-sonnet-latest", "claude-3-5-haiku-latest"],
                 key="selected_model",
@@ -699,9 +592,7 @@ def core_app():
         
             st.info("Please note that you must use an 1106-preview model deployment.")
 
-            azure_api_version = '2023-12-01-preview' # Update this as needed
-
-            st.write(f"Azure API Version: {azure_api_version}")
+            st.write(f"Azure API Version: {AZURE_API_VERSION}")
 
         if model_provider == "Google AI API":
             st.markdown(
@@ -722,7 +613,7 @@ def core_app():
                 st.session_state['google_api_key'] = google_api_key
 
             # Add model selection input field to the sidebar
-            google_model = st.selectbox(
+            st.selectbox(
                 "Select the model you would like to use:",
                 ["gemini-2.0-flash", "gemini-2.0-flash-lite", "gemini-1.5-pro"],
                 key="selected_model",
@@ -749,7 +640,7 @@ def core_app():
                 st.session_state['mistral_api_key'] = mistral_api_key
 
             # Add model selection input field to the sidebar
-            mistral_model = st.selectbox(
+            st.selectbox(
                 "Select the model you would like to use:",
                 ["mistral-large-latest", "mistral-small-latest"],
                 key="selected_model",
@@ -781,7 +672,7 @@ def core_app():
                     available_models = get_ollama_models(ollama_endpoint)
 
             # Add model selection input field
-            selected_model = st.selectbox(
+            st.selectbox(
                 "Select the model you would like to use:",
                 available_models if ollama_endpoint and ollama_endpoint.startswith(('http://', 'https://')) else ["local-model"],
                 key="selected_model",
@@ -813,7 +704,7 @@ def core_app():
                     available_models = get_lm_studio_models(lm_studio_endpoint)
 
             # Add model selection input field
-            selected_model = st.selectbox(
+            st.selectbox(
                 "Select the model you would like to use:",
                 available_models if lm_studio_endpoint and lm_studio_endpoint.startswith(('http://', 'https://')) else ["local-model"],
                 key="selected_model",
@@ -840,7 +731,7 @@ def core_app():
                 st.session_state['groq_api_key'] = groq_api_key
 
             # Add model selection input field to the sidebar
-            groq_model = st.selectbox(
+            st.selectbox(
                 "Select the model you would like to use:",
                 [
                     "deepseek-r1-distill-llama-70b",
@@ -880,15 +771,15 @@ def core_app():
             max_token_limit = 128000  # Default max
             default_token_limit = 64000  # Default value
         
-            if model_key in model_token_limits:
-                max_token_limit = model_token_limits[model_key]["max"]
-                default_token_limit = model_token_limits[model_key]["default"]
+            if model_key in MODEL_TOKEN_LIMITS:
+                max_token_limit = MODEL_TOKEN_LIMITS[model_key]["max"]
+                default_token_limit = MODEL_TOKEN_LIMITS[model_key]["default"]
             else:
                 # Try provider default
                 provider_key = f"{current_provider}:default"
-                if provider_key in model_token_limits:
-                    max_token_limit = model_token_limits[provider_key]["max"]
-                    default_token_limit = model_token_limits[provider_key]["default"]
+                if provider_key in MODEL_TOKEN_LIMITS:
+                    max_token_limit = MODEL_TOKEN_LIMITS[provider_key]["max"]
+                    default_token_limit = MODEL_TOKEN_LIMITS[provider_key]["default"]
         
             # Store the current model and provider to detect changes
             current_model_key = st.session_state.get('current_model_key', '')
@@ -911,6 +802,92 @@ def core_app():
             # Store the token limit in session state
             st.session_state['token_limit'] = token_limit
 
+            st.checkbox(
+                "Download GitHub repositories as a single archive",
+                value=True,
+                key="github_archive_fetch",
+                help="Fetch the whole default branch in one request instead of one API call per file. Uncheck to fall back to per-file downloads."
+            )
+
+            st.number_input(
+                "Parallel GitHub file downloads:",
+                min_value=1,
+                max_value=32,
+                value=DEFAULT_FETCH_WORKERS,
+                step=1,
+                key="github_fetch_workers",
+                help="Maximum number of repository files downloaded and summarized at the same time. Lower this if you hit GitHub rate limits."
+            )
+
+            st.checkbox(
+                "Cache GitHub repository analyses",
+                value=True,
+                key="github_cache",
+                help="Reuse previous analyses of the same commit, and summaries of files that have not changed, from an on-disk cache."
+            )
+
+            st.checkbox(
+                "Cache model responses",
+                value=False,
+                key="response_cache_enabled",
+                help="Return the previous response when the same provider, model and prompt are submitted again, instead of calling the model."
+            )
+
+            if st.session_state['response_cache_enabled']:
+                st.selectbox(
+                    "Response cache storage:",
+                    list(RESPONSE_CACHE_BACKENDS),
+                    key="response_cache_backend",
+                    help="Memory keeps responses until the app restarts. Disk keeps them in an on-disk cache shared by all app processes."
+                )
+                # Filled in by show_stats() so the counts include the latest model calls
+                stats_placeholders['response_cache'] = st.empty()
+
+            st.checkbox(
+                "Generate each STRIDE category separately",
+                value=False,
+                key="threat_model_by_category",
+                help="Ask for the threats of each STRIDE category in its own, smaller model call, all at the same time, then merge them and drop duplicates. Faster and less likely to be cut off, at the cost of more calls. Backup models are not used in this mode."
+            )
+
+            st.checkbox(
+                "Reuse results for unchanged threats",
+                value=True,
+                key="reuse_threat_results",
+                help="Counter measures, DREAD scores and test scenarios are kept per threat, so after regenerating the threat model or refreshing some of its categories only new or changed threats are sent to the model."
+            )
+
+            # Models from other providers can back up the selected one, as long as their API key is set
+            backup_models = [
+                name for name in MODEL_TOKEN_LIMITS
+                if name != model_key and not name.endswith(":default")
+                and st.session_state.get(PROVIDER_API_KEY_STATE.get(name.split(':', 1)[0], ''))
+            ]
+            st.multiselect(
+                "Backup models for threat modelling:",
+                backup_models,
+                key="threat_model_backups",
+                help="Tried in order when the selected model fails, and raced against it when it is slow. The first complete threat model wins. Only models whose provider API key has been entered are listed."
+            )
+            if st.session_state.get('threat_model_backups'):
+                st.number_input(
+                    "Start a backup after (seconds):",
+                    min_value=0,
+                    value=0,
+                    step=5,
+                    key="hedge_after",
+                    help="How long to wait for a model before starting the next backup. 0 uses the model's 95th percentile response time from previous runs."
+                )
+
+            # Retries of rate limited or failed model calls, filled in by show_stats()
+            stats_placeholders['retry'] = st.empty()
+
+            # Time spent queued behind the shared client-side rate limits, filled in by show_stats()
+            stats_placeholders['rate_limit'] = st.empty()
+
+            # Input tokens served from the providers' prompt caches, filled in by show_stats()
+            stats_placeholders['prompt_cache'] = st.empty()
+
         st.markdown("---")
 
         # Add "About" section to the sidebar
@@ -929,6 +906,14 @@ def core_app():
         # )
         st.markdown("""---""")
 
+        show_stats()
+
+        # The tabs depend on the selected model, e.g. only some models can analyse images,
+        # so switching models reruns the whole app instead of just the sidebar
+        previous_model_key = st.session_state.get('sidebar_model_key')
+        st.session_state['sidebar_model_key'] = model_key
+        if previous_model_key is not None and previous_model_key != model_key:
+            st.rerun()
 
     # Add "Example Application Description" section to the sidebar
     # st.sidebar.header("Example Application Description")
@@ -984,6 +969,97 @@ def core_app():
     #     )
 
 
+    # Function to get the response cache, when it is enabled in Advanced Settings
+    def get_enabled_response_cache():
+        if not st.session_state.get('response_cache_enabled'):
+            return None
+        try:
+            return get_response_cache(st.session_state.get('response_cache_backend', 'Memory'))
+        except (OSError, sqlite3.Error):
+            # Caching is best effort, e.g. the cache directory may not be writable
+            return None
+
+    # Function to get where the per-threat results of the tasks built on the threat model are kept. They go in
+    # the response cache when it is enabled, so other sessions can reuse them, otherwise they last for this session.
+    def get_threat_result_store(response_cache):
+        if not st.session_state.get('reuse_threat_results', True):
+            return None
+        if response_cache is not None:
+            return response_cache
+        return st.session_state.setdefault('threat_result_store', MemoryResponseCache())
+
+    # Function to collect the provider, model and credentials selected in the sidebar in one place for every task
+    def get_provider_config():
+        model_provider = st.session_state.get('model_provider', 'OpenAI API')
+        selected_model = st.session_state.get('selected_model')
+        if model_provider == "Azure OpenAI Service":
+            return ProviderConfig(model_provider, st.session_state.get('azure_deployment_name'), api_key=st.session_state.get('azure_api_key'),
+                                  endpoint=st.session_state.get('azure_api_endpoint'), api_version=AZURE_API_VERSION)
+        if model_provider == "Ollama":
+            return ProviderConfig(model_provider, selected_model, endpoint=st.session_state['ollama_endpoint'])
+        if model_provider == "LM Studio Server":
+            return ProviderConfig(model_provider, selected_model, endpoint=st.session_state['lm_studio_endpoint'])
+        return ProviderConfig(model_provider, selected_model, api_key=st.session_state.get(PROVIDER_API_KEY_STATE[model_provider]))
+
+    # Function to list the selected model followed by the backup models for the threat model, in the order they were picked
+    def get_threat_model_configs(provider_config):
+        return [provider_config] + [
+            ProviderConfig(name.split(':', 1)[0], name.split(':', 1)[1],
+                           api_key=st.session_state.get(PROVIDER_API_KEY_STATE[name.split(':', 1)[0]]))
+            for name in st.session_state.get('threat_model_backups', [])
+        ]
+
+    # Function to get the application details entered in the Risk Report tab, for the tasks run from other tabs
+    def get_app_details():
+        return (
+            st.session_state.get('app_type'),
+            st.session_state.get('authentication', []),
+            st.session_state.get('internet_facing'),
+            st.session_state.get('sensitive_data'),
+        )
+
+    # Function to build the retry callback that clears partial output and says a retry is coming
+    def retry_notice(action, placeholder, retry_policy):
+        def on_retry(attempt, wait, exc):
+            placeholder.empty()
+            st.warning(f"Error {action}: {exc}. Retrying in {wait:.1f}s (attempt {attempt + 1}/{retry_policy.max_attempts})...")
+        return on_retry
+
+    # Function to fill in the cache, retry and rate limit statistics at the bottom of Advanced Settings
+    def show_stats():
+        response_cache = get_enabled_response_cache()
+        if response_cache is not None and 'response_cache' in stats_placeholders:
+            stats = response_cache.stats()
+            stats_placeholders['response_cache'].caption(f"Response cache: {stats['hits']} hits, {stats['misses']} misses")
+
+        stats = RETRY_STATS.stats()
+        if stats['retries'] or stats['failures']:
+            stats_placeholders['retry'].caption(f"Model call retries: {stats['retries']} ({stats['wait_seconds']:.0f}s backing off), {stats['failures']} calls gave up")
+
+        stats = rate_limit_stats()
+        if stats['waits']:
+            stats_placeholders['rate_limit'].caption(f"Rate limited: {stats['waits']} calls queued for {stats['wait_seconds']:.0f}s in total")
+
+        stats = USAGE_STATS.stats()
+        if stats['cache_read_tokens'] or stats['cache_write_tokens']:
+            stats_placeholders['prompt_cache'].caption(
+                f"Prompt cache: {stats['cache_read_tokens']:,} of {stats['input_tokens']:,} input tokens read, "
+                f"{stats['cache_write_tokens']:,} written"
+            )
+
+    # Function to show the merged output of the finished chunks while a large threat list is being processed
+    def chunk_progress(task, placeholder, render):
+        def on_chunk(results):
+            finished = [result for result in results if result is not None]
+            with placeholder.container():
+                st.caption(f"{len(finished)} of {len(results)} parts of the threat list done")
+                render(merge_outputs(task, [result.output for result in finished]))
+        return on_chunk
+
+
+    with st.sidebar:
+        sidebar()
+
     # ------------------ Main App UI ------------------ #
     #col1, col2 = st.columns([12, 1])
     col1, col2 = st.columns([14, 1])
@@ -992,7 +1068,15 @@ def core_app():
     #tab1, tab2, tab3, tab4, tab5 = st.tabs(["Threat Model", "Attack Tree", "Mitigations", "DREAD", "Test Cases"])
     tab1, tab2, tab3, tab4, tab5 = st.tabs(["Risk Report", "Exploit Chain", "Counter measures", "DREAD", "Scenarios"])
 
-    with tab1:
+    # One placeholder per tab for the full report to write into
+    report_placeholders = {}
+
+    # Each tab is a fragment, so its buttons rerun only that tab instead of the whole app.
+    # The tabs share the application details and the threat model through the session state.
+    @st.fragment
+    def threat_model_tab():
+        provider_config = get_provider_config()
+
         st.markdown("""
     A threat model helps identify and evaluate potential security threats to applications / systems. It provides a systematic approach to 
     understanding possible vulnerabilities and attack vectors. Use this tab to generate a threat model using the STRIDE methodology.
@@ -1008,11 +1092,11 @@ def core_app():
 
         # If model provider is OpenAI API and the model is gpt-4o or gpt-4o-mini
         with col1:
-            if model_provider == "OpenAI API" and selected_model in ["gpt-4o", "gpt-4o-mini"]:
+            if provider_config.provider == "OpenAI API" and provider_config.model in ["gpt-4o", "gpt-4o-mini"]:
                 uploaded_file = st.file_uploader("Upload architecture diagram", type=["jpg", "jpeg", "png"])
 
                 if uploaded_file is not None:
-                    if not openai_api_key:
+                    if not provider_config.api_key:
                         st.error("Please enter your OpenAI API key to analyse the image.")
                     else:
                         if 'uploaded_file' not in st.session_state or st.session_state.uploaded_file != uploaded_file:
@@ -1026,7 +1110,7 @@ def core_app():
                                 image_analysis_prompt = create_image_analysis_prompt()
 
                                 try:
-                                    image_analysis_output = get_image_analysis(openai_api_key, selected_model, image_analysis_prompt, base64_image)
+                                    image_analysis_output = get_image_analysis(provider_config.api_key, provider_config.model, image_analysis_prompt, base64_image)
                                     if image_analysis_output and 'choices' in image_analysis_output and image_analysis_output['choices'][0]['message']['content']:
                                         image_analysis_content = image_analysis_output['choices'][0]['message']['content']
                                         st.session_state.image_analysis_content = image_analysis_content
@@ -1098,72 +1182,101 @@ def core_app():
         # Create a submit button for Threat Modelling
         threat_model_submit_button = st.button(label="Generate Threat Model")
 
+        # Create a submit button that generates every tab in one go
+        full_report_submit_button = st.button(
+            label="Generate Full Report",
+            help="Generate the threat model, then the exploit chain, counter measures, DREAD assessment and test scenarios at the same time."
+        )
+
+        # If the submit button is clicked and the user has not provided an application description
+        if (threat_model_submit_button or full_report_submit_button) and not st.session_state.get('app_input'):
+            st.error("Please enter your application details before submitting.")
+
+        # The full report fills every tab, so it is generated by a rerun of the whole app
+        if full_report_submit_button and st.session_state.get('app_input'):
+            st.session_state['full_report_requested'] = True
+            st.rerun()
+
         # If the Generate Threat Model button is clicked and the user has provided an application description
         if threat_model_submit_button and st.session_state.get('app_input'):
             app_input = st.session_state['app_input']  # Retrieve from session state
+            response_cache = get_enabled_response_cache()
+            threat_model_configs = get_threat_model_configs(provider_config)
+            retry_policy = get_retry_policy(provider_config.provider)
             # Generate the prompt using the create_prompt function
             threat_model_prompt = create_threat_model_prompt(app_type, authentication, internet_facing, sensitive_data, app_input)
 
-            # Clear thinking content when switching models or starting a new operation
-            if model_provider != "Anthropic API" or "thinking" not in anthropic_model.lower():
-                st.session_state.pop('last_thinking_content', None)
-
             # Show a spinner while generating the threat model
             with st.spinner("Analysing potential threats..."):
-                max_retries = 3
-                retry_count = 0
-                while retry_count < max_retries:
-                    try:
-                        # Call the relevant get_threat_model function with the generated prompt
-                        if model_provider == "Azure OpenAI Service":
-                            model_output = get_threat_model_azure(azure_api_endpoint, azure_api_key, azure_api_version, azure_deployment_name, threat_model_prompt)
-                        elif model_provider == "OpenAI API":
-                            model_output = get_threat_model(openai_api_key, selected_model, threat_model_prompt)
-                        elif model_provider == "Google AI API":
-                            model_output = get_threat_model_google(google_api_key, google_model, threat_model_prompt)
-                        elif model_provider == "Mistral API":
-                            model_output = get_threat_model_mistral(mistral_api_key, mistral_model, threat_model_prompt)
-                        elif model_provider == "Ollama":
-                            model_output = get_threat_model_ollama(st.session_state['ollama_endpoint'], selected_model, threat_model_prompt)
-                        elif model_provider == "Anthropic API":
-                            model_output = get_threat_model_anthropic(anthropic_api_key, anthropic_model, threat_model_prompt)
-                            # Check if we got a fallback response
-                            if model_output.get("threat_model") and len(model_output["threat_model"]) == 1 and model_output["threat_model"][0].get("Threat Type") == "Error":
-                                st.warning("⚠️ There was an issue generating the threat model. The model may have returned a response in an unexpected format. You can try:")
-                                st.markdown("1. Running the generation again")
-                                st.markdown("2. Checking the application logs for more details")
-                                st.markdown("3. Using a different model if the issue persists")
-                        elif model_provider == "LM Studio Server":
-                            model_output = get_threat_model_lm_studio(st.session_state['lm_studio_endpoint'], selected_model, threat_model_prompt)
-                        elif model_provider == "Groq API":
-                            model_output = get_threat_model_groq(groq_api_key, groq_model, threat_model_prompt)
-
-                        # Access the threat model and improvement suggestions from the parsed content
-                        threat_model = model_output.get("threat_model", [])
-                        improvement_suggestions = model_output.get("improvement_suggestions", [])
-
-                        # Save the threat model to the session state for later use in mitigations
-                        st.session_state['threat_model'] = threat_model
-                        break  # Exit the loop if successful
-                    except Exception as e:
-                        retry_count += 1
-                        if retry_count == max_retries:
-                            st.error(f"Error generating threat model after {max_retries} attempts: {e}")
-                            threat_model = []
-                            improvement_suggestions = []
-                        else:
-                            st.warning(f"Error generating threat model. Retrying attempt {retry_count+1}/{max_retries}...")
+                # Shows how many threats have arrived while the model is still writing
+                threat_model_progress = st.empty()
+                # Which model answered, when backups are configured
+                winner_config = provider_config
+
+                # Function to stream the threat model from the selected model provider, showing threats as they arrive
+                def generate_threat_model():
+                    stream = stream_task(THREAT_MODEL_TASK, provider_config, threat_model_prompt, cache=response_cache)
+                    threats_shown = 0
+                    for _ in stream:
+                        if len(stream.items) > threats_shown:
+                            threats_shown = len(stream.items)
+                            with threat_model_progress.container():
+                                st.caption(f"Threats identified so far: {threats_shown}")
+                                st.dataframe(stream.items)
+                    return stream.result
+
+                # Threats of the categories that have finished, when each category is generated separately
+                category_threats = []
+
+                # Function to show the threats of each category as soon as its call finishes
+                def show_category(category, category_result):
+                    category_threats.extend(category_result.output["threat_model"])
+                    with threat_model_progress.container():
+                        st.caption(f"Threats identified so far: {len(category_threats)} ({category} done)")
+                        st.dataframe(category_threats)
+
+                try:
+                    if st.session_state.get('threat_model_by_category'):
+                        # One smaller call per STRIDE category, all at once, merged into a single threat model
+                        result = get_threat_model_by_category(
+                            provider_config, app_type, authentication, internet_facing, sensitive_data, app_input,
+                            cache=response_cache, on_category=show_category
+                        )
+                    elif len(threat_model_configs) > 1:
+                        # Race the backups against the selected model when it is slow or failing
+                        result, winner_config = get_threat_model_hedged(
+                            threat_model_configs, threat_model_prompt,
+                            hedge_after=st.session_state.get('hedge_after'), cache=response_cache
+                        )
+                    else:
+                        result = retry_call(generate_threat_model, retry_policy,
+                                            on_retry=retry_notice("generating threat model", threat_model_progress, retry_policy))
+                    model_output = result.output
+                    if winner_config is not provider_config:
+                        st.info(f"The threat model came from the backup model {winner_config.model} ({winner_config.provider}).")
+
+                    # Access the threat model and improvement suggestions from the parsed content
+                    threat_model = model_output.get("threat_model", [])
+                    improvement_suggestions = model_output.get("improvement_suggestions", [])
+                    if result.partial:
+                        st.warning(f"The response was cut off. Showing the {len(threat_model)} threats that were received in full.")
+
+                    # Save the threat model to the session state for later use in mitigations.
+                    # Content based IDs let the other tabs reuse the results of threats that haven't changed.
+                    threat_model = with_threat_ids(threat_model)
+                    st.session_state['threat_model'] = threat_model
+                except Exception as e:
+                    result = None
+                    st.error(f"Error generating threat model: {e}")
+                    threat_model = []
+                    improvement_suggestions = []
+                threat_model_progress.empty()
 
             # Convert the threat model JSON to Markdown
             #markdown_output = json_to_markdown(threat_model, improvement_suggestions)
 
-            # Display thinking content in an expander if available and using Claude thinking mode
-            if ('last_thinking_content' in st.session_state and 
-                st.session_state['last_thinking_content'] and 
-                model_provider == "Anthropic API" and 
-                "thinking" in anthropic_model.lower()):
-                with st.expander("View Claude's thinking process"):
-                    st.markdown(st.session_state['last_thinking_content'])
+            # Display any thinking or reasoning the model returned
+            show_reasoning(result)
 
             # Display the threat model in Markdown
             #st.markdown(markdown_output)
@@ -1175,33 +1288,61 @@ def core_app():
             #     file_name="threat_model.md",
             #     mime="text/markdown",
             # )
-            st.json(threat_model)
-            st.download_button(
-                label="Download Threat Model",
-                data=json.dumps(threat_model, indent=4),
-                file_name="threat_model.json",
-                mime="application/json",
+            show_threat_model(threat_model)
+            show_stats()
+
+        # ------------------ Threat Category Refresh ------------------ #
+
+        # Once there is a threat model, some of its STRIDE categories can be regenerated on their own
+        if st.session_state.get('threat_model'):
+            refresh_categories = st.multiselect(
+                "Threat categories to refresh:",
+                STRIDE_CATEGORIES,
+                key="refresh_categories",
+                help="Generate new threats for the selected STRIDE categories only, one model call per category, and keep every other threat as it is. The counter measures, DREAD scores and test scenarios of the kept threats are reused."
             )
-        
-    # If the submit button is clicked and the user has not provided an application description
-    if threat_model_submit_button and not st.session_state.get('app_input'):
-        st.error("Please enter your application details before submitting.")
+            refresh_submit_button = st.button(label="Refresh Selected Categories", disabled=not refresh_categories)
 
+            if refresh_submit_button and st.session_state.get('app_input'):
+                with st.spinner(f"Refreshing {', '.join(refresh_categories)} threats..."):
+                    try:
+                        # The categories are generated in parallel. The response cache is skipped since the point is new threats.
+                        category_results = get_threat_categories(
+                            provider_config, refresh_categories, app_type, authentication, internet_facing, sensitive_data,
+                            st.session_state['app_input']
+                        )
+                        new_threats = [threat for result in category_results.values() for threat in result.output["threat_model"]]
+                        threat_model = replace_threat_categories(st.session_state['threat_model'], new_threats, refresh_categories)
+                        st.session_state['threat_model'] = threat_model
+                        st.success(f"Replaced the {', '.join(refresh_categories)} threats with {len(new_threats)} new ones.")
+                        show_threat_model(threat_model)
+                    except Exception as e:
+                        st.error(f"Error refreshing threat categories: {e}")
+                show_stats()
+
+        # Filled in by the full report once the threat model arrives
+        report_placeholders['threat_model'] = st.empty()
+
+    with tab1:
+        threat_model_tab()
 
 
     # ------------------ Attack Tree Generation ------------------ #
 
-    with tab2:
+    @st.fragment
+    def attack_tree_tab():
+        provider_config = get_provider_config()
+
         st.markdown("""
     Exploit chain are a structured way to analyse the security of a system. They represent potential attack scenarios in a hierarchical format, 
     with the ultimate goal of an attacker at the root and various paths to achieve that goal as branches. This helps in understanding system 
     vulnerabilities and prioritising mitigation efforts.
     """)
         st.markdown("""---""")
-        if model_provider == "Mistral API" and mistral_model == "mistral-small-latest":
+        if provider_config.provider == "Mistral API" and provider_config.model == "mistral-small-latest":
             st.warning("⚠️ Mistral Small doesn't reliably generate syntactically correct Mermaid code. Please use the Mistral Large model for generating attack trees, or select a different model provider.")
         else:
-            if model_provider in ["Ollama", "LM Studio Server"]:
+            if provider_config.provider in ["Ollama", "LM Studio Server"]:
                 st.warning("⚠️ Users may encounter syntax errors when generating attack trees using local LLMs. Experiment with different local LLMs to assess their output quality, or consider using a hosted model provider to generate attack trees.")
         
             # Create a submit button for Attack Tree
@@ -1210,85 +1351,38 @@ def core_app():
             # If the Generate Attack Tree button is clicked and the user has provided an application description
             if attack_tree_submit_button and st.session_state.get('app_input'):
                 app_input = st.session_state.get('app_input')
+                response_cache = get_enabled_response_cache()
                 # Generate the prompt using the create_attack_tree_prompt function
-                attack_tree_prompt = create_attack_tree_prompt(app_type, authentication, internet_facing, sensitive_data, app_input)
+                attack_tree_prompt = create_attack_tree_prompt(*get_app_details(), app_input)
 
-                # Clear thinking content when switching models or starting a new operation
-                if model_provider != "Anthropic API" or "thinking" not in anthropic_model.lower():
-                    st.session_state.pop('last_thinking_content', None)
 
                 # Show a spinner while generating the attack tree
                 with st.spinner("Generating exploit chain..."):
                     try:
-                        # Call the relevant get_attack_tree function with the generated prompt
-                        if model_provider == "Azure OpenAI Service":
-                            mermaid_code = get_attack_tree_azure(azure_api_endpoint, azure_api_key, azure_api_version, azure_deployment_name, attack_tree_prompt)
-                        elif model_provider == "OpenAI API":
-                            mermaid_code = get_attack_tree(openai_api_key, selected_model, attack_tree_prompt)
-                        elif model_provider == "Google AI API":
-                            mermaid_code = get_attack_tree_google(google_api_key, google_model, attack_tree_prompt)
-                        elif model_provider == "Mistral API":
-                            mermaid_code = get_attack_tree_mistral(mistral_api_key, mistral_model, attack_tree_prompt)
-                        elif model_provider == "Ollama":
-                            mermaid_code = get_attack_tree_ollama(st.session_state['ollama_endpoint'], selected_model, attack_tree_prompt)
-                        elif model_provider == "Anthropic API":
-                            mermaid_code = get_attack_tree_anthropic(anthropic_api_key, anthropic_model, attack_tree_prompt)
-                        elif model_provider == "LM Studio Server":
-                            mermaid_code = get_attack_tree_lm_studio(st.session_state['lm_studio_endpoint'], selected_model, attack_tree_prompt)
-                        elif model_provider == "Groq API":
-                            mermaid_code = get_attack_tree_groq(groq_api_key, groq_model, attack_tree_prompt)
-
-                        # Display thinking content in an expander if available and using Claude thinking mode
-                        if ('last_thinking_content' in st.session_state and 
-                            st.session_state['last_thinking_content'] and 
-                            model_provider == "Anthropic API" and 
-                            "thinking" in anthropic_model.lower()):
-                            with st.expander("View Claude's thinking process"):
-                                st.markdown(st.session_state['last_thinking_content'])
-
-                        # Display the generated attack tree code
-                        st.write("Attack Tree Code:")
-                        st.code(mermaid_code)
-
-                        # Visualise the attack tree using the Mermaid custom component
-                        st.write("Attack Tree Diagram Preview:")
-                        mermaid(mermaid_code)
-                    
-                        col1, col2, col3, col4, col5 = st.columns([1,1,1,1,1])
-                    
-                        with col1:              
-                            # Add a button to allow the user to download the Mermaid code
-                            st.download_button(
-                                label="Download Diagram Code",
-                                data=mermaid_code,
-                                file_name="attack_tree.md",
-                                mime="text/plain",
-                                help="Download the Mermaid code for the attack tree diagram."
-                            )
-
-                        with col2:
-                            # Add a button to allow the user to open the Mermaid Live editor
-                            mermaid_live_button = st.link_button("Open Mermaid Live", "https://mermaid.live")
-                    
-                        with col3:
-                            # Blank placeholder
-                            st.write("")
-                    
-                        with col4:
-                            # Blank placeholder
-                            st.write("")
-                    
-                        with col5:
-                            # Blank placeholder
-                            st.write("")
+                        # Run the task against the selected model provider
+                        result = run_task(ATTACK_TREE_TASK, provider_config, attack_tree_prompt, cache=response_cache)
+                        mermaid_code = result.output
+
+                        # Display any thinking or reasoning the model returned
+                        show_reasoning(result)
+
+                        # Display the generated attack tree code and diagram
+                        show_attack_tree(mermaid_code)
                     
                     except Exception as e:
                         st.error(f"Error generating attack tree: {e}")
+                show_stats()
 
+        # Filled in by the full report
+        report_placeholders['attack_tree'] = st.empty()
+
+    with tab2:
+        attack_tree_tab()
 
     # ------------------ Mitigations Generation ------------------ #
 
-    with tab3:
+    @st.fragment
+    def mitigations_tab():
         st.markdown("""
     Use this tab to generate potential counter measures for the threats identified in the threat model. Counter measures are security controls or
     counter measures that can help reduce the likelihood or impact of a security threat. The generated counter measures can be used to enhance
@@ -1303,75 +1397,74 @@ def core_app():
         if mitigations_submit_button:
             # Check if threat_model data exists
             if 'threat_model' in st.session_state and st.session_state['threat_model']:
-                # Convert the threat_model data into a Markdown list
-                threats_markdown = json_to_markdown(st.session_state['threat_model'], [])
-                # Generate the prompt using the create_mitigations_prompt function
-                mitigations_prompt = create_mitigations_prompt(threats_markdown)
-
-                # Clear thinking content when switching models or starting a new operation
-                if model_provider != "Anthropic API" or "thinking" not in anthropic_model.lower():
-                    st.session_state.pop('last_thinking_content', None)
-
+                provider_config = get_provider_config()
+                response_cache = get_enabled_response_cache()
+                retry_policy = get_retry_policy(provider_config.provider)
                 # Show a spinner while suggesting mitigations
                 with st.spinner("Suggesting mitigations..."):
-                    max_retries = 3
-                    retry_count = 0
-                    while retry_count < max_retries:
-                        try:
-                            # Call the relevant get_mitigations function with the generated prompt
-                            if model_provider == "Azure OpenAI Service":
-                                mitigations_markdown = get_mitigations_azure(azure_api_endpoint, azure_api_key, azure_api_version, azure_deployment_name, mitigations_prompt)
-                            elif model_provider == "OpenAI API":
-                                mitigations_markdown = get_mitigations(openai_api_key, selected_model, mitigations_prompt)
-                            elif model_provider == "Google AI API":
-                                mitigations_markdown = get_mitigations_google(google_api_key, google_model, mitigations_prompt)
-                            elif model_provider == "Mistral API":
-                                mitigations_markdown = get_mitigations_mistral(mistral_api_key, mistral_model, mitigations_prompt)
-                            elif model_provider == "Ollama":
-                                mitigations_markdown = get_mitigations_ollama(st.session_state['ollama_endpoint'], selected_model, mitigations_prompt)
-                            elif model_provider == "Anthropic API":
-                                mitigations_markdown = get_mitigations_anthropic(anthropic_api_key, anthropic_model, mitigations_prompt)
-                            elif model_provider == "LM Studio Server":
-                                mitigations_markdown = get_mitigations_lm_studio(st.session_state['lm_studio_endpoint'], selected_model, mitigations_prompt)
-                            elif model_provider == "Groq API":
-                                mitigations_markdown = get_mitigations_groq(groq_api_key, groq_model, mitigations_prompt)
-
-                            # Display thinking content in an expander if available and using Claude thinking mode
-                            if ('last_thinking_content' in st.session_state and 
-                                st.session_state['last_thinking_content'] and 
-                                model_provider == "Anthropic API" and 
-                                "thinking" in anthropic_model.lower()):
-                                with st.expander("View Claude's thinking process"):
-                                    st.markdown(st.session_state['last_thinking_content'])
+                    # Holds the streamed output, replaced by the final rendering once complete
+                    mitigations_output = st.empty()
+
+                    # Function to suggest mitigations for a list of threats
+                    def suggest_mitigations(threats):
+                        # Large threat lists are split so that no single response has to cover every threat
+                        threat_chunks = chunk_threats(threats, provider_config.model)
+                        if len(threat_chunks) > 1:
+                            # The chunks run in parallel, each with its own retries
+                            return run_chunked(MITIGATIONS_TASK, provider_config, threat_chunks, create_mitigations_prompt, cache=response_cache,
+                                               on_chunk=chunk_progress(MITIGATIONS_TASK, mitigations_output, st.markdown))
+
+                        # Generate the prompt using the create_mitigations_prompt function
+                        mitigations_prompt = create_mitigations_prompt(json_to_markdown(threats, []))
+
+                        # Function to stream the suggested mitigations into the tab as the model writes them
+                        def generate_mitigations():
+                            stream = stream_task(MITIGATIONS_TASK, provider_config, mitigations_prompt, cache=response_cache)
+                            with mitigations_output.container():
+                                st.write_stream(stream)
+                            return stream.result
+
+                        return retry_call(generate_mitigations, retry_policy,
+                                          on_retry=retry_notice("suggesting mitigations", mitigations_output, retry_policy))
+
+                    try:
+                        # Only threats without a stored result are sent to the model
+                        result, reused_threats = run_incremental(
+                            MITIGATIONS_TASK, provider_config, st.session_state['threat_model'], create_mitigations_prompt,
+                            store=get_threat_result_store(response_cache), cache=response_cache, run=suggest_mitigations
+                        )
+                        mitigations_markdown = result.output
+
+                        with mitigations_output.container():
+                            # Say how many threats didn't need to be sent again
+                            show_reused_threats(reused_threats)
+
+                            # Display any thinking or reasoning the model returned
+                            show_reasoning(result)
 
                             # Display the suggested mitigations in Markdown
-                            st.markdown(mitigations_markdown)
-                        
-                            st.markdown("")
-                        
-                            # Add a button to allow the user to download the mitigations as a Markdown file
-                            st.download_button(
-                                label="Download Mitigations",
-                                data=mitigations_markdown,
-                                file_name="mitigations.md",
-                                mime="text/markdown",
-                            )
-                        
-                            break  # Exit the loop if successful
-                        except Exception as e:
-                            retry_count += 1
-                            if retry_count == max_retries:
-                                st.error(f"Error suggesting mitigations after {max_retries} attempts: {e}")
-                                mitigations_markdown = ""
-                            else:
-                                st.warning(f"Error suggesting mitigations. Retrying attempt {retry_count+1}/{max_retries}...")
+                            show_mitigations(mitigations_markdown)
+                    except Exception as e:
+                        # Clear any partial output
+                        mitigations_output.empty()
+                        st.error(f"Error suggesting mitigations: {e}")
+                        mitigations_markdown = ""
             
                 st.markdown("")
+                show_stats()
             else:
                 st.error("Please generate a threat model first before suggesting mitigations.")
 
+        # Filled in by the full report
+        report_placeholders['mitigations'] = st.empty()
+
+    with tab3:
+        mitigations_tab()
+
     # ------------------ DREAD Risk Assessment Generation ------------------ #
-    with tab4:
+
+    @st.fragment
+    def dread_assessment_tab():
         st.markdown("""
     DREAD is a method for evaluating and prioritising risks associated with security threats. It assesses threats based on **D**amage potential, 
     **R**eproducibility, **E**xploitability, **A**ffected users, and **D**iscoverability. This helps in determining the overall risk level and 
@@ -1385,86 +1478,81 @@ def core_app():
         if dread_assessment_submit_button:
             # Check if threat_model data exists
             if 'threat_model' in st.session_state and st.session_state['threat_model']:
-                # Convert the threat_model data into a Markdown list
-                threats_markdown = json_to_markdown(st.session_state['threat_model'], [])
-                # Generate the prompt using the create_dread_assessment_prompt function
-                dread_assessment_prompt = create_dread_assessment_prompt(threats_markdown)
-                # Clear thinking content when switching models or starting a new operation
-                if model_provider != "Anthropic API" or "thinking" not in anthropic_model.lower():
-                    st.session_state.pop('last_thinking_content', None)
-
+                provider_config = get_provider_config()
+                response_cache = get_enabled_response_cache()
+                retry_policy = get_retry_policy(provider_config.provider)
                 # Show a spinner while generating DREAD Risk Assessment
                 with st.spinner("Generating DREAD Risk Assessment..."):
-                    max_retries = 3
-                    retry_count = 0
-                    while retry_count < max_retries:
-                        try:
-                            # Call the relevant get_dread_assessment function with the generated prompt
-                            if model_provider == "Azure OpenAI Service":
-                                dread_assessment = get_dread_assessment_azure(azure_api_endpoint, azure_api_key, azure_api_version, azure_deployment_name, dread_assessment_prompt)
-                            elif model_provider == "OpenAI API":
-                                dread_assessment = get_dread_assessment(openai_api_key, selected_model, dread_assessment_prompt)
-                            elif model_provider == "Google AI API":
-                                dread_assessment = get_dread_assessment_google(google_api_key, google_model, dread_assessment_prompt)
-                            elif model_provider == "Mistral API":
-                                dread_assessment = get_dread_assessment_mistral(mistral_api_key, mistral_model, dread_assessment_prompt)
-                            elif model_provider == "Ollama":
-                                dread_assessment = get_dread_assessment_ollama(st.session_state['ollama_endpoint'], selected_model, dread_assessment_prompt)
-                            elif model_provider == "Anthropic API":
-                                dread_assessment = get_dread_assessment_anthropic(anthropic_api_key, anthropic_model, dread_assessment_prompt)
-                            elif model_provider == "LM Studio Server":
-                                dread_assessment = get_dread_assessment_lm_studio(st.session_state['lm_studio_endpoint'], selected_model, dread_assessment_prompt)
-                            elif model_provider == "Groq API":
-                                dread_assessment = get_dread_assessment_groq(groq_api_key, groq_model, dread_assessment_prompt)
-                        
-                            # Save the DREAD assessment to the session state for later use in test cases
-                            st.session_state['dread_assessment'] = dread_assessment
-                            break  # Exit the loop if successful
-                        except Exception as e:
-                            retry_count += 1
-                            if retry_count == max_retries:
-                                st.error(f"Error generating DREAD risk assessment after {max_retries} attempts: {e}")
-                                dread_assessment = {"Risk Assessment": []}
-                                # Add debug information
-                                st.error("Debug: No threats were found in the response. Please try generating the threat model again.")
-                            else:
-                                st.warning(f"Error generating DREAD risk assessment. Retrying attempt {retry_count+1}/{max_retries}...")
-                # Convert the DREAD assessment JSON to Markdown
-                dread_assessment_markdown = dread_json_to_markdown(dread_assessment)
-            
-                # Add debug information about the assessment
-                if not dread_assessment.get("Risk Assessment"):
-                    st.warning("Debug: The DREAD assessment response is empty. Please ensure you have generated a threat model first.")
-            
-                # Display thinking content in an expander if available and using Claude thinking mode
-                if ('last_thinking_content' in st.session_state and 
-                    st.session_state['last_thinking_content'] and 
-                    model_provider == "Anthropic API" and 
-                    "thinking" in anthropic_model.lower()):
-                    with st.expander("View Claude's thinking process"):
-                        st.markdown(st.session_state['last_thinking_content'])
-                    
-                # Display the DREAD assessment with a header
-                st.markdown("## DREAD Risk Assessment")
-                st.markdown("The table below shows the DREAD risk assessment for each identified threat. The Risk Score is calculated as the average of the five DREAD categories.")
-            
-                # Display the DREAD assessment in Markdown format
-                st.markdown(dread_assessment_markdown, unsafe_allow_html=False)
-            
-                # Add a button to allow the user to download the DREAD assessment as a Markdown file
-                st.download_button(
-                    label="Download DREAD Risk Assessment",
-                    data=dread_assessment_markdown,
-                    file_name="dread_assessment.md",
-                    mime="text/markdown",
-                )
+                    # Shows each assessed threat as soon as the model finishes writing it
+                    dread_assessment_progress = st.empty()
+
+                    # Function to assess a list of threats
+                    def assess_threats(threats):
+                        # Large threat lists are split so that no single response has to cover every threat
+                        threat_chunks = chunk_threats(threats, provider_config.model)
+                        if len(threat_chunks) > 1:
+                            # The chunks run in parallel, each with its own retries
+                            return run_chunked(DREAD_TASK, provider_config, threat_chunks, create_dread_assessment_prompt, cache=response_cache,
+                                               on_chunk=chunk_progress(DREAD_TASK, dread_assessment_progress, lambda assessment: st.markdown(dread_json_to_markdown(assessment))))
+
+                        # Generate the prompt using the create_dread_assessment_prompt function
+                        dread_assessment_prompt = create_dread_assessment_prompt(json_to_markdown(threats, []))
+
+                        # Function to stream the assessment from the selected model provider, showing each threat as it is assessed
+                        def generate_dread_assessment():
+                            stream = stream_task(DREAD_TASK, provider_config, dread_assessment_prompt, cache=response_cache)
+                            assessments_shown = 0
+                            for _ in stream:
+                                if len(stream.items) > assessments_shown:
+                                    assessments_shown = len(stream.items)
+                                    dread_assessment_progress.markdown(dread_json_to_markdown({"Risk Assessment": stream.items}))
+                            return stream.result
+
+                        return retry_call(generate_dread_assessment, retry_policy,
+                                          on_retry=retry_notice("generating DREAD risk assessment", dread_assessment_progress, retry_policy))
+
+                    reused_threats = 0
+                    try:
+                        # Only threats without a stored result are sent to the model
+                        result, reused_threats = run_incremental(
+                            DREAD_TASK, provider_config, st.session_state['threat_model'], create_dread_assessment_prompt,
+                            store=get_threat_result_store(response_cache), cache=response_cache, run=assess_threats
+                        )
+                        dread_assessment = result.output
+                        if result.partial:
+                            st.warning(f"The response was cut off. Showing the {len(dread_assessment.get('Risk Assessment', []))} threats that were assessed in full.")
+
+                        # Save the DREAD assessment to the session state for later use in test cases
+                        st.session_state['dread_assessment'] = dread_assessment
+                    except Exception as e:
+                        result = None
+                        st.error(f"Error generating DREAD risk assessment: {e}")
+                        dread_assessment = {"Risk Assessment": []}
+                        # Add debug information
+                        st.error("Debug: No threats were found in the response. Please try generating the threat model again.")
+                    dread_assessment_progress.empty()
+                # Say how many threats didn't need to be assessed again
+                show_reused_threats(reused_threats)
+
+                # Display any thinking or reasoning the model returned
+                show_reasoning(result)
+
+                # Display the DREAD assessment as a Markdown table
+                show_dread_assessment(dread_assessment)
+                show_stats()
             else:
                 st.error("Please generate a threat model first before requesting a DREAD risk assessment.")
 
+        # Filled in by the full report
+        report_placeholders['dread_assessment'] = st.empty()
+
+    with tab4:
+        dread_assessment_tab()
 
     # ------------------ Test Cases Generation ------------------ #
 
-    with tab5:
+    @st.fragment
+    def test_cases_tab():
         st.markdown("""
     Test cases are used to validate the security of an application and ensure that potential vulnerabilities are identified and 
     addressed. This tab allows you to generate test cases using Gherkin syntax. Gherkin provides a structured way to describe application 
@@ -1480,70 +1568,121 @@ def core_app():
         if test_cases_submit_button:
             # Check if threat_model data exists
             if 'threat_model' in st.session_state and st.session_state['threat_model']:
-                # Convert the threat_model data into a Markdown list
-                threats_markdown = json_to_markdown(st.session_state['threat_model'], [])
-                # Generate the prompt using the create_test_cases_prompt function
-                test_cases_prompt = create_test_cases_prompt(threats_markdown)
-
-                # Clear thinking content when switching models or starting a new operation
-                if model_provider != "Anthropic API" or "thinking" not in anthropic_model.lower():
-                    st.session_state.pop('last_thinking_content', None)
-
+                provider_config = get_provider_config()
+                response_cache = get_enabled_response_cache()
+                retry_policy = get_retry_policy(provider_config.provider)
                 # Show a spinner while generating test cases
                 with st.spinner("Generating test cases..."):
-                    max_retries = 3
-                    retry_count = 0
-                    while retry_count < max_retries:
-                        try:
-                            # Call to the relevant get_test_cases function with the generated prompt
-                            if model_provider == "Azure OpenAI Service":
-                                test_cases_markdown = get_test_cases_azure(azure_api_endpoint, azure_api_key, azure_api_version, azure_deployment_name, test_cases_prompt)
-                            elif model_provider == "OpenAI API":
-                                test_cases_markdown = get_test_cases(openai_api_key, selected_model, test_cases_prompt)
-                            elif model_provider == "Google AI API":
-                                test_cases_markdown = get_test_cases_google(google_api_key, google_model, test_cases_prompt)
-                            elif model_provider == "Mistral API":
-                                test_cases_markdown = get_test_cases_mistral(mistral_api_key, mistral_model, test_cases_prompt)
-                            elif model_provider == "Ollama":
-                                test_cases_markdown = get_test_cases_ollama(st.session_state['ollama_endpoint'], selected_model, test_cases_prompt)
-                            elif model_provider == "Anthropic API":
-                                test_cases_markdown = get_test_cases_anthropic(anthropic_api_key, anthropic_model, test_cases_prompt)
-                            elif model_provider == "LM Studio Server":
-                                test_cases_markdown = get_test_cases_lm_studio(st.session_state['lm_studio_endpoint'], selected_model, test_cases_prompt)
-                            elif model_provider == "Groq API":
-                                test_cases_markdown = get_test_cases_groq(groq_api_key, groq_model, test_cases_prompt)
-
-                            # Display thinking content in an expander if available and using Claude thinking mode
-                            if ('last_thinking_content' in st.session_state and 
-                                st.session_state['last_thinking_content'] and 
-                                model_provider == "Anthropic API" and 
-                                "thinking" in anthropic_model.lower()):
-                                with st.expander("View Claude's thinking process"):
-                                    st.markdown(st.session_state['last_thinking_content'])
+                    # Holds the streamed output, replaced by the final rendering once complete
+                    test_cases_output = st.empty()
+
+                    # Function to generate test cases for a list of threats
+                    def write_test_cases(threats):
+                        # Large threat lists are split so that no single response has to cover every threat
+                        threat_chunks = chunk_threats(threats, provider_config.model)
+                        if len(threat_chunks) > 1:
+                            # The chunks run in parallel, each with its own retries
+                            return run_chunked(TEST_CASES_TASK, provider_config, threat_chunks, create_test_cases_prompt, cache=response_cache,
+                                               on_chunk=chunk_progress(TEST_CASES_TASK, test_cases_output, st.markdown))
+
+                        # Generate the prompt using the create_test_cases_prompt function
+                        test_cases_prompt = create_test_cases_prompt(json_to_markdown(threats, []))
+
+                        # Function to stream the test cases into the tab as the model writes them
+                        def generate_test_cases():
+                            stream = stream_task(TEST_CASES_TASK, provider_config, test_cases_prompt, cache=response_cache)
+                            with test_cases_output.container():
+                                st.write_stream(stream)
+                            return stream.result
+
+                        return retry_call(generate_test_cases, retry_policy,
+                                          on_retry=retry_notice("generating test cases", test_cases_output, retry_policy))
 
-                            # Display the suggested mitigations in Markdown
-                            st.markdown(test_cases_markdown)
-                        
-                            st.markdown("")
-
-                            # Add a button to allow the user to download the test cases as a Markdown file
-                            st.download_button(
-                                label="Download Test Cases",
-                                data=test_cases_markdown,
-                                file_name="test_cases.md",
-                                mime="text/markdown",
-                            )
-                        
-                            break  # Exit the loop if successful
-                        except Exception as e:
-                            retry_count += 1
-                            if retry_count == max_retries:
-                                st.error(f"Error generating test cases after {max_retries} attempts: {e}")
-                                test_cases_markdown = ""
-                            else:
-                                st.warning(f"Error generating test cases. Retrying attempt {retry_count+1}/{max_retries}...")
+                    try:
+                        # Only threats without a stored result are sent to the model
+                        result, reused_threats = run_incremental(
+                            TEST_CASES_TASK, provider_config, st.session_state['threat_model'], create_test_cases_prompt,
+                            store=get_threat_result_store(response_cache), cache=response_cache, run=write_test_cases
+                        )
+                        test_cases_markdown = result.output
+
+                        with test_cases_output.container():
+                            # Say how many threats didn't need to be sent again
+                            show_reused_threats(reused_threats)
+
+                            # Display any thinking or reasoning the model returned
+                            show_reasoning(result)
+
+                            # Display the test cases in Markdown
+                            show_test_cases(test_cases_markdown)
+                    except Exception as e:
+                        # Clear any partial output
+                        test_cases_output.empty()
+                        st.error(f"Error generating test cases: {e}")
+                        test_cases_markdown = ""
             
                 st.markdown("")
+                show_stats()
 
             else:
                 st.error("Please generate a threat model first before requesting test cases.")
+
+        # Filled in by the full report
+        report_placeholders['test_cases'] = st.empty()
+
+    with tab5:
+        test_cases_tab()
+
+    # ------------------ Full Report Generation ------------------ #
+
+    # Generate every tab at once, filling each one as its result arrives. Requested from the Risk Report tab.
+    if st.session_state.pop('full_report_requested', False) and st.session_state.get('app_input'):
+        provider_config = get_provider_config()
+        response_cache = get_enabled_response_cache()
+        app_type, authentication, internet_facing, sensitive_data = get_app_details()
+        report_sections = list(REPORT_SECTIONS)
+        if provider_config.provider == "Mistral API" and provider_config.model == "mistral-small-latest":
+            # Mistral Small doesn't reliably generate Mermaid code, see the Exploit Chain tab
+            report_sections.remove("attack_tree")
+
+        for section in report_sections:
+            report_placeholders[section].info("Waiting for the full report...")
+
+        finished = set()
+        with st.spinner("Generating full report..."):
+            for section, result, error in generate_report(
+                provider_config, app_type, authentication, internet_facing, sensitive_data,
+                st.session_state['app_input'], sections=report_sections, cache=response_cache,
+                store=get_threat_result_store(response_cache), threat_model_by_category=st.session_state.get('threat_model_by_category', False)
+            ):
+                finished.add(section)
+                with report_placeholders[section].container():
+                    if error is not None:
+                        st.error(f"Error generating {section.replace('_', ' ')}: {error}")
+                        continue
+
+                    # Display any thinking or reasoning the model returned
+                    show_reasoning(result)
+                    if result.partial:
+                        st.warning("The response was cut off. Showing the items that were received in full.")
+
+                    if section == "threat_model":
+                        # Save the threat model to the session state for later use in the other tabs
+                        st.session_state['threat_model'] = result.output.get("threat_model", [])
+                        show_threat_model(st.session_state['threat_model'])
+                    elif section == "attack_tree":
+                        show_attack_tree(result.output)
+                    elif section == "mitigations":
+                        show_mitigations(result.output)
+                    elif section == "dread_assessment":
+                        st.session_state['dread_assessment'] = result.output
+                        show_dread_assessment(result.output)
+                    elif section == "test_cases":
+                        show_test_cases(result.output)
+
+        # Sections that depend on the threat model don't run if it failed
+        for section in report_sections:
+            if section not in finished:
+                report_placeholders[section].warning(SKIPPED_SECTION_ERROR)
+
+        show_stats()
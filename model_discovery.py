@@ -0,0 +1,150 @@
+import threading
+import time
+from dataclasses import dataclass, field, replace
+
+from llm_clients import get_http_session
+
+# Seconds a discovered model list is served before it is refreshed in the background
+MODEL_LIST_TTL = 60
+
+# Timeout, in seconds, of one request to a local server's model list
+DISCOVERY_TIMEOUT = 5
+
+# After a failed request the endpoint isn't contacted for this many seconds, doubling
+# with every further failure up to the maximum
+CIRCUIT_OPEN_SECONDS = 15
+CIRCUIT_MAX_OPEN_SECONDS = 300
+
+
+def fetch_ollama_models(endpoint):
+    """Return the names of the models pulled into an Ollama server, from its /api/tags endpoint."""
+    response = get_http_session().get(endpoint.rstrip('/') + "/api/tags", timeout=DISCOVERY_TIMEOUT)
+    response.raise_for_status()
+    return [model['name'] for model in response.json()['models']]
+
+def fetch_lm_studio_models(endpoint):
+    """Return the IDs of the models loaded in an LM Studio Server, from its OpenAI compatible /v1/models endpoint."""
+    response = get_http_session().get(endpoint.rstrip('/') + "/v1/models", timeout=DISCOVERY_TIMEOUT)
+    response.raise_for_status()
+    return [model['id'] for model in response.json()['data']]
+
+# Function fetching the model list of each local provider
+MODEL_FETCHERS = {
+    "Ollama": fetch_ollama_models,
+    "LM Studio Server": fetch_lm_studio_models,
+}
+
+
+@dataclass
+class DiscoveredModels:
+    """
+    The last known model list of one local server.
+
+    Attributes:
+        models (list): Model names, or None if the server has never answered
+        error (Exception): Why the latest request failed, None if it succeeded
+        fetched_at (float): time.monotonic() of the last successful request
+        failures (int): Requests failed in a row
+        open_until (float): time.monotonic() before which the server isn't contacted
+        refreshing (bool): Whether a background refresh is running
+        ready (threading.Event): Set once the first request has finished
+    """
+    models: list = None
+    error: Exception = None
+    fetched_at: float = 0.0
+    failures: int = 0
+    open_until: float = 0.0
+    refreshing: bool = False
+    ready: threading.Event = field(default_factory=threading.Event, repr=False)
+
+    @property
+    def age(self):
+        """Seconds since the models were fetched, or None if they never were."""
+        return None if self.models is None else time.monotonic() - self.fetched_at
+
+
+class ModelRegistry:
+    """
+    Model lists of local servers, shared by all sessions and served from memory.
+
+    Only the first lookup of an endpoint waits for the server. After that the
+    last known list is returned straight away and refreshed in the background
+    once it is older than the TTL. A server that fails isn't contacted again
+    until its circuit closes, so a dead endpoint costs nothing per rerun.
+    """
+
+    def __init__(self, ttl=MODEL_LIST_TTL, fetchers=MODEL_FETCHERS):
+        self.ttl = ttl
+        self.fetchers = fetchers
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, provider, endpoint):
+        """
+        Return the model list of a local server.
+
+        Args:
+            provider (str): A key of MODEL_FETCHERS, e.g. "Ollama"
+            endpoint (str): The server's URL, e.g. "http://localhost:11434"
+
+        Returns:
+            DiscoveredModels: A copy of the server's last known state
+        """
+        key = (provider, endpoint.rstrip('/'))
+        with self._lock:
+            entry = self._entries.get(key)
+            first = entry is None
+            if first:
+                entry = self._entries[key] = DiscoveredModels()
+
+        if first:
+            # Nothing to serve yet, so the first lookup waits for the server
+            try:
+                self._fetch(provider, key[1], entry)
+            finally:
+                entry.ready.set()
+            with self._lock:
+                return replace(entry)
+        # Sessions asking while the first lookup is running wait for it rather than sending their own
+        entry.ready.wait()
+
+        now = time.monotonic()
+        with self._lock:
+            due = entry.models is None or now - entry.fetched_at >= self.ttl
+            if due and not entry.refreshing and now >= entry.open_until:
+                entry.refreshing = True
+                threading.Thread(target=self._refresh, args=(provider, key[1], entry),
+                                 name="model-discovery", daemon=True).start()
+            return replace(entry)
+
+    def _refresh(self, provider, endpoint, entry):
+        try:
+            self._fetch(provider, endpoint, entry)
+        finally:
+            with self._lock:
+                entry.refreshing = False
+
+    def _fetch(self, provider, endpoint, entry):
+        try:
+            models = self.fetchers[provider](endpoint)
+        except Exception as e:
+            with self._lock:
+                entry.error = e
+                entry.failures += 1
+                entry.open_until = time.monotonic() + min(
+                    CIRCUIT_OPEN_SECONDS * 2 ** (entry.failures - 1), CIRCUIT_MAX_OPEN_SECONDS
+                )
+            return
+        with self._lock:
+            entry.models = models
+            entry.error = None
+            entry.fetched_at = time.monotonic()
+            entry.failures = 0
+            entry.open_until = 0.0
+
+
+MODEL_REGISTRY = ModelRegistry()
+
+def get_local_models(provider, endpoint):
+    """Return the DiscoveredModels of an Ollama or LM Studio Server endpoint, see ModelRegistry.get()."""
+    return MODEL_REGISTRY.get(provider, endpoint)
@@ -0,0 +1,881 @@
+import json
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from typing import Callable
+
+from llm_clients import (
+    get_openai_client, get_azure_openai_client, get_anthropic_client,
+    get_mistral_client, get_groq_client, get_http_session, load_sdk
+)
+from utils import extract_deepseek_reasoning, split_context
+from response_cache import response_cache_key
+from json_stream import JsonArrayStream, extract_array_items
+from json_repair import parse_json, repair_json
+from retry import get_retry_policy, retry_call, MalformedOutputError
+from rate_limit import get_rate_limiter, DEFAULT_OUTPUT_TOKEN_RESERVE
+from tokens import estimate_tokens
+
+# OpenAI reasoning models, which take max_completion_tokens and a structured system prompt
+OPENAI_REASONING_MODELS = ("o1", "o3-mini")
+
+# Model used when the "claude-3-7-sonnet-thinking" option is selected
+ANTHROPIC_THINKING_MODEL = "claude-3-7-sonnet-latest"
+
+# Anthropic output and thinking budgets, in tokens
+ANTHROPIC_MAX_TOKENS = 4096
+ANTHROPIC_THINKING_MAX_TOKENS = 24000
+ANTHROPIC_THINKING_BUDGET = 16000
+
+# Request timeouts, in seconds
+DEFAULT_TIMEOUT = 300
+THINKING_TIMEOUT = 600
+OLLAMA_TIMEOUT = 60
+
+# Appended to the prompt for providers without a native JSON mode
+JSON_ONLY_INSTRUCTION = (
+    "\n\nIMPORTANT: Your response MUST be a valid JSON object with the exact structure shown in the example above. "
+    "Do not include any explanatory text, markdown formatting, or code blocks. Return only the raw JSON object."
+)
+
+# Google safety settings, relaxed so security content such as attack scenarios is not blocked
+DEFAULT_GOOGLE_SAFETY_SETTINGS = {'DANGEROUS': 'block_only_high'}
+
+# Azure OpenAI API version used for every deployment
+AZURE_API_VERSION = '2023-12-01-preview' # Update this as needed
+
+
+@dataclass(frozen=True)
+class Capabilities:
+    """What a provider's API supports natively."""
+    json_mode: bool = False
+    json_schema: bool = False
+    thinking: bool = False
+    vision: bool = False
+    streaming: bool = False
+    # Reuses a prompt prefix it has seen recently, so shared context should go first
+    prompt_caching: bool = False
+
+
+@dataclass(frozen=True)
+class ProviderConfig:
+    """
+    The provider, model and connection settings selected in the sidebar.
+
+    Attributes:
+        provider (str): Provider name as shown in the UI, e.g. "OpenAI API"
+        model (str): Model name, or the deployment name for Azure OpenAI
+        api_key (str): API key, if the provider needs one
+        endpoint (str): Endpoint URL for Azure OpenAI, Ollama and LM Studio Server
+        api_version (str): Azure OpenAI API version
+    """
+    provider: str
+    model: str
+    api_key: str = None
+    endpoint: str = None
+    api_version: str = None
+
+    @property
+    def is_thinking(self):
+        """Whether Anthropic extended thinking mode was selected."""
+        return self.provider == "Anthropic API" and "thinking" in (self.model or "").lower()
+
+
+@dataclass(frozen=True)
+class TaskSpec:
+    """
+    Everything a task needs from a model, independent of the provider.
+
+    Attributes:
+        name (str): Short task name, e.g. "threat_model"
+        system_prompt (str): System prompt sent with the task prompt
+        parse (callable): Turns the model's text output into the task result
+        json_output (bool): Whether the task expects a JSON object back
+        response_schema (dict): Optional OpenAI style json_schema response format
+        local_response_schema (dict): Optional simpler schema for LM Studio Server
+        reasoning_system_prompt (str): System prompt for OpenAI reasoning models
+        max_tokens (int): Optional output token limit for OpenAI compatible APIs
+        google_safety_settings (dict): Optional safety settings for Google models
+        stream_array_key (str): For JSON tasks, the top-level array whose objects
+            can be used one by one, e.g. "threat_model". Lets streams show items
+            as they arrive and keeps the complete items of a truncated response.
+        merge (callable): Combines the outputs of the task run on parts of its
+            input, such as chunks of the threat list, into one, see merge_outputs().
+            Text outputs are joined with blank lines if not set.
+        split (callable): The reverse of merge for tasks built on the threat
+            model. Splits an output into (threat ID, output) pairs, with None
+            as the ID for parts that can't be attributed to a threat. Lets
+            results be reused per threat, see chunking.run_incremental.
+    """
+    name: str
+    system_prompt: str
+    parse: Callable = None
+    json_output: bool = False
+    response_schema: dict = None
+    local_response_schema: dict = None
+    reasoning_system_prompt: str = None
+    max_tokens: int = None
+    google_safety_settings: dict = None
+    stream_array_key: str = None
+    merge: Callable = None
+    split: Callable = None
+
+
+@dataclass
+class TaskResult:
+    """
+    The outcome of running a task.
+
+    Attributes:
+        output: The parsed task result
+        text (str): The raw text returned by the model
+        thinking (str): Extended thinking content, for Anthropic thinking mode
+        reasoning (str): Reasoning extracted from <think> tags, for models such as DeepSeek R1
+        cached (bool): Whether the response came from the response cache
+        partial (bool): Whether the response was incomplete and only the complete
+            items of the task's stream_array_key array were recovered
+        repairs (list): For JSON tasks, the repairs json_repair had to make to the output
+        attempts (int): Number of provider calls made, including retries
+        retry_wait (float): Seconds spent backing off between attempts
+        usage (dict): Token counts reported by the provider, see USAGE_KEYS, or None
+        seconds (float): Wall-clock time the task took, including retries and rate limit waits
+    """
+    output: object
+    text: str
+    thinking: str = None
+    reasoning: str = None
+    cached: bool = False
+    partial: bool = False
+    repairs: list = field(default_factory=list)
+    attempts: int = 1
+    retry_wait: float = 0.0
+    usage: dict = None
+    seconds: float = 0.0
+
+    def to_dict(self):
+        """
+        Return the result as plain data, e.g. to send it from a worker process or write it as JSON.
+
+        Returns:
+            dict: The dataclass fields, holding only lists, dicts, strings, numbers and None
+        """
+        return asdict(self)
+
+
+# Token counts adapters report in their usage dicts. Cache reads and writes are
+# the parts of the input served from, or added to, the provider's prompt cache.
+USAGE_KEYS = ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens")
+
+def _usage(input_tokens=0, output_tokens=0, cache_read_tokens=0, cache_write_tokens=0):
+    return {
+        "input_tokens": input_tokens or 0,
+        "output_tokens": output_tokens or 0,
+        "cache_read_tokens": cache_read_tokens or 0,
+        "cache_write_tokens": cache_write_tokens or 0,
+    }
+
+def _openai_usage(usage):
+    """Convert an OpenAI compatible usage object. Cached tokens are included in prompt_tokens."""
+    if usage is None:
+        return None
+    details = getattr(usage, 'prompt_tokens_details', None)
+    return _usage(usage.prompt_tokens, usage.completion_tokens, getattr(details, 'cached_tokens', 0))
+
+
+class UsageStats:
+    """Token usage summed over every model call in the process, shown in the sidebar."""
+
+    def __init__(self):
+        self.totals = dict.fromkeys(USAGE_KEYS, 0)
+        self._lock = threading.Lock()
+
+    def record(self, usage):
+        with self._lock:
+            for key in USAGE_KEYS:
+                self.totals[key] += usage.get(key, 0)
+
+    def stats(self):
+        """Return the token totals as a dict keyed by USAGE_KEYS."""
+        with self._lock:
+            return dict(self.totals)
+
+
+USAGE_STATS = UsageStats()
+
+
+def merge_outputs(task, outputs):
+    """Combine the outputs of a task run on parts of its input, in order, with the task's merge function."""
+    if task.merge is not None:
+        return task.merge(outputs)
+    return "\n\n".join(output.strip() for output in outputs if output)
+
+def merge_results(task, results):
+    """
+    Combine the TaskResults of a task run on parts of its input, in order, into one.
+
+    The result is partial if any part was, cached only if every part was,
+    and its attempts, backoff and token usage are the totals over all parts.
+    The parts run concurrently, so its time is that of the slowest part.
+    """
+    if len(results) == 1:
+        return results[0]
+
+    def joined(name):
+        parts = [getattr(result, name) for result in results if getattr(result, name)]
+        return "\n\n".join(parts) if parts else None
+
+    usages = [result.usage for result in results if result.usage]
+    repairs = []
+    for result in results:
+        repairs.extend(repair for repair in result.repairs if repair not in repairs)
+    return TaskResult(
+        output=merge_outputs(task, [result.output for result in results]),
+        text=joined("text") or "",
+        thinking=joined("thinking"),
+        reasoning=joined("reasoning"),
+        cached=all(result.cached for result in results),
+        partial=any(result.partial for result in results),
+        repairs=repairs,
+        attempts=sum(result.attempts for result in results),
+        retry_wait=sum(result.retry_wait for result in results),
+        usage={key: sum(usage[key] for usage in usages) for key in USAGE_KEYS} if usages else None,
+        seconds=max(result.seconds for result in results),
+    )
+
+
+def parse_json_output(text):
+    """
+    Parse a JSON object from model output.
+
+    Code fences, comments, trailing commas and similar damage are repaired
+    first, see json_repair.repair_json.
+
+    Raises:
+        json.JSONDecodeError: If no valid JSON can be recovered
+    """
+    return parse_json(text)[0]
+
+
+def _json_response_format(task, config, capabilities):
+    """Pick the response_format argument for an OpenAI compatible chat completion."""
+    if not task.json_output:
+        return None
+    if capabilities.json_schema:
+        schema = task.local_response_schema if config.provider == "LM Studio Server" else None
+        schema = schema or task.response_schema
+        if schema:
+            return schema
+    if capabilities.json_mode:
+        return {"type": "json_object"}
+    return None
+
+
+class ProviderAdapter:
+    """
+    Base class for provider adapters.
+
+    Subclasses implement complete(), which sends one system and user prompt
+    pair and returns the raw text plus any thinking content and token usage,
+    and stream(), which yields the same output piece by piece as the model
+    generates it.
+
+    Prompts built with utils.create_context_prompt start with context shared
+    by several tasks. Adapters for providers with prompt caching send that
+    context ahead of the task's system prompt, so it forms an identical prefix
+    for every task on the same application.
+    """
+    capabilities = Capabilities()
+
+    def complete(self, config, task, prompt):
+        """
+        Run a single completion.
+
+        Args:
+            config (ProviderConfig): Provider, model and credentials
+            task (TaskSpec): The task being run
+            prompt (str): The user prompt
+
+        Returns:
+            tuple: (text, thinking, usage) where thinking is None unless the provider
+                   returned it, and usage is a dict of USAGE_KEYS or None
+        """
+        raise NotImplementedError
+
+    def stream(self, config, task, prompt):
+        """
+        Run a single completion, yielding output as it arrives.
+
+        The default implementation waits for complete() and yields its result
+        in one piece, for providers without a streaming API.
+
+        Yields:
+            tuple: (kind, delta) where kind is "text" or "thinking", or
+                   ("usage", dict) once the provider has reported token usage
+        """
+        text, thinking, usage = self.complete(config, task, prompt)
+        if thinking:
+            yield "thinking", thinking
+        if text:
+            yield "text", text
+        if usage:
+            yield "usage", usage
+
+
+class OpenAICompatibleAdapter(ProviderAdapter):
+    """Adapter for APIs that follow the OpenAI chat completions interface."""
+
+    def client(self, config):
+        raise NotImplementedError
+
+    def system_prompt(self, config, task):
+        return task.system_prompt
+
+    def messages(self, config, task, prompt):
+        context, instructions = split_context(prompt)
+        if context is not None and self.capabilities.prompt_caching:
+            # Shared context first, so every task on the same application hits the prefix cache
+            return [
+                {"role": "system", "content": context},
+                {"role": "system", "content": self.system_prompt(config, task)},
+                {"role": "user", "content": instructions}
+            ]
+        return [
+            {"role": "system", "content": self.system_prompt(config, task)},
+            {"role": "user", "content": prompt}
+        ]
+
+    def stream_options(self):
+        """Extra arguments for streaming calls."""
+        return {}
+
+    def request_options(self, config, task):
+        options = {}
+        if task.max_tokens:
+            options["max_tokens"] = task.max_tokens
+        return options
+
+    def request(self, config, task, prompt):
+        """Build the keyword arguments for a chat completion call."""
+        options = self.request_options(config, task)
+        response_format = _json_response_format(task, config, self.capabilities)
+        if response_format:
+            options["response_format"] = response_format
+        return dict(model=config.model, messages=self.messages(config, task, prompt), **options)
+
+    def complete(self, config, task, prompt):
+        response = self.client(config).chat.completions.create(**self.request(config, task, prompt))
+        return response.choices[0].message.content, None, _openai_usage(response.usage)
+
+    def stream(self, config, task, prompt):
+        request = dict(self.request(config, task, prompt), **self.stream_options())
+        # The context manager closes the connection if the consumer stops reading early
+        with self.client(config).chat.completions.create(stream=True, **request) as response:
+            for chunk in response:
+                # Azure sends an initial chunk with no choices for content filter results
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield "text", chunk.choices[0].delta.content
+                # With include_usage, the last chunk has no choices and carries the usage
+                if getattr(chunk, 'usage', None):
+                    yield "usage", _openai_usage(chunk.usage)
+
+
+class OpenAIAdapter(OpenAICompatibleAdapter):
+    capabilities = Capabilities(json_mode=True, json_schema=True, vision=True, streaming=True, prompt_caching=True)
+
+    def client(self, config):
+        return get_openai_client(config.api_key)
+
+    def system_prompt(self, config, task):
+        if config.model in OPENAI_REASONING_MODELS and task.reasoning_system_prompt:
+            return task.reasoning_system_prompt
+        return task.system_prompt
+
+    def stream_options(self):
+        return {"stream_options": {"include_usage": True}}
+
+    def request_options(self, config, task):
+        if config.model in OPENAI_REASONING_MODELS:
+            return {"max_completion_tokens": task.max_tokens} if task.max_tokens else {}
+        return super().request_options(config, task)
+
+
+class AzureOpenAIAdapter(OpenAICompatibleAdapter):
+    capabilities = Capabilities(json_mode=True, streaming=True, prompt_caching=True)
+
+    def client(self, config):
+        return get_azure_openai_client(config.endpoint, config.api_key, config.api_version)
+
+    def request_options(self, config, task):
+        return {}
+
+
+class LMStudioAdapter(OpenAICompatibleAdapter):
+    capabilities = Capabilities(json_schema=True, streaming=True)
+
+    def client(self, config):
+        # LM Studio Server doesn't require an API key
+        return get_openai_client("not-needed", base_url=f"{config.endpoint}/v1")
+
+
+class GroqAdapter(OpenAICompatibleAdapter):
+    capabilities = Capabilities(json_mode=True, streaming=True)
+
+    def client(self, config):
+        return get_groq_client(config.api_key)
+
+    def request_options(self, config, task):
+        return {}
+
+
+class MistralAdapter(OpenAICompatibleAdapter):
+    capabilities = Capabilities(json_mode=True, streaming=True)
+
+    def client(self, config):
+        return get_mistral_client(config.api_key)
+
+    def request_options(self, config, task):
+        return {}
+
+    def request(self, config, task, prompt):
+        options = {}
+        if task.json_output:
+            options["response_format"] = {"type": "json_object"}
+        return dict(model=config.model, messages=self.messages(config, task, prompt), **options)
+
+    def complete(self, config, task, prompt):
+        response = self.client(config).chat.complete(**self.request(config, task, prompt))
+        return response.choices[0].message.content, None, _openai_usage(response.usage)
+
+    def stream(self, config, task, prompt):
+        with self.client(config).chat.stream(**self.request(config, task, prompt)) as events:
+            for event in events:
+                if event.data.choices and event.data.choices[0].delta.content:
+                    yield "text", event.data.choices[0].delta.content
+                # The last chunk carries the usage for the whole response
+                if getattr(event.data, 'usage', None):
+                    yield "usage", _openai_usage(event.data.usage)
+
+
+class AnthropicAdapter(ProviderAdapter):
+    capabilities = Capabilities(thinking=True, vision=True, streaming=True, prompt_caching=True)
+
+    def request(self, config, task, prompt):
+        """Build the keyword arguments for a messages call."""
+        system = task.system_prompt
+        context, instructions = split_context(prompt)
+        if context is not None:
+            # Mark the shared context as a cache breakpoint. Later tasks on the same
+            # application read it from the cache instead of processing it again.
+            system = [
+                {"type": "text", "text": context, "cache_control": {"type": "ephemeral"}},
+                {"type": "text", "text": task.system_prompt},
+            ]
+            prompt = instructions
+        options = {
+            "system": system,
+            "messages": [{"role": "user", "content": prompt}],
+        }
+        if config.is_thinking:
+            return dict(
+                model=ANTHROPIC_THINKING_MODEL,
+                max_tokens=ANTHROPIC_THINKING_MAX_TOKENS,
+                thinking={"type": "enabled", "budget_tokens": ANTHROPIC_THINKING_BUDGET},
+                timeout=THINKING_TIMEOUT,
+                **options
+            )
+        return dict(model=config.model, max_tokens=ANTHROPIC_MAX_TOKENS, timeout=DEFAULT_TIMEOUT, **options)
+
+    def complete(self, config, task, prompt):
+        response = get_anthropic_client(config.api_key).messages.create(**self.request(config, task, prompt))
+        text = ''.join(block.text for block in response.content if block.type == "text")
+        thinking = ''.join(block.thinking for block in response.content if block.type == "thinking")
+        return text, thinking or None, self.usage(response.usage)
+
+    def usage(self, usage, output_tokens=None):
+        """Convert Anthropic usage, where input_tokens excludes cache reads and writes."""
+        cache_read = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        cache_write = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+        return _usage(
+            (usage.input_tokens or 0) + cache_read + cache_write,
+            usage.output_tokens if output_tokens is None else output_tokens,
+            cache_read,
+            cache_write,
+        )
+
+    def stream(self, config, task, prompt):
+        input_usage = None
+        with get_anthropic_client(config.api_key).messages.create(stream=True, **self.request(config, task, prompt)) as events:
+            for event in events:
+                if event.type == "message_start":
+                    input_usage = event.message.usage
+                elif event.type == "message_delta" and input_usage is not None:
+                    yield "usage", self.usage(input_usage, event.usage.output_tokens)
+                if event.type != "content_block_delta":
+                    continue
+                if event.delta.type == "text_delta":
+                    yield "text", event.delta.text
+                elif event.delta.type == "thinking_delta":
+                    yield "thinking", event.delta.thinking
+
+
+class GoogleAdapter(ProviderAdapter):
+    capabilities = Capabilities(json_mode=True, vision=True, streaming=True)
+
+    def model(self, config, task):
+        genai = load_sdk("genai")
+        genai.configure(api_key=config.api_key)
+        generation_config = {"response_mime_type": "application/json"} if task.json_output else None
+        return genai.GenerativeModel(
+            config.model,
+            system_instruction=task.system_prompt,
+            generation_config=generation_config,
+        )
+
+    def complete(self, config, task, prompt):
+        response = self.model(config, task).generate_content(
+            prompt,
+            safety_settings=task.google_safety_settings or DEFAULT_GOOGLE_SAFETY_SETTINGS
+        )
+        return response.candidates[0].content.parts[0].text, None, self.usage(response)
+
+    def usage(self, response):
+        metadata = getattr(response, 'usage_metadata', None)
+        if metadata is None:
+            return None
+        return _usage(metadata.prompt_token_count, metadata.candidates_token_count,
+                      getattr(metadata, 'cached_content_token_count', 0))
+
+    def stream(self, config, task, prompt):
+        response = self.model(config, task).generate_content(
+            prompt,
+            safety_settings=task.google_safety_settings or DEFAULT_GOOGLE_SAFETY_SETTINGS,
+            stream=True
+        )
+        for chunk in response:
+            if chunk.candidates and chunk.candidates[0].content.parts:
+                yield "text", ''.join(part.text for part in chunk.candidates[0].content.parts)
+        usage = self.usage(response)
+        if usage:
+            yield "usage", usage
+
+
+class OllamaAdapter(ProviderAdapter):
+    capabilities = Capabilities(json_mode=True, streaming=True)
+
+    def request(self, config, task, prompt, stream):
+        """Build the URL and body for an /api/chat call."""
+        endpoint = config.endpoint if config.endpoint.endswith('/') else config.endpoint + '/'
+        data = {
+            "model": config.model,
+            "stream": stream,
+            "messages": [
+                {"role": "system", "content": task.system_prompt},
+                {"role": "user", "content": prompt}
+            ]
+        }
+        if task.json_output:
+            data["format"] = "json"
+        return endpoint + "api/chat", data
+
+    def complete(self, config, task, prompt):
+        url, data = self.request(config, task, prompt, stream=False)
+        response = get_http_session().post(url, json=data, timeout=OLLAMA_TIMEOUT)
+        response.raise_for_status()
+        body = response.json()
+        return body["message"]["content"], None, _usage(body.get("prompt_eval_count"), body.get("eval_count"))
+
+    def stream(self, config, task, prompt):
+        url, data = self.request(config, task, prompt, stream=True)
+        # The timeout applies between chunks, so long generations are fine as long as tokens keep coming
+        with get_http_session().post(url, json=data, timeout=OLLAMA_TIMEOUT, stream=True) as response:
+            response.raise_for_status()
+            # Ollama streams one JSON object per line
+            for line in response.iter_lines(chunk_size=None):
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if chunk.get("message", {}).get("content"):
+                    yield "text", chunk["message"]["content"]
+                if chunk.get("done"):
+                    # The final object carries the token counts
+                    yield "usage", _usage(chunk.get("prompt_eval_count"), chunk.get("eval_count"))
+                    break
+
+
+# Adapters keyed by the provider names used in the UI
+PROVIDERS = {
+    "OpenAI API": OpenAIAdapter(),
+    "Anthropic API": AnthropicAdapter(),
+    "Azure OpenAI Service": AzureOpenAIAdapter(),
+    "Google AI API": GoogleAdapter(),
+    "Mistral API": MistralAdapter(),
+    "Groq API": GroqAdapter(),
+    "Ollama": OllamaAdapter(),
+    "LM Studio Server": LMStudioAdapter(),
+}
+
+def get_provider(provider):
+    """
+    Look up the adapter for a provider name.
+
+    Raises:
+        ValueError: If the provider is not supported
+    """
+    try:
+        return PROVIDERS[provider]
+    except KeyError:
+        raise ValueError(f"Unsupported model provider: {provider}") from None
+
+def _prepare_prompt(task, adapter, prompt):
+    """Add the JSON-only instruction for providers without a native JSON mode."""
+    if task.json_output and not (adapter.capabilities.json_mode or adapter.capabilities.json_schema):
+        return prompt + JSON_ONLY_INSTRUCTION
+    return prompt
+
+def _build_result(task, raw_text, thinking, cache=None, cache_key=None, cached=False, usage=None):
+    """
+    Extract reasoning, parse the output and store it in the cache if it parsed.
+
+    Raises:
+        MalformedOutputError: If the output can't be parsed and no complete items can be recovered
+    """
+    # Reasoning models such as DeepSeek R1 wrap their reasoning in <think> tags
+    reasoning, text = extract_deepseek_reasoning(raw_text)
+
+    # Well-formed JSON is the common case, so the repair pass only runs when it doesn't parse.
+    # The parser then reads the repaired text and doesn't need to repair it again.
+    repair = None
+    if task.json_output:
+        try:
+            json.loads(text)
+        except ValueError:
+            repair = repair_json(text)
+    repairs = repair.repairs if repair else []
+    try:
+        # A cut off array would otherwise end in a half-written item, keep only the complete ones
+        if repair and repair.truncated and task.stream_array_key:
+            raise ValueError("Truncated JSON")
+        output = task.parse(repair.text if repair else text) if task.parse else text
+    except ValueError as e:
+        # Keep whatever complete items a truncated or malformed response contains
+        items = extract_array_items(text, task.stream_array_key) if task.stream_array_key else []
+        if not items:
+            raise MalformedOutputError(f"The {task.name} response couldn't be parsed: {e}") from e
+        output = {task.stream_array_key: items}
+        return TaskResult(output=output, text=text, thinking=thinking, reasoning=reasoning, cached=cached,
+                          partial=True, repairs=repairs, usage=usage)
+
+    # Only cache complete responses
+    if cache is not None and not cached and not (repair and repair.truncated):
+        cache.put(cache_key, raw_text, thinking)
+    return TaskResult(output=output, text=text, thinking=thinking, reasoning=reasoning, cached=cached,
+                      repairs=repairs, usage=usage)
+
+def _reserve_capacity(task, config, prompt):
+    """
+    Wait until the provider's client-side rate limits have room for a call.
+
+    Returns:
+        tuple: (limiter, reserved, prompt_tokens) to pass to _settle_capacity.
+               limiter is None if the provider is not rate limited.
+    """
+    limiter = get_rate_limiter(config)
+    if limiter is None:
+        return None, 0, 0
+    prompt_tokens = estimate_tokens((task.system_prompt or "") + prompt, config.model)
+    reserved = limiter.acquire(prompt_tokens + (task.max_tokens or DEFAULT_OUTPUT_TOKEN_RESERVE))
+    return limiter, reserved, prompt_tokens
+
+def _settle_capacity(reservation, config, output, usage=None):
+    """Give back the tokens a call reserved but didn't use, going by the provider's usage if it reported any."""
+    if usage:
+        USAGE_STATS.record(usage)
+    limiter, reserved, prompt_tokens = reservation
+    if limiter is None:
+        return
+    if usage:
+        used = usage["input_tokens"] + usage["output_tokens"]
+    else:
+        used = prompt_tokens + (estimate_tokens(output, config.model) if output else 0)
+    limiter.settle(reserved, used)
+
+def run_task(task, config, prompt, cache=None, retry_policy=None):
+    """
+    Run a task against the configured provider.
+
+    This is the single path every task and provider goes through: prompt
+    preparation, the provider call, reasoning extraction and parsing.
+    Every call waits for the provider's client-side rate limits, see
+    rate_limit.py. Rate limits, transient errors and unparseable output are
+    retried with backoff, see retry.retry_call.
+
+    Args:
+        task (TaskSpec): The task to run
+        config (ProviderConfig): Provider, model and credentials
+        prompt (str): The task prompt
+        cache (ResponseCache): Optional cache of provider responses. Only
+            responses that parse successfully are stored.
+        retry_policy (RetryPolicy): Overrides the provider's default retry policy
+
+    Returns:
+        TaskResult: The parsed output together with the raw text, any reasoning,
+                    token usage and timings
+
+    Raises:
+        ValueError: If the provider is not supported
+        MalformedOutputError: If the output can't be parsed, after the retries ran out
+        Exception: Any error raised by the provider's client library
+    """
+    start = time.monotonic()
+    adapter = get_provider(config.provider)
+    prompt = _prepare_prompt(task, adapter, prompt)
+
+    cache_key = response_cache_key(task, config, prompt) if cache is not None else None
+    cached = cache.get(cache_key) if cache is not None else None
+    if cached is not None:
+        raw_text, thinking = cached
+        result = _build_result(task, raw_text or "", thinking, cache, cache_key, cached=True)
+        result.seconds = time.monotonic() - start
+        return result
+
+    def attempt():
+        reservation = _reserve_capacity(task, config, prompt)
+        raw_text, thinking, usage = "", None, None
+        try:
+            raw_text, thinking, usage = adapter.complete(config, task, prompt)
+        finally:
+            _settle_capacity(reservation, config, (raw_text or "") + (thinking or ""), usage)
+        return _build_result(task, raw_text or "", thinking, cache, cache_key, usage=usage)
+
+    waits = []
+    result = retry_call(attempt, retry_policy or get_retry_policy(config.provider),
+                        on_retry=lambda attempt, wait, exc: waits.append(wait))
+    result.attempts = len(waits) + 1
+    result.retry_wait = sum(waits)
+    result.seconds = time.monotonic() - start
+    return result
+
+
+class _ThinkTagFilter:
+    """Drop <think>...</think> sections from streamed text, even when a tag is split across chunks."""
+    OPEN, CLOSE = "<think>", "</think>"
+
+    def __init__(self):
+        self.buffer = ""
+        self.in_think = False
+
+    def feed(self, delta):
+        self.buffer += delta
+        visible = []
+        while self.buffer:
+            tag = self.CLOSE if self.in_think else self.OPEN
+            index = self.buffer.find(tag)
+            if index >= 0:
+                if not self.in_think:
+                    visible.append(self.buffer[:index])
+                self.buffer = self.buffer[index + len(tag):]
+                self.in_think = not self.in_think
+                continue
+            # Hold back a possible partial tag at the end of the buffer
+            keep = next((n for n in range(len(tag) - 1, 0, -1) if self.buffer.endswith(tag[:n])), 0)
+            if not self.in_think:
+                visible.append(self.buffer[:len(self.buffer) - keep])
+            self.buffer = self.buffer[len(self.buffer) - keep:]
+            break
+        return ''.join(visible)
+
+    def flush(self):
+        remainder, self.buffer = ("" if self.in_think else self.buffer), ""
+        return remainder
+
+
+class TaskStream:
+    """
+    Run a task, yielding the model's output as it is generated.
+
+    Iterating yields text deltas suitable for st.write_stream. Reasoning in
+    <think> tags is held back, and Anthropic thinking is collected rather than
+    yielded. Once iteration finishes, `result` holds the TaskResult, parsed
+    exactly as run_task() would.
+
+    Attributes:
+        text (str): The visible text received so far
+        thinking (str): The thinking content received so far
+        items (list): For tasks with a stream_array_key, the array objects completed so far
+        result (TaskResult): The final result, or None until the stream is exhausted
+    """
+
+    def __init__(self, task, config, prompt, cache=None):
+        self.task = task
+        self.config = config
+        self.prompt = prompt
+        self.cache = cache
+        self.text = ""
+        self.thinking = ""
+        self.items = []
+        self.result = None
+
+    def __iter__(self):
+        start = time.monotonic()
+        adapter = get_provider(self.config.provider)
+        prompt = _prepare_prompt(self.task, adapter, self.prompt)
+
+        cache_key = response_cache_key(self.task, self.config, prompt) if self.cache is not None else None
+        cached = self.cache.get(cache_key) if self.cache is not None else None
+        reservation = (None, 0, 0)
+        if cached is not None:
+            chunks = [("thinking", cached[1] or ""), ("text", cached[0])]
+        else:
+            reservation = _reserve_capacity(self.task, self.config, prompt)
+            chunks = adapter.stream(self.config, self.task, prompt)
+
+        raw_parts = []
+        usage = None
+        think_filter = _ThinkTagFilter()
+        array_stream = JsonArrayStream(self.task.stream_array_key) if self.task.stream_array_key else None
+        try:
+            for kind, delta in chunks:
+                if kind == "thinking":
+                    self.thinking += delta
+                    continue
+                if kind == "usage":
+                    usage = delta
+                    continue
+                raw_parts.append(delta)
+                visible = think_filter.feed(delta)
+                if visible:
+                    self._add_text(visible, array_stream)
+                    yield visible
+        finally:
+            _settle_capacity(reservation, self.config, ''.join(raw_parts) + self.thinking, usage)
+        visible = think_filter.flush()
+        if visible:
+            self._add_text(visible, array_stream)
+            yield visible
+        if array_stream is not None:
+            self.items.extend(array_stream.close())
+
+        self.result = _build_result(
+            self.task, ''.join(raw_parts), self.thinking or None, self.cache, cache_key, cached is not None, usage
+        )
+        self.result.seconds = time.monotonic() - start
+
+    def _add_text(self, visible, array_stream):
+        self.text += visible
+        if array_stream is not None:
+            self.items.extend(array_stream.feed(visible))
+
+def stream_task(task, config, prompt, cache=None):
+    """
+    Start a task whose output is shown while it is generated.
+
+    Args:
+        task (TaskSpec): The task to run
+        config (ProviderConfig): Provider, model and credentials
+        prompt (str): The task prompt
+        cache (ResponseCache): Optional cache of provider responses
+
+    Returns:
+        TaskStream: Iterate it for text deltas, then read its `result`
+    """
+    return TaskStream(task, config, prompt, cache)
@@ -0,0 +1,180 @@
+import os
+import threading
+import time
+from collections import deque
+
+from llm_clients import credential_fingerprint
+
+# Environment variable prefix for each provider's client-side limits, e.g.
+# TARA_OPENAI_REQUESTS_PER_MINUTE and TARA_OPENAI_TOKENS_PER_MINUTE. Limits are
+# off unless set, since usage tiers differ too much for one default to fit.
+# Providers not listed, such as local servers, are never limited.
+PROVIDER_RATE_LIMIT_ENV = {
+    "OpenAI API": "TARA_OPENAI",
+    "Azure OpenAI Service": "TARA_AZURE_OPENAI",
+    "Anthropic API": "TARA_ANTHROPIC",
+    "Google AI API": "TARA_GOOGLE",
+    "Mistral API": "TARA_MISTRAL",
+    "Groq API": "TARA_GROQ",
+}
+
+# Output tokens reserved for a call whose task doesn't set max_tokens
+DEFAULT_OUTPUT_TOKEN_RESERVE = 1000
+
+
+class TokenBucket:
+    """
+    Continuously refilling bucket holding up to one minute's worth of capacity.
+
+    Not thread safe on its own, RateLimiter serializes access.
+    """
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.rate = self.capacity / 60
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount, now):
+        """Seconds until `amount` is available, 0 if it is available now."""
+        self._refill(now)
+        # A request larger than the bucket would wait forever, let it through once the bucket is full
+        amount = min(amount, self.capacity)
+        return max(amount - self.level, 0) / self.rate
+
+    def take(self, amount):
+        self.level -= min(amount, self.capacity)
+
+    def give_back(self, amount):
+        self.level = min(self.capacity, self.level + amount)
+
+
+class RateLimiter:
+    """
+    Requests per minute and tokens per minute limits for one provider and API key.
+
+    Callers are served strictly in arrival order: a caller waiting for a large
+    token reservation is not overtaken by smaller ones, so nobody starves.
+    Tokens are reserved up front from an estimate, and the unused part is
+    returned with settle() once the response is in.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self._queue = deque()
+        self._condition = threading.Condition()
+
+    def acquire(self, tokens=0):
+        """
+        Block until a request of `tokens` tokens fits within the limits, then reserve it.
+
+        Args:
+            tokens (int): Estimated prompt plus output tokens of the request
+
+        Returns:
+            int: The number of tokens reserved, to pass to settle()
+        """
+        ticket = object()
+        start = time.monotonic()
+        with self._condition:
+            self._queue.append(ticket)
+            try:
+                while True:
+                    wait = None
+                    if self._queue[0] is ticket:
+                        now = time.monotonic()
+                        wait = max(
+                            self.requests.wait_time(1, now) if self.requests else 0,
+                            self.tokens.wait_time(tokens, now) if self.tokens else 0,
+                        )
+                        if wait <= 0:
+                            break
+                    # Only the head of the queue waits on the clock, everyone else waits their turn
+                    self._condition.wait(wait)
+                if self.requests:
+                    self.requests.take(1)
+                if self.tokens:
+                    self.tokens.take(tokens)
+            finally:
+                self._queue.remove(ticket)
+                self._condition.notify_all()
+
+            waited = time.monotonic() - start
+            if waited > 0.01:
+                self.waits += 1
+                self.wait_seconds += waited
+        return tokens
+
+    def settle(self, reserved, used):
+        """Return the part of a reservation the request didn't use."""
+        if self.tokens and used < reserved:
+            with self._condition:
+                self.tokens.give_back(reserved - used)
+                self._condition.notify_all()
+
+    def stats(self):
+        """Return how many calls had to wait and for how long in total, as a dict."""
+        with self._condition:
+            return {"waits": self.waits, "wait_seconds": self.wait_seconds}
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def _env_limit(name):
+    # Unset, empty or 0 leaves the limit off
+    return int(os.getenv(name) or 0) or None
+
+def get_rate_limits(provider):
+    """
+    Return the (requests per minute, tokens per minute) limits for a provider.
+
+    Both are read from the provider's environment variables, see
+    PROVIDER_RATE_LIMIT_ENV, so they can match the usage tier of the API key.
+    Either value is None when that limit is off.
+    """
+    prefix = PROVIDER_RATE_LIMIT_ENV.get(provider)
+    if prefix is None:
+        return None, None
+    return _env_limit(f'{prefix}_REQUESTS_PER_MINUTE'), _env_limit(f'{prefix}_TOKENS_PER_MINUTE')
+
+def get_rate_limiter(config):
+    """
+    Return the process-wide rate limiter for a provider, endpoint and API key.
+
+    Every session using the same key shares one limiter, since the provider
+    enforces its limits per key rather than per session.
+
+    Args:
+        config (ProviderConfig): Provider, model and credentials
+
+    Returns:
+        RateLimiter: The shared limiter, or None if the provider is not limited
+    """
+    requests_per_minute, tokens_per_minute = get_rate_limits(config.provider)
+    if not requests_per_minute and not tokens_per_minute:
+        return None
+    key = (config.provider, config.endpoint, credential_fingerprint(config.api_key))
+    with _limiters_lock:
+        limiter = _limiters.get(key)
+        if limiter is None:
+            limiter = _limiters[key] = RateLimiter(requests_per_minute, tokens_per_minute)
+        return limiter
+
+def rate_limit_stats():
+    """Return the waits and total wait time summed over every limiter, as a dict."""
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    totals = {"waits": 0, "wait_seconds": 0.0}
+    for limiter in limiters:
+        stats = limiter.stats()
+        totals["waits"] += stats["waits"]
+        totals["wait_seconds"] += stats["wait_seconds"]
+    return totals
@@ -0,0 +1,171 @@
+import os
+import sqlite3
+import threading
+import time
+from functools import lru_cache
+
+# Bump this whenever summarize_file changes its output format so stale summaries are ignored
+SUMMARY_FORMAT_VERSION = 3
+
+# Entries not read for this long are removed when the cache is opened
+CACHE_MAX_AGE_DAYS = 30
+
+def default_cache_dir():
+    """
+    Return the directory used for on-disk caches.
+
+    Uses the TARA_CACHE_DIR environment variable if set, otherwise ~/.cache/tara.
+    """
+    return os.path.expanduser(os.getenv('TARA_CACHE_DIR', os.path.join('~', '.cache', 'tara')))
+
+
+class RepoAnalysisCache:
+    """
+    SQLite-backed cache for GitHub repository analyses.
+
+    Two tables are kept:
+      - analyses: the finished system description, keyed by repository, commit SHA,
+        token limit and token estimation model
+      - file_summaries: summarize_file output keyed by file path and git blob SHA,
+        so a new commit only needs the files whose content actually changed to be
+        fetched again. The path is part of the key because the summary names the
+        file and depends on its extension, so identical blobs at different paths,
+        such as empty __init__.py files, each get their own summary.
+    """
+
+    def __init__(self, path=None):
+        if path is None:
+            path = os.path.join(default_cache_dir(), 'repo_analysis.sqlite3')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyses (
+                repo TEXT NOT NULL,
+                commit_sha TEXT NOT NULL,
+                token_limit INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                summary_version INTEGER NOT NULL,
+                description TEXT NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (repo, commit_sha, token_limit, model, summary_version)
+            )
+        """)
+        # Summaries keyed by blob SHA alone were shared between files at different paths
+        self._conn.execute("DROP TABLE IF EXISTS blob_summaries")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_summaries (
+                path TEXT NOT NULL,
+                blob_sha TEXT NOT NULL,
+                summary_version INTEGER NOT NULL,
+                summary TEXT NOT NULL,
+                accessed_at REAL NOT NULL,
+                PRIMARY KEY (blob_sha, path, summary_version)
+            )
+        """)
+        self._conn.commit()
+        self.prune()
+
+    def get_analysis(self, repo, commit_sha, token_limit, model):
+        """
+        Look up a finished analysis.
+
+        Returns:
+            str: The cached system description, or None on a cache miss
+        """
+        key = (repo, commit_sha, token_limit, model, SUMMARY_FORMAT_VERSION)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT description FROM analyses WHERE repo=? AND commit_sha=? AND token_limit=? AND model=? AND summary_version=?",
+                key
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE analyses SET accessed_at=? WHERE repo=? AND commit_sha=? AND token_limit=? AND model=? AND summary_version=?",
+                (time.time(),) + key
+            )
+            self._conn.commit()
+        return row[0]
+
+    def put_analysis(self, repo, commit_sha, token_limit, model, description):
+        """Store a finished analysis."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyses VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (repo, commit_sha, token_limit, model, SUMMARY_FORMAT_VERSION, description, time.time())
+            )
+            self._conn.commit()
+
+    def get_file_summaries(self, blob_shas):
+        """
+        Look up file summaries by path and git blob SHA.
+
+        Args:
+            blob_shas (dict): Mapping of file path to the blob SHA of its content
+
+        Returns:
+            dict: Mapping of file path to summary for every file found in the cache
+        """
+        unique_shas = list(set(blob_shas.values()))
+        summaries = {}
+        now = time.time()
+        with self._lock:
+            # Stay well below SQLite's bound parameter limit
+            for start in range(0, len(unique_shas), 500):
+                batch = unique_shas[start:start + 500]
+                placeholders = ','.join('?' * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT path, blob_sha, summary FROM file_summaries WHERE summary_version=? AND blob_sha IN ({placeholders})",
+                    [SUMMARY_FORMAT_VERSION] + batch
+                ).fetchall()
+                found = [(path, blob_sha) for path, blob_sha, _ in rows if blob_shas.get(path) == blob_sha]
+                summaries.update((path, summary) for path, blob_sha, summary in rows if blob_shas.get(path) == blob_sha)
+                self._conn.executemany(
+                    "UPDATE file_summaries SET accessed_at=? WHERE path=? AND blob_sha=? AND summary_version=?",
+                    [(now, path, blob_sha, SUMMARY_FORMAT_VERSION) for path, blob_sha in found]
+                )
+            self._conn.commit()
+        return summaries
+
+    def put_file_summaries(self, blob_shas, summaries):
+        """
+        Store file summaries.
+
+        Args:
+            blob_shas (dict): Mapping of file path to the blob SHA of its content
+            summaries (dict): Mapping of file path to summary
+        """
+        if not summaries:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO file_summaries VALUES (?, ?, ?, ?, ?)",
+                [(path, blob_shas[path], SUMMARY_FORMAT_VERSION, summary, now) for path, summary in summaries.items()]
+            )
+            self._conn.commit()
+
+    def prune(self, max_age_days=CACHE_MAX_AGE_DAYS):
+        """Remove entries that have not been read for `max_age_days` days."""
+        cutoff = time.time() - max_age_days * 24 * 60 * 60
+        with self._lock:
+            self._conn.execute("DELETE FROM analyses WHERE accessed_at < ?", (cutoff,))
+            self._conn.execute("DELETE FROM file_summaries WHERE accessed_at < ?", (cutoff,))
+            self._conn.commit()
+
+
+@lru_cache(maxsize=None)
+def get_repo_cache(path=None):
+    """
+    Return the process-wide repository analysis cache, shared by all sessions.
+
+    Args:
+        path (str): Optional path of the SQLite database
+
+    Returns:
+        RepoAnalysisCache: The shared cache instance
+    """
+    return RepoAnalysisCache(path)
@@ -0,0 +1,125 @@
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from providers import run_task
+from threat_model import create_threat_model_prompt, get_threat_model_by_category, THREAT_MODEL_TASK, with_threat_ids
+from attack_tree import create_attack_tree_prompt, ATTACK_TREE_TASK
+from mitigations import create_mitigations_prompt, MITIGATIONS_TASK
+from dread import create_dread_assessment_prompt, DREAD_TASK
+from test_cases import create_test_cases_prompt, TEST_CASES_TASK
+from chunking import run_incremental
+
+# Report sections, in the order of the tabs
+REPORT_SECTIONS = ("threat_model", "attack_tree", "mitigations", "dread_assessment", "test_cases")
+
+# Sections built from the threat model, and the functions that create their prompts
+THREAT_DEPENDENT_SECTIONS = {
+    "mitigations": (MITIGATIONS_TASK, create_mitigations_prompt),
+    "dread_assessment": (DREAD_TASK, create_dread_assessment_prompt),
+    "test_cases": (TEST_CASES_TASK, create_test_cases_prompt),
+}
+
+# Enough workers for every section to be in flight at once
+REPORT_WORKERS = len(REPORT_SECTIONS)
+
+# Recorded for the sections that depend on a threat model that failed
+SKIPPED_SECTION_ERROR = "Skipped because the threat model could not be generated."
+
+def _run_threat_section(task, config, threats, create_prompt, cache, store):
+    # Threats whose results are already in the store aren't sent to the model again
+    result, _ = run_incremental(task, config, threats, create_prompt, store=store, cache=cache)
+    return result
+
+def generate_report(config, app_type, authentication, internet_facing, sensitive_data, app_input,
+                    sections=REPORT_SECTIONS, cache=None, max_workers=REPORT_WORKERS, store=None,
+                    threat_model_by_category=False):
+    """
+    Generate several report sections with as many model calls in flight as possible.
+
+    The attack tree only needs the application details, so it starts alongside
+    the threat model. Mitigations, the DREAD assessment and test cases start as
+    soon as the threat model is available. End-to-end latency is therefore the
+    threat model plus the slowest dependent section, not the sum of all calls.
+    Large threat lists are split into chunks that run in parallel, and only
+    threats without a stored result are sent, see chunking.py.
+
+    Args:
+        config (ProviderConfig): Provider, model and credentials
+        app_type, authentication, internet_facing, sensitive_data, app_input: Application details
+        sections (iterable): Names from REPORT_SECTIONS to generate
+        cache (ResponseCache): Optional response cache passed to run_task
+        max_workers (int): Maximum number of concurrent model calls
+        store (ResponseCache): Optional per-threat results to reuse, see chunking.run_incremental
+        threat_model_by_category (bool): Generate the threat model with one call
+            per STRIDE category, see threat_model.get_threat_model_by_category
+
+    Yields:
+        tuple: (section, result, error) as each section finishes, where result
+               is a TaskResult and error is the exception raised, if any. If the
+               threat model fails, the sections that depend on it are not run.
+    """
+    sections = [section for section in REPORT_SECTIONS if section in set(sections)]
+    needs_threat_model = any(section in THREAT_DEPENDENT_SECTIONS for section in sections)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, int(max_workers)), thread_name_prefix="report")
+    pending = {}
+    try:
+        if "threat_model" in sections or needs_threat_model:
+            if threat_model_by_category:
+                future = pool.submit(get_threat_model_by_category, config, app_type, authentication, internet_facing,
+                                     sensitive_data, app_input, cache)
+            else:
+                prompt = create_threat_model_prompt(app_type, authentication, internet_facing, sensitive_data, app_input)
+                future = pool.submit(run_task, THREAT_MODEL_TASK, config, prompt, cache)
+            pending[future] = "threat_model"
+        if "attack_tree" in sections:
+            prompt = create_attack_tree_prompt(app_type, authentication, internet_facing, sensitive_data, app_input)
+            pending[pool.submit(run_task, ATTACK_TREE_TASK, config, prompt, cache)] = "attack_tree"
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                section = pending.pop(future)
+                error = future.exception()
+                result = None if error else future.result()
+
+                if section == "threat_model" and result is not None:
+                    # Fan out the sections that are built from the threat model
+                    threats = with_threat_ids(result.output.get("threat_model", []))
+                    result.output["threat_model"] = threats
+                    for name, (task, create_prompt) in THREAT_DEPENDENT_SECTIONS.items():
+                        if name in sections:
+                            pending[pool.submit(_run_threat_section, task, config, threats, create_prompt, cache, store)] = name
+
+                if section in sections:
+                    yield section, result, error
+    finally:
+        # The caller stopped early, drop work that hasn't started
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def build_report(config, app_type, authentication, internet_facing, sensitive_data, app_input,
+                 sections=REPORT_SECTIONS, **options):
+    """
+    Generate report sections and return them as plain data once they have all finished.
+
+    Nothing UI specific is involved and the return value holds only builtins:
+    each section is TaskResult.to_dict(), with the thinking, token usage and
+    timings of its calls, and errors are recorded as messages rather than
+    raised. That makes it safe to call from worker processes, whose provider
+    SDK exceptions often can't be pickled back to the parent.
+
+    Args:
+        config (ProviderConfig): Provider, model and credentials
+        app_type, authentication, internet_facing, sensitive_data, app_input: Application details
+        sections (iterable): Names from REPORT_SECTIONS to generate
+        **options: cache, store, max_workers and threat_model_by_category, see generate_report()
+
+    Returns:
+        dict: Maps each section, in REPORT_SECTIONS order, to its result dict,
+              or to {"error": message} if it failed or was skipped
+    """
+    sections = [section for section in REPORT_SECTIONS if section in set(sections)]
+    results = {}
+    for section, result, error in generate_report(config, app_type, authentication, internet_facing, sensitive_data,
+                                                  app_input, sections=sections, **options):
+        results[section] = {"error": str(error)} if error is not None else result.to_dict()
+    return {section: results.get(section, {"error": SKIPPED_SECTION_ERROR}) for section in sections}
@@ -0,0 +1,220 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from functools import lru_cache
+
+from repo_cache import default_cache_dir
+
+# Bump this whenever the cached value format or the key contents change
+RESPONSE_CACHE_VERSION = 1
+
+# Cached responses older than this are treated as misses
+DEFAULT_TTL_SECONDS = 7 * 24 * 60 * 60
+
+# Least recently used responses are evicted beyond this many entries
+DEFAULT_MAX_ENTRIES = 500
+
+def response_cache_key(task, config, prompt):
+    """
+    Build the cache key for a model call.
+
+    The key covers everything that changes what the model is asked: provider,
+    model, endpoint, system prompts, the user prompt and generation parameters.
+    API keys are deliberately left out so they are never written to disk.
+
+    Args:
+        task (TaskSpec): The task being run
+        config (ProviderConfig): Provider, model and credentials
+        prompt (str): The user prompt
+
+    Returns:
+        str: Hex SHA-256 digest identifying the request
+    """
+    material = {
+        "version": RESPONSE_CACHE_VERSION,
+        "provider": config.provider,
+        "model": config.model,
+        "endpoint": config.endpoint,
+        "api_version": config.api_version,
+        "task": task.name,
+        "system_prompt": task.system_prompt,
+        "reasoning_system_prompt": task.reasoning_system_prompt,
+        "prompt": prompt,
+        "json_output": task.json_output,
+        "response_schema": task.response_schema,
+        "local_response_schema": task.local_response_schema,
+        "max_tokens": task.max_tokens,
+        "google_safety_settings": task.google_safety_settings,
+    }
+    encoded = json.dumps(material, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class ResponseCache:
+    """
+    Base class for model response caches.
+
+    Backends implement _load, _store and _clear. This class keeps the hit and
+    miss counters shown in the sidebar.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, count=True):
+        """
+        Look up a cached response.
+
+        Args:
+            key (str): The key from response_cache_key()
+            count (bool): Whether the lookup counts toward the hit and miss stats.
+                          Lookups of stored per-threat results pass False, so the
+                          stats only count model responses.
+
+        Returns:
+            tuple: (text, thinking) as returned by the provider, or None on a miss
+        """
+        with self._lock:
+            value = self._load(key, time.time() - self.ttl)
+            if count and value is None:
+                self.misses += 1
+            elif count:
+                self.hits += 1
+        return value
+
+    def put(self, key, text, thinking=None):
+        """Store a provider response."""
+        with self._lock:
+            self._store(key, text, thinking, time.time())
+
+    def clear(self):
+        """Remove every cached response and reset the counters."""
+        with self._lock:
+            self._clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return the hit and miss counts as a dict."""
+        return {"hits": self.hits, "misses": self.misses}
+
+    def _load(self, key, not_before):
+        raise NotImplementedError
+
+    def _store(self, key, text, thinking, now):
+        raise NotImplementedError
+
+    def _clear(self):
+        raise NotImplementedError
+
+
+class MemoryResponseCache(ResponseCache):
+    """In-process LRU cache, shared by all sessions until the app restarts."""
+
+    def __init__(self, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        self._entries = OrderedDict()
+
+    def _load(self, key, not_before):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        created_at, text, thinking = entry
+        if created_at < not_before:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return text, thinking
+
+    def _store(self, key, text, thinking, now):
+        self._entries[key] = (now, text, thinking)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _clear(self):
+        self._entries.clear()
+
+
+class SQLiteResponseCache(ResponseCache):
+    """On-disk cache, so responses survive restarts and are shared between app processes."""
+
+    def __init__(self, path=None, ttl=DEFAULT_TTL_SECONDS, max_entries=DEFAULT_MAX_ENTRIES):
+        super().__init__(ttl, max_entries)
+        if path is None:
+            path = os.path.join(default_cache_dir(), 'responses.sqlite3')
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                text TEXT NOT NULL,
+                thinking TEXT,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - ttl,))
+        self._conn.commit()
+
+    def _load(self, key, not_before):
+        row = self._conn.execute(
+            "SELECT text, thinking, created_at FROM responses WHERE key=?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        text, thinking, created_at = row
+        if created_at < not_before:
+            self._conn.execute("DELETE FROM responses WHERE key=?", (key,))
+            self._conn.commit()
+            return None
+        self._conn.execute("UPDATE responses SET accessed_at=? WHERE key=?", (time.time(), key))
+        self._conn.commit()
+        return text, thinking
+
+    def _store(self, key, text, thinking, now):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+            (key, text, thinking, now, now)
+        )
+        # Evict the least recently used entries beyond the size limit
+        self._conn.execute(
+            "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,)
+        )
+        self._conn.commit()
+
+    def _clear(self):
+        self._conn.execute("DELETE FROM responses")
+        self._conn.commit()
+
+
+# Cache backends selectable in the sidebar
+RESPONSE_CACHE_BACKENDS = {
+    "Memory": MemoryResponseCache,
+    "Disk": SQLiteResponseCache,
+}
+
+@lru_cache(maxsize=None)
+def get_response_cache(backend="Memory"):
+    """
+    Return the process-wide response cache for a backend, shared by all sessions.
+
+    Args:
+        backend (str): One of the RESPONSE_CACHE_BACKENDS names
+
+    Returns:
+        ResponseCache: The shared cache instance
+    """
+    return RESPONSE_CACHE_BACKENDS[backend]()
@@ -0,0 +1,258 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import CancelledError
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+
+# HTTP statuses worth retrying: timeouts, conflicts, rate limits and server errors.
+# 529 is Anthropic's "overloaded" status.
+RETRYABLE_STATUS_CODES = (408, 409, 425, 429, 500, 502, 503, 504, 529)
+
+# Exception class names, anywhere in the MRO, that mean the request never got a
+# response. Matching on names covers the httpx based SDKs without importing them.
+TRANSIENT_ERROR_NAMES = ("Timeout", "Connection", "ConnectError", "RemoteProtocolError", "ReadError")
+
+
+class MalformedOutputError(ValueError):
+    """Model output that couldn't be parsed into the task's result. Worth retrying, a fresh generation usually parses."""
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """
+    How often and how long to retry a model call.
+
+    Attributes:
+        max_attempts (int): Total number of attempts, including the first
+        base_delay (float): Backoff before the second attempt, in seconds. Doubles on every retry.
+        max_delay (float): Upper bound for a single backoff, in seconds
+        deadline (float): Give up instead of waiting if the next attempt would start
+            more than this many seconds after the first one
+    """
+    max_attempts: int = 4
+    base_delay: float = 1.0
+    max_delay: float = 30.0
+    deadline: float = 180.0
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Seconds to wait after a failed attempt.
+
+        Uses exponential backoff with full jitter, so concurrent callers that
+        failed together don't retry together. A server supplied Retry-After
+        takes precedence, with a little jitter on top for the same reason.
+
+        Args:
+            attempt (int): The attempt that just failed, starting at 1
+            retry_after (float): Wait requested by the server, if any
+        """
+        if retry_after is not None:
+            return retry_after + random.uniform(0, self.base_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+# Retry policy for providers without an entry in PROVIDER_RETRY_POLICIES
+DEFAULT_RETRY_POLICY = RetryPolicy()
+
+PROVIDER_RETRY_POLICIES = {
+    # Groq's rate limit windows are a minute long on the free tier
+    "Groq API": RetryPolicy(max_delay=60.0, deadline=240.0),
+    # Local servers don't rate limit, but a single generation can take minutes
+    "Ollama": RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=5.0, deadline=900.0),
+    "LM Studio Server": RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=5.0, deadline=900.0),
+}
+
+def get_retry_policy(provider):
+    """Return the retry policy for a provider name."""
+    return PROVIDER_RETRY_POLICIES.get(provider, DEFAULT_RETRY_POLICY)
+
+
+class RetryStats:
+    """Process-wide retry counters, shown in the sidebar next to the response cache stats."""
+
+    def __init__(self):
+        self.retries = 0
+        self.wait_seconds = 0.0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    def record_retry(self, wait):
+        with self._lock:
+            self.retries += 1
+            self.wait_seconds += wait
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+
+    def stats(self):
+        """Return the retry count, total backoff and number of calls that gave up as a dict."""
+        with self._lock:
+            return {"retries": self.retries, "wait_seconds": self.wait_seconds, "failures": self.failures}
+
+
+RETRY_STATS = RetryStats()
+
+
+def _status_code(exc):
+    """Find the HTTP status of an SDK or requests error, or None."""
+    for value in (getattr(exc, 'status_code', None), getattr(exc, 'status', None), getattr(exc, 'code', None)):
+        if isinstance(value, int) and 100 <= value < 600:
+            return value
+    response = _response(exc)
+    status = getattr(response, 'status_code', None)
+    return status if isinstance(status, int) else None
+
+def _response(exc):
+    # OpenAI, Anthropic, Groq and requests use .response, Mistral uses .raw_response.
+    # Not `or`: a requests.Response is falsy when its status is an error.
+    response = getattr(exc, 'response', None)
+    return response if response is not None else getattr(exc, 'raw_response', None)
+
+def _parse_duration(value):
+    """Parse durations such as "20ms", "1.5s" or "1m30s" as sent in x-ratelimit-reset-* headers."""
+    total = 0.0
+    number = ''
+    index = 0
+    while index < len(value):
+        char = value[index]
+        if char.isdigit() or char == '.':
+            number += char
+        elif value.startswith('ms', index):
+            total += float(number) / 1000
+            number = ''
+            index += 1
+        elif char in 'hms':
+            total += float(number) * {'h': 3600, 'm': 60, 's': 1}[char]
+            number = ''
+        else:
+            raise ValueError(f"Invalid duration: {value}")
+        index += 1
+    if number:
+        # A bare number is a number of seconds
+        total += float(number)
+    return total
+
+def retry_after_seconds(headers):
+    """
+    Work out how long a rate limited response asks us to wait.
+
+    Understands retry-after-ms (OpenAI, Anthropic), Retry-After as seconds or
+    an HTTP date, the x-ratelimit-reset-* durations sent by OpenAI and Groq,
+    and Anthropic's anthropic-ratelimit-*-reset timestamps. The reset headers
+    are only used for limits that are actually exhausted.
+
+    Args:
+        headers (Mapping): Response headers
+
+    Returns:
+        float: Seconds to wait, or None if the headers don't say
+    """
+    if not headers:
+        return None
+    headers = {key.lower(): value for key, value in headers.items()}
+
+    try:
+        if 'retry-after-ms' in headers:
+            return max(float(headers['retry-after-ms']) / 1000, 0)
+        if 'retry-after' in headers:
+            value = headers['retry-after']
+            try:
+                return max(float(value), 0)
+            except ValueError:
+                return max((parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds(), 0)
+    except (TypeError, ValueError):
+        pass
+
+    waits = []
+    for key, value in headers.items():
+        try:
+            if key.startswith('x-ratelimit-reset-'):
+                if headers.get('x-ratelimit-remaining-' + key[len('x-ratelimit-reset-'):]) == '0':
+                    waits.append(_parse_duration(value))
+            elif key.startswith('anthropic-ratelimit-') and key.endswith('-reset'):
+                if headers.get(key[:-len('-reset')] + '-remaining') == '0':
+                    reset_at = datetime.fromisoformat(value.replace('Z', '+00:00'))
+                    waits.append(max((reset_at - datetime.now(timezone.utc)).total_seconds(), 0))
+        except (TypeError, ValueError):
+            continue
+    return max(waits) if waits else None
+
+def classify_error(exc):
+    """
+    Decide whether a failed model call is worth retrying.
+
+    Rate limits, timeouts, connection failures and server errors are
+    retryable, as is output that couldn't be parsed since a fresh generation
+    usually succeeds. Authentication failures, bad requests, configuration
+    errors such as an unsupported provider, and unknown errors are not.
+
+    Args:
+        exc (Exception): The error raised by the call
+
+    Returns:
+        tuple: (retryable, retry_after) where retry_after is the wait in seconds
+               requested by the server, or None
+    """
+    status = _status_code(exc)
+    if status is not None:
+        if status in RETRYABLE_STATUS_CODES or status >= 500:
+            return True, retry_after_seconds(getattr(_response(exc), 'headers', None))
+        return False, None
+
+    if isinstance(exc, (ConnectionError, TimeoutError, requests.exceptions.ConnectionError,
+                        requests.exceptions.Timeout, requests.exceptions.ChunkedEncodingError)):
+        return True, None
+    if any(name in cls.__name__ for cls in type(exc).__mro__ for name in TRANSIENT_ERROR_NAMES):
+        return True, None
+
+    # Malformed or incomplete model output, e.g. JSON that can't be repaired.
+    # Other ValueErrors and KeyErrors are bugs or configuration mistakes that won't go away on their own.
+    if isinstance(exc, (json.JSONDecodeError, MalformedOutputError)):
+        return True, None
+
+    return False, None
+
+def retry_call(fn, policy=DEFAULT_RETRY_POLICY, on_retry=None, stats=RETRY_STATS, sleep=time.sleep):
+    """
+    Call fn until it succeeds, the error is not retryable, or the policy runs out.
+
+    Args:
+        fn (callable): Makes one attempt, called without arguments
+        policy (RetryPolicy): Attempts, backoff and overall deadline
+        on_retry (callable): Called as on_retry(attempt, wait, exc) before
+            sleeping, e.g. to tell the user a retry is coming
+        stats (RetryStats): Counters the retries and waits are added to
+        sleep (callable): Used to wait between attempts
+
+    Returns:
+        Whatever fn returns
+
+    Raises:
+        Exception: The last error, once no further attempt will be made
+    """
+    start = time.monotonic()
+    for attempt in range(1, policy.max_attempts + 1):
+        try:
+            return fn()
+        except CancelledError:
+            # The caller no longer wants the result, that's not a failure
+            raise
+        except Exception as exc:
+            retryable, retry_after = classify_error(exc)
+            if not retryable or attempt == policy.max_attempts:
+                stats.record_failure()
+                raise
+            wait = policy.backoff(attempt, retry_after)
+            if time.monotonic() - start + wait > policy.deadline:
+                stats.record_failure()
+                raise
+            stats.record_retry(wait)
+            if on_retry is not None:
+                on_retry(attempt, wait, exc)
+            sleep(wait)
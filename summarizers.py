@@ -0,0 +1,585 @@
+import re
+from bisect import bisect_right
+
+# Registered summarizers, keyed by file extension
+SUMMARIZERS = {}
+
+# Keywords that look like calls when followed by parentheses
+CONTROL_KEYWORDS = {
+    'if', 'for', 'while', 'switch', 'catch', 'else', 'do', 'try', 'return', 'new',
+    'throw', 'using', 'lock', 'foreach', 'synchronized', 'sizeof', 'typeof', 'await',
+    'yield', 'delete', 'case', 'super', 'this', 'with', 'finally', 'when', 'fixed'
+}
+
+# Decorators, annotations and middleware names that indicate an authentication or authorization check
+AUTH_NAME_PATTERN = re.compile(
+    r'login_required|permission|authori[sz]|authenticat|requires?_?auth|requireauth|'
+    r'jwt|roles?_?(?:required|allowed)|rolesallowed|secured|csrf|admin_required|'
+    r'staff_member_required|current_user|isauthenticated|verify_?token|auth_?guard|'
+    r'useguards|allowanonymous|permitall|denyall|preauthorize|auth',
+    re.IGNORECASE
+)
+
+# Decorator attributes used by Python web frameworks to register routes
+PYTHON_ROUTE_METHODS = {
+    'route', 'api_route', 'get', 'post', 'put', 'delete', 'patch', 'head', 'options', 'websocket'
+}
+
+# Functions used in Django URL configurations
+PYTHON_URL_FUNCTIONS = {'path', 're_path', 'url'}
+
+# Comments and string literals that can span lines. Declarations found inside
+# them are skipped, see _skipped_spans(). Single-line strings and comments are
+# matched too, so that a '/*' inside one doesn't start a block comment.
+_C_LIKE_SKIPPED = re.compile(
+    r"""//[^\n]*|/\*[^*]*(?:\*+[^*/][^*]*)*(?:\*+/|\Z)"""
+    r"""|"[^"\\\n]*(?:\\.[^"\\\n]*)*"|'[^'\\\n]*(?:\\.[^'\\\n]*)*'|`[^`\\]*(?:\\.[^`\\]*)*`""",
+    re.DOTALL
+)
+
+# A decorator, annotation or attribute, e.g. @GetMapping("/x"), @PreAuthorize("hasRole('ADMIN')") or [Route("api/[controller]")]
+_ANNOTATION = (
+    r"""(?:@[\w.]+(?:\s*\((?:"[^"]*"|'[^']*'|[^()"']|\((?:"[^"]*"|'[^']*'|[^()"'])*\))*\))?"""
+    r"""|\[(?:"[^"]*"|[^\]"])*\])"""
+)
+
+# The contents of a parenthesised list, e.g. of parameters, that may span lines and nest two levels deep
+_PARAMS = r'[^()]*(?:\([^()]*(?:\([^()]*\)[^()]*)*\)[^()]*)*'
+_PARENS = rf'\({_PARAMS}\)'
+
+# Longest text before a keyword on its line that is checked for being part of a declaration
+_MAX_LINE_PREFIX = 200
+
+_STRING_LITERAL = re.compile(r'"[^"]*"|\'[^\']*\'|`[^`]*`')
+
+def register_summarizer(*extensions):
+    """
+    Register a summarizer for one or more file extensions.
+
+    A summarizer is called as summarizer(content) and returns a dict with any of
+    the keys 'imports', 'classes', 'functions', 'routes' and 'auth', each a list
+    of strings in source order.
+    """
+    def decorator(func):
+        for extension in extensions:
+            SUMMARIZERS[extension] = func
+        return func
+    return decorator
+
+# The summarizers find declarations with patterns that start at a line break or
+# a keyword, so the regex engine jumps from match to match in C and Python only
+# handles the matches. Files are prefixed with a line break for the first line
+# to match.
+
+def _skipped_spans(pattern, text, openers):
+    """
+    Find the comments and string literals in text that declarations can't start inside.
+
+    Returns:
+        tuple: Sorted (starts, ends) offsets for _is_skipped(), or None if text
+               contains none of the openers, so there is nothing to skip
+    """
+    if not any(opener in text for opener in openers):
+        return None
+    spans = [match.span() for match in pattern.finditer(text)]
+    return [start for start, _ in spans], [end for _, end in spans]
+
+def _is_skipped(spans, position):
+    """Whether position falls inside one of the comments or string literals found by _skipped_spans()."""
+    if spans is None:
+        return False
+    starts, ends = spans
+    index = bisect_right(starts, position) - 1
+    return index >= 0 and position < ends[index]
+
+def _in_line_comment(text, position, marker):
+    """Whether a match found in the middle of a line is commented out."""
+    return marker in text[text.rfind('\n', 0, position) + 1:position]
+
+def _line_prefix(text, position):
+    """
+    Return the text between the start of the line and position, with whitespace collapsed.
+
+    Returns None if that's longer than any declaration would have, e.g. in minified code.
+    """
+    line_start = text.rfind('\n', max(0, position - _MAX_LINE_PREFIX), position)
+    if line_start < 0 and position > _MAX_LINE_PREFIX:
+        return None
+    return _collapse(text[line_start + 1:position])
+
+def _statements(pattern, text, spans, line_prefix_pattern=None):
+    """
+    Find the matches of a pattern that starts with a keyword, keeping those that start a statement.
+
+    Args:
+        pattern: Compiled pattern to search text for
+        text (str): Source code
+        spans: Comments and string literals to skip, from _skipped_spans()
+        line_prefix_pattern: Compiled pattern for the text allowed before the
+                             match on its line, e.g. 'async' before 'def'
+
+    Returns:
+        list: (position, pattern, match, line prefix) tuples in source order
+    """
+    statements = []
+    for match in pattern.finditer(text):
+        position = match.start()
+        line_prefix = '' if text[position - 1] == '\n' else _line_prefix(text, position)
+        if line_prefix is None or (line_prefix and not (line_prefix_pattern and line_prefix_pattern.fullmatch(line_prefix))):
+            continue
+        if not _is_skipped(spans, position):
+            statements.append((position, pattern, match, line_prefix))
+    return statements
+
+def _collapse(text):
+    """Collapse runs of whitespace, including line breaks, into single spaces."""
+    return ' '.join(text.split())
+
+def _unique(items):
+    """Remove duplicates while keeping the original order."""
+    return list(dict.fromkeys(items))
+
+def _auth_names(text):
+    """Return the decorator, annotation or middleware names in text that look like auth checks."""
+    names = re.findall(r'[@\[]?[\w.]+', _STRING_LITERAL.sub('', text))
+    return [name for name in names if AUTH_NAME_PATTERN.search(name)]
+
+def _shorten(text, limit=160):
+    return text if len(text) <= limit else text[:limit - 3] + '...'
+
+# ------------------ Python ------------------ #
+
+# Each kind of statement has its own pattern starting with a keyword, which the
+# regex engine searches for much faster than a pattern starting at every line.
+# Matches that don't start a line, e.g. 'undef x():' or 'y = a @ b', are dropped
+# by _statements().
+_PYTHON_DEF = re.compile(rf'def[ \t]+(\w+)[ \t]*\(({_PARAMS})\)[ \t]*(?:->[ \t]*([^:\n]+?)[ \t]*)?:')
+_PYTHON_DEF_PREFIX = re.compile(r'async')
+_PYTHON_CLASS = re.compile(r'class[ \t]+(\w+)[ \t]*(?:\(([^()]*(?:\([^()]*\)[^()]*)*)\))?[ \t]*:')
+_PYTHON_DECORATOR = re.compile(rf'@[ \t]*([\w.]+)[ \t]*({_PARENS})?')
+# Imported names, which may continue on the next line after a backslash
+_PYTHON_IMPORTED = r'[^\n;#\\]+(?:\\\n?[^\n;#\\]*)*'
+_PYTHON_IMPORT = re.compile(rf'import\b[ \t]*(?:\([^)]*\)|{_PYTHON_IMPORTED})')
+_PYTHON_IMPORT_PREFIX = re.compile(r'from [\w.]+')
+
+_PYTHON_URLS = {
+    function: re.compile(rf'''{function}\([ \t]*[rR]?(['"])([^'"\n]*)\1(?:[ \t]*,[ \t]*([\w.]+(?:\([^()\n]*\))?))?''')
+    for function in PYTHON_URL_FUNCTIONS
+}
+_PYTHON_ROUTE_PATH = re.compile(r'\(\s*[rR]?([\'"])([^\'"\n]*)\1')
+_PYTHON_ROUTE_METHODS_ARG = re.compile(r'\bmethods\s*=\s*[\[(]([^\])]*)')
+_PYTHON_DEPENDENCY = re.compile(r'\b(?:Depends|Security)\((?:[^()]|\([^()]*\))*\)')
+
+def _python_string_spans(text):
+    """
+    Find the triple-quoted strings in Python source, see _skipped_spans().
+
+    Pairs each opening triple quote with the next matching one, which is much
+    faster than matching the strings with a pattern.
+    """
+    markers = []
+    for quote in ('"""', "'''"):
+        if quote in text:
+            markers.extend((match.start(), quote) for match in re.finditer(quote, text))
+    if not markers:
+        return None
+    markers.sort()
+
+    starts, ends = [], []
+    opened_at, opening_quote = None, None
+    for position, quote in markers:
+        if opened_at is None:
+            opened_at, opening_quote = position, quote
+        elif quote == opening_quote and position >= opened_at + 3 and text[position - 1] != '\\':
+            starts.append(opened_at)
+            ends.append(position + 3)
+            opened_at = None
+    if opened_at is not None:
+        # Unterminated, runs to the end of the file
+        starts.append(opened_at)
+        ends.append(len(text))
+    return starts, ends
+
+@register_summarizer('py')
+def summarize_python(content):
+    """Summarize Python source, skipping anything inside docstrings and other triple-quoted strings."""
+    imports, classes, functions, routes, auth = [], [], [], [], []
+    spans = _python_string_spans(content)
+
+    # Decorators apply to the next function or class, so those are handled in source order
+    declarations = _statements(_PYTHON_DEF, content, spans, _PYTHON_DEF_PREFIX) + _statements(_PYTHON_CLASS, content, spans)
+    if '@' in content:
+        declarations.extend(_statements(_PYTHON_DECORATOR, content, spans))
+        declarations.sort(key=lambda declaration: declaration[0])
+
+    # Decorators waiting for the function or class they apply to
+    decorators = []
+    for _, pattern, match, line_prefix in declarations:
+        if pattern is _PYTHON_DECORATOR:
+            decorators.append(match)
+            continue
+
+        if pattern is _PYTHON_DEF:
+            name = match.group(1)
+            prefix = "async def" if line_prefix else "def"
+            params = _collapse(match.group(2)).rstrip(',')
+            returns = f" -> {_collapse(match.group(3))}" if match.group(3) else ""
+            functions.append(_shorten(f"{prefix} {name}({params}){returns}:"))
+
+            for decorator in decorators:
+                decorator_name, decorator_args = decorator.group(1), decorator.group(2) or ''
+                attribute = decorator_name.rsplit('.', 1)[-1]
+                path = _PYTHON_ROUTE_PATH.match(decorator_args) if attribute in PYTHON_ROUTE_METHODS else None
+                if path:
+                    methods = _PYTHON_ROUTE_METHODS_ARG.search(decorator_args)
+                    methods = ",".join(re.findall(r'[\'"]([^\'"]*)[\'"]', methods.group(1))) if methods else ""
+                    routes.append(f"{methods or attribute.upper()} {path.group(2)} -> {name}")
+                if AUTH_NAME_PATTERN.search(decorator_name):
+                    auth.append(f"@{_shorten(_collapse(decorator.group()[1:]), 80)} on {name}")
+
+            # FastAPI style dependencies, e.g. user = Depends(get_current_user)
+            if 'Depends(' in params or 'Security(' in params:
+                for dependency in _PYTHON_DEPENDENCY.finditer(params):
+                    if AUTH_NAME_PATTERN.search(dependency.group()):
+                        auth.append(f"{_shorten(dependency.group(), 80)} on {name}")
+        else:
+            bases = _collapse(match.group(2) or '')
+            classes.append(f"class {match.group(1)}({bases}):" if bases else f"class {match.group(1)}:")
+        decorators = []
+
+    for _, _, match, line_prefix in _statements(_PYTHON_IMPORT, content, spans, _PYTHON_IMPORT_PREFIX):
+        statement = _collapse(f"{line_prefix} {match.group()}".replace('\\', ' '))
+        if '(' in statement:
+            statement = _collapse(statement.replace('(', ' ').replace(')', ' ')).rstrip(',')
+        imports.append(statement)
+
+    # Django URL configurations
+    urls = []
+    for function, pattern in _PYTHON_URLS.items():
+        if function + '(' not in content:
+            continue
+        for match in pattern.finditer(content):
+            position = match.start()
+            # Skip method calls and longer names, e.g. os.path( or re_path( when looking for path(
+            if position and (content[position - 1].isalnum() or content[position - 1] in '_.'):
+                continue
+            if not _is_skipped(spans, position) and not _in_line_comment(content, position, '#'):
+                urls.append((position, _shorten(f"PATH {match.group(2)} -> {match.group(3) or ''}")))
+    routes.extend(route for _, route in sorted(urls))
+
+    return {'imports': imports, 'classes': classes, 'functions': functions, 'routes': routes, 'auth': _unique(auth)}
+
+# ------------------ JavaScript / TypeScript ------------------ #
+
+_JS_IMPORT = re.compile(r'\nimport\b(?:\{[^}]*\}|[^\n{;])*')
+_JS_EXPORT_FROM = re.compile(r'\nexport\b[^\n;{]*(?:\{[^}]*\}[^\n;{]*)?\bfrom\b[^\n;]*')
+_JS_REQUIRE = re.compile(r'require\([^\n;]*')
+_JS_REQUIRE_PREFIX = re.compile(r'(?:const|let|var)\b[^;=]*= ?')
+_JS_CLASSES = {
+    kind: re.compile(rf'{kind}[ \t]+([\w$]+)([^{{\n]*)') for kind in ('class', 'interface')
+}
+_JS_CLASS_PREFIX = re.compile(r'(?:export ?)?(?:default ?)?(?:abstract ?)?')
+_JS_FUNCTION = re.compile(rf'function\b[ \t]*\*?[ \t]*[\w$]*[ \t]*(?:<[^>\n]*>)?[ \t]*{_PARENS}[^{{;\n]*')
+# What can come before 'function' on its line, e.g. 'export default async', 'const handler =' or 'handler:'
+_JS_FUNCTION_PREFIX = re.compile(
+    r'(?:export ?)?(?:default ?)?(?:async ?)?'
+    r'|(?:export )?(?:const|let|var) [\w$]+ ?(?::[^=]+)?= ?(?:async ?)?'
+    r'|[\w$]+ ?: ?(?:async ?)?'
+)
+_JS_ARROW_FUNCTIONS = [
+    re.compile(rf'{keyword}[ \t]+[\w$]+[ \t]*(?::[^=\n]+)?=[ \t]*(?:async[ \t]+)?(?:{_PARENS}|[\w$]+)[ \t]*(?::[ \t]*[^=\n]+)?=>')
+    for keyword in ('const', 'let', 'var')
+]
+_JS_EXPORT_PREFIX = re.compile(r'(?:export)?')
+# Indented lines starting with a name and a parameter list, checked before the rest of the pattern as most lines aren't methods
+_JS_METHOD = re.compile(rf'''
+    \n[ \t]+(?=[\w$][\w$ \t]*[(<])
+    (?P<method>(?:(?:public|private|protected|static|async|get|set|readonly|override)[ \t]+)*
+        (?P<method_name>[\w$]+)[ \t]*(?:<[^>\n]*>)?[ \t]*{_PARENS}[ \t]*(?::[ \t]*[^{{\n]+)?)\{{
+''', re.VERBOSE)
+_JS_DECORATOR = re.compile(rf'@[\w.]+(?:{_PARENS})?')
+
+# Objects that Express style apps register routes on
+JS_ROUTE_OBJECTS = ('app', 'router', 'server', 'api', 'fastify', 'route')
+_JS_ROUTES = [
+    re.compile(rf'{name}\.(get|post|put|delete|patch|all|use|options|head)\(\s*[\'"`]([^\'"`]*)[\'"`]([^\n{{;]*)')
+    for name in JS_ROUTE_OBJECTS
+]
+_TS_DECORATOR_ROUTE = re.compile(r'@(Get|Post|Put|Delete|Patch|All)\(\s*[\'"`]?([^\'"`)]*)')
+
+@register_summarizer('js', 'ts', 'jsx', 'tsx', 'mjs', 'cjs')
+def summarize_javascript(content):
+    """Summarize JavaScript or TypeScript source, skipping anything inside comments and template literals."""
+    text = '\n' + content
+    spans = _skipped_spans(_C_LIKE_SKIPPED, text, ('/*', '`'))
+    # (position, text) pairs, sorted into source order at the end
+    imports, classes, functions, routes, auth = [], [], [], [], []
+
+    for pattern in (_JS_IMPORT, _JS_EXPORT_FROM):
+        imports.extend(
+            (match.start(), _collapse(match.group())) for match in pattern.finditer(text)
+            if not _is_skipped(spans, match.start() + 1)
+        )
+    if 'require(' in text:
+        imports.extend(
+            (position, _collapse(f"{line_prefix} {match.group()}"))
+            for position, _, match, line_prefix in _statements(_JS_REQUIRE, text, spans, _JS_REQUIRE_PREFIX)
+        )
+
+    for kind, pattern in _JS_CLASSES.items():
+        classes.extend(
+            (position, _shorten(_collapse(f"{kind} {match.group(1)}{match.group(2)}")))
+            for position, _, match, _ in _statements(pattern, text, spans, _JS_CLASS_PREFIX)
+        )
+
+    if 'function' in text:
+        functions.extend(
+            (position, _shorten(_collapse(f"{line_prefix} {match.group()}")))
+            for position, _, match, line_prefix in _statements(_JS_FUNCTION, text, spans, _JS_FUNCTION_PREFIX)
+        )
+    if '=>' in text:
+        for pattern in _JS_ARROW_FUNCTIONS:
+            functions.extend(
+                (position, _shorten(_collapse(f"{line_prefix} {match.group()}")))
+                for position, _, match, line_prefix in _statements(pattern, text, spans, _JS_EXPORT_PREFIX)
+            )
+    functions.extend(
+        (match.start(), _shorten(_collapse(match.group('method')))) for match in _JS_METHOD.finditer(text)
+        if match.group('method_name') not in CONTROL_KEYWORDS and not _is_skipped(spans, match.start() + 1)
+    )
+
+    if '@' in text:
+        for _, _, match, _ in _statements(_JS_DECORATOR, text, spans):
+            decorator = match.group()
+            for decorator_route in _TS_DECORATOR_ROUTE.finditer(decorator):
+                routes.append(f"{decorator_route.group(1).upper()} {decorator_route.group(2) or '/'}")
+            auth.extend(name for name in _auth_names(decorator) if name.startswith('@'))
+
+    # Express style route registrations, e.g. router.get('/items', requireAuth, handler)
+    registrations = []
+    for pattern in _JS_ROUTES:
+        for match in pattern.finditer(text):
+            position = match.start()
+            # Skip longer names, e.g. myapp.get( when looking for app.get(
+            if text[position - 1].isalnum() or text[position - 1] == '_':
+                continue
+            if not _is_skipped(spans, position) and not _in_line_comment(text, position, '//'):
+                registrations.append((position, match))
+    for _, match in sorted(registrations, key=lambda registration: registration[0]):
+        routes.append(f"{match.group(1).upper()} {match.group(2)}")
+        auth.extend(f"{name} on {match.group(2)}" for name in _auth_names(match.group(3)))
+
+    imports, classes, functions = ([line for _, line in sorted(lines)] for lines in (imports, classes, functions))
+    return {'imports': imports, 'classes': classes, 'functions': functions, 'routes': routes, 'auth': _unique(auth)}
+
+# ------------------ Java / C# / C / C++ ------------------ #
+
+_JAVA_STATEMENT = re.compile(rf'''
+    \n[ \t]*(?!//)(?:
+        (?P<import>(?:import|using)\b[^\n;]*;?|\#include[ \t]*(?:<[^>\n]*>|"[^"\n]*"|\w+))
+      | (?P<annotations>(?:{_ANNOTATION}\s*)*)
+        (?:
+            (?P<class_declaration>[^\n;{{}}()=@]*?\b(?P<class_kind>class|interface|enum|record|struct)[ \t]+(?P<class>\w+)[^{{;]*?)\{{
+          | (?P<method_declaration>(?P<method_prefix>(?:[\w<>\[\],.?*&:]+[ \t]+)+?)(?P<method>[\w~]+)[ \t]*{_PARENS}[^{{;]*?)
+            (?P<terminator>[{{;])
+        )
+    )
+''', re.VERBOSE)
+
+_JAVA_ROUTE = re.compile(r'@(Get|Post|Put|Delete|Patch|Request)Mapping(?:\(\s*(?:value\s*=\s*|path\s*=\s*)?"([^"]*)")?')
+_JAXRS_ROUTE = re.compile(r'@Path\(\s*"([^"]*)"')
+_CSHARP_ROUTE = re.compile(r'\[(?:Http(Get|Post|Put|Delete|Patch)|Route)(?:\(\s*"([^"]*)")?')
+_JAVA_AUTH = re.compile(r'^(?:@(?:PreAuthorize|PostAuthorize|Secured|RolesAllowed|PermitAll|DenyAll)\b|\[(?:Authorize|AllowAnonymous)\b)')
+
+@register_summarizer('java', 'cs', 'c', 'cpp', 'cc', 'h', 'hpp')
+def summarize_java_like(content):
+    """Summarize Java, C#, C or C++ source, skipping anything inside block comments."""
+    imports, classes, functions, routes, auth = [], [], [], [], []
+    text = '\n' + content
+    spans = _skipped_spans(_C_LIKE_SKIPPED, text, ('/*', '`'))
+    for match in _JAVA_STATEMENT.finditer(text):
+        if _is_skipped(spans, match.start() + 1):
+            continue
+        if match.group('import'):
+            imports.append(_collapse(match.group('import')))
+            continue
+
+        annotations = match.group('annotations')
+        checks = []
+        if annotations:
+            for route in _JAVA_ROUTE.finditer(annotations):
+                routes.append(f"{route.group(1).upper()} {route.group(2) or ''}".strip())
+            for route in _JAXRS_ROUTE.finditer(annotations):
+                routes.append(f"PATH {route.group(1)}")
+            for route in _CSHARP_ROUTE.finditer(annotations):
+                routes.append(f"{(route.group(1) or 'ROUTE').upper()} {route.group(2) or ''}".strip())
+            checks = [annotation for annotation in re.findall(_ANNOTATION, annotations) if _JAVA_AUTH.match(annotation)]
+
+        target = None
+        if match.group('class'):
+            classes.append(_shorten(_collapse(match.group('class_declaration'))))
+            target = match.group('class')
+        elif match.group('terminator') == '{':
+            type_words = set(re.findall(r'\w+', match.group('method_prefix')))
+            if match.group('method') not in CONTROL_KEYWORDS and not type_words & CONTROL_KEYWORDS:
+                functions.append(_shorten(_collapse(match.group('method_declaration'))))
+                target = match.group('method')
+        auth.extend(f"{check} on {target}" if target else check for check in checks)
+
+    return {'imports': imports, 'classes': classes, 'functions': functions, 'routes': routes, 'auth': _unique(auth)}
+
+# ------------------ Go ------------------ #
+
+_GO_STATEMENT = re.compile(r'''
+    \n(?:
+        import[ \t]*(?P<imports>\((?:[^()"`]|"[^"\n]*"|`[^`]*`)*\)|[^\n]*)
+      | (?P<function>func\b[^{(\n]*(?:\([^()]*(?:\([^()]*\)[^()]*)*\)[^{(\n]*)*)
+      | [ \t]*type[ \t]+(?P<type>\w+)[ \t]+(?P<kind>struct|interface)\b
+    )
+''', re.VERBOSE)
+
+_GO_ROUTE = re.compile(r'\.(?:(HandleFunc|Handle|GET|POST|PUT|DELETE|PATCH|Get|Post|Put|Delete|Patch|Any|Group)\(\s*"([^"]*)"|Use\()([^\n]*)')
+
+@register_summarizer('go')
+def summarize_go(content):
+    """Summarize Go source, skipping anything inside comments and raw strings."""
+    imports, classes, functions, routes, auth = [], [], [], [], []
+    text = '\n' + content
+    spans = _skipped_spans(_C_LIKE_SKIPPED, text, ('/*', '`'))
+    for match in _GO_STATEMENT.finditer(text):
+        if _is_skipped(spans, match.start() + 1):
+            continue
+        if match.group('imports') is not None:
+            imports.extend(f'import {path}' for path in re.findall(r'"[^"]*"', match.group('imports')))
+        elif match.group('function'):
+            # Drop a trailing comment, e.g. func (s *Server) Start() // blocks until shutdown
+            functions.append(_shorten(_collapse(match.group('function').split('//', 1)[0])))
+        else:
+            classes.append(f"type {match.group('type')} {match.group('kind')}")
+
+    # Route registrations and middleware, e.g. r.GET("/items", AuthMiddleware(), handler) or r.Use(auth)
+    for match in _GO_ROUTE.finditer(text):
+        if _is_skipped(spans, match.start()) or _in_line_comment(text, match.start(), '//'):
+            continue
+        if match.group(2) is not None:
+            method = match.group(1).upper()
+            routes.append(f"{'ROUTE' if method in ('HANDLEFUNC', 'HANDLE') else method} {match.group(2)}")
+            auth.extend(f"{name} on {match.group(2)}" for name in _auth_names(match.group(3)))
+        else:
+            auth.extend(f"{name} middleware" for name in _auth_names(match.group(3)))
+
+    return {'imports': imports, 'classes': classes, 'functions': functions, 'routes': routes, 'auth': _unique(auth)}
+
+# ------------------ Regex fallback ------------------ #
+
+def summarize_regex(file_ext, content):
+    """
+    Extract imports, classes and functions with line-based regular expressions.
+
+    Used for languages without a registered summarizer, which get no details,
+    and by benchmarks/bench_summarizers.py as the baseline the registered
+    summarizers are compared against.
+    """
+    # Extract imports based on file type
+    imports = []
+    if file_ext in ['py']:
+        imports = re.findall(r'^import .*|^from .* import .*', content, re.MULTILINE)
+    elif file_ext in ['js', 'ts']:
+        imports = re.findall(r'^import .*|^const .* = require\(.*\)|^import .* from .*', content, re.MULTILINE)
+    elif file_ext in ['java']:
+        imports = re.findall(r'^import .*;', content, re.MULTILINE)
+    elif file_ext in ['go']:
+        imports = re.findall(r'^import \(.*?\)|^import ".*"', content, re.MULTILINE | re.DOTALL)
+
+    # Extract functions based on file type
+    functions = []
+    if file_ext in ['py']:
+        functions = re.findall(r'def .*\(.*\):', content, re.MULTILINE)
+    elif file_ext in ['js', 'ts']:
+        functions = re.findall(r'function .*\(.*\) {|const .* = \(.*\) =>|.*: function\(.*\)', content, re.MULTILINE)
+    elif file_ext in ['java', 'c', 'cpp', 'cs']:
+        functions = re.findall(r'(public|private|protected|static|\s) +[\w\<\>\[\]]+\s+(\w+) *\([^\)]*\) *(\{?|[^;])', content, re.MULTILINE)
+        functions = [' '.join(f).strip() for f in functions]
+    elif file_ext in ['go']:
+        functions = re.findall(r'func .*\(.*\).*{', content, re.MULTILINE)
+
+    # Extract classes based on file type
+    classes = []
+    if file_ext in ['py']:
+        classes = re.findall(r'class .*:', content, re.MULTILINE)
+    elif file_ext in ['js', 'ts']:
+        classes = re.findall(r'class .* {', content, re.MULTILINE)
+    elif file_ext in ['java', 'c', 'cpp', 'cs']:
+        classes = re.findall(r'(public|private|protected|static|\s) +(class|interface) +(\w+)', content, re.MULTILINE)
+        classes = [' '.join(c).strip() for c in classes]
+
+    return {'imports': imports, 'classes': classes, 'functions': functions}
+
+# ------------------ Summary formatting ------------------ #
+
+def summarize_file(file_path, content):
+    """
+    Summarize a file's content by extracting key components.
+    Adapts the level of detail based on file size and importance.
+
+    Args:
+        file_path: Path to the file
+        content: Content of the file
+
+    Returns:
+        A string summary of the file
+    """
+    # Determine file type
+    file_ext = file_path.split('.')[-1].lower() if '.' in file_path else ''
+
+    summarizer = SUMMARIZERS.get(file_ext)
+    details = summarizer(content) if summarizer else summarize_regex(file_ext, content)
+
+    return format_summary(file_path, file_ext, content, details)
+
+def format_summary(file_path, file_ext, content, details):
+    """
+    Render extracted file details in the summary format used for repository analysis.
+
+    Args:
+        file_path (str): Path to the file
+        file_ext (str): Lower-case file extension
+        content (str): Content of the file
+        details (dict): Lists of 'imports', 'classes', 'functions', 'routes' and 'auth'
+
+    Returns:
+        str: The file summary
+    """
+    # Initialize summary
+    summary = f"File: {file_path}\n"
+
+    # For very large files, be more selective
+    is_large_file = len(content) > 10000
+
+    sections = [
+        ("Imports", "imports", 5 if not is_large_file else 3),
+        ("Classes", "classes", 5 if not is_large_file else 3),
+        ("Functions", "functions", 10 if not is_large_file else 5),
+        ("Routes", "routes", 10 if not is_large_file else 5),
+        ("Auth", "auth", 5),
+    ]
+    for title, key, limit in sections:
+        items = details.get(key, [])
+        if items:
+            summary += f"{title}:\n" + "\n".join(items[:limit])
+            if len(items) > limit:
+                summary += f"\n... ({len(items) - limit} more {key})"
+            summary += "\n"
+
+    # For configuration files (JSON, YAML, etc.), try to extract key information
+    if file_ext in ['json', 'yaml', 'yml', 'toml', 'ini']:
+        # Just include a snippet of the beginning for config files
+        config_preview = content[:500] + ("..." if len(content) > 500 else "")
+        summary += "Configuration Content Preview:\n" + config_preview + "\n"
+
+    # For README or documentation files, include a brief excerpt
+    if 'readme' in file_path.lower() or file_ext in ['md', 'rst', 'txt']:
+        doc_preview = content[:300] + ("..." if len(content) > 300 else "")
+        summary += "Content Preview:\n" + doc_preview + "\n"
+
+    return summary
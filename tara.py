@@ -0,0 +1,391 @@
+"""
+Threat model applications from the command line, without the Streamlit UI.
+
+`run` models one application and `batch` models every application in a
+manifest on a worker pool. Each application gets its own directory in the
+output directory holding report.md and report.json. report.json is written
+last and doubles as the checkpoint: running a batch again skips applications
+whose report is complete and whose inputs, including the head commit of a
+GitHub repository, haven't changed, so an interrupted batch picks up where it
+stopped. Model responses also go in the on-disk response cache, so an
+application interrupted halfway doesn't pay again for the calls that had
+finished.
+
+API keys and endpoints are read from the same environment variables, or .env
+file, as the app.
+
+Usage:
+    python tara.py run --name shop --description-file shop.md [--output DIR]
+    python tara.py run --github-url https://github.com/owner/repo [--output DIR]
+    python tara.py batch manifest.json [--output DIR] [--workers N]
+
+A manifest is a JSON list, or JSON Lines, of applications such as
+    {"name": "shop", "description": "An online shop ...", "app_type": "Web application",
+     "authentication": ["OAUTH2"], "internet_facing": "Yes", "sensitive_data": "Confidential"}
+where "description_file", relative to the manifest, or "github_url" can be
+given instead of "description". Details left out take the app's defaults.
+"""
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+
+from dread import dread_json_to_markdown
+from github_repo import describe_repository, resolve_head_commit, DEFAULT_ANALYSIS_TOKEN_LIMIT, DEFAULT_FETCH_WORKERS
+from providers import ProviderConfig, PROVIDERS, AZURE_API_VERSION
+from report import build_report, REPORT_SECTIONS
+from response_cache import get_response_cache
+from threat_model import json_to_markdown
+
+# Environment variables holding each provider's API key, the same ones the app reads
+PROVIDER_API_KEY_ENV = {
+    "OpenAI API": "OPENAI_API_KEY",
+    "Anthropic API": "ANTHROPIC_API_KEY",
+    "Azure OpenAI Service": "AZURE_API_KEY",
+    "Google AI API": "GOOGLE_API_KEY",
+    "Mistral API": "MISTRAL_API_KEY",
+    "Groq API": "GROQ_API_KEY",
+}
+
+# Model used when --model isn't given, as selected by the app when switching provider
+DEFAULT_MODELS = {
+    "OpenAI API": "gpt-4o",
+    "Anthropic API": "claude-3-7-sonnet-latest",
+    "Google AI API": "gemini-2.0-flash",
+    "Mistral API": "mistral-large-latest",
+    "Groq API": "llama-3.3-70b-versatile",
+}
+
+# Application details a manifest entry doesn't give, the app's initial selections
+DEFAULT_APP_DETAILS = {
+    "app_type": "Web application",
+    "authentication": [],
+    "internet_facing": "Yes",
+    "sensitive_data": "Top Secret",
+}
+
+# Headings of the sections in report.md. The threat model's Markdown has its own.
+SECTION_TITLES = {
+    "attack_tree": "Attack Tree",
+    "mitigations": "Mitigations",
+    "dread_assessment": "DREAD Risk Assessment",
+    "test_cases": "Test Cases",
+}
+
+# Applications threat modelled at the same time by `batch`. Each one runs its sections in parallel too,
+# and the provider's rate limiter is shared by all of them.
+DEFAULT_BATCH_WORKERS = 4
+
+REPORT_FILE = "report.json"
+MARKDOWN_FILE = "report.md"
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+def get_provider_config(provider, model=None):
+    """
+    Build the provider config from the environment, as the app does from its sidebar.
+
+    Raises:
+        ValueError: If the provider needs an API key, model or endpoint that isn't set
+    """
+    if provider == "Azure OpenAI Service":
+        config = ProviderConfig(provider, model or os.getenv('AZURE_DEPLOYMENT_NAME'), api_key=os.getenv('AZURE_API_KEY'),
+                                endpoint=os.getenv('AZURE_API_ENDPOINT'), api_version=AZURE_API_VERSION)
+        if not config.endpoint:
+            raise ValueError("Set AZURE_API_ENDPOINT to use Azure OpenAI Service")
+    elif provider == "Ollama":
+        config = ProviderConfig(provider, model, endpoint=os.getenv('OLLAMA_ENDPOINT', 'http://localhost:11434'))
+    elif provider == "LM Studio Server":
+        config = ProviderConfig(provider, model, endpoint=os.getenv('LM_STUDIO_ENDPOINT', 'http://localhost:1234'))
+    else:
+        config = ProviderConfig(provider, model or DEFAULT_MODELS[provider], api_key=os.getenv(PROVIDER_API_KEY_ENV[provider]))
+
+    if provider in PROVIDER_API_KEY_ENV and not config.api_key:
+        raise ValueError(f"Set {PROVIDER_API_KEY_ENV[provider]} to use {provider}")
+    if not config.model:
+        raise ValueError(f"Give --model to use {provider}")
+    return config
+
+def load_manifest(path):
+    """
+    Read the applications of a batch from a JSON list or JSON Lines file.
+
+    Returns:
+        list: One dict per application, each with a unique "name"
+
+    Raises:
+        ValueError: If an entry has no description, its description file doesn't exist,
+            or a name is used twice
+    """
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    try:
+        apps = json.loads(text)
+    except json.JSONDecodeError:
+        apps = [json.loads(line) for line in text.splitlines() if line.strip()]
+    if isinstance(apps, dict):
+        # A JSON Lines manifest with a single application
+        apps = [apps]
+    if not isinstance(apps, list) or not all(isinstance(app, dict) for app in apps):
+        raise ValueError("The manifest must be a JSON list of applications, or one application per line")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    names = set()
+    for index, app in enumerate(apps):
+        if not any(app.get(key) for key in ("description", "description_file", "github_url")):
+            raise ValueError(f"Application {index + 1} needs a description, description_file or github_url")
+        if app.get("description_file"):
+            app["description_file"] = os.path.join(base_dir, app["description_file"])
+            if not os.path.isfile(app["description_file"]):
+                raise ValueError(f"The description file of application {index + 1} doesn't exist: {app['description_file']}")
+        app["name"] = app_name(app, index)
+        if app["name"] in names:
+            raise ValueError(f"The application name {app['name']!r} is used more than once")
+        names.add(app["name"])
+    return apps
+
+def app_name(app, index):
+    """Return a name usable as a directory name, from the entry's name, repository or description file, or its position."""
+    name = app.get("name")
+    if not name and app.get("github_url"):
+        name = app["github_url"].rstrip('/').split('/')[-1]
+    if not name and app.get("description_file"):
+        name = os.path.splitext(os.path.basename(app["description_file"]))[0]
+    return re.sub(r'[^A-Za-z0-9_.-]+', '-', name or f"app-{index + 1}").strip('-.') or f"app-{index + 1}"
+
+def get_github_api_key():
+    github_api_key = os.getenv('GITHUB_API_KEY')
+    if not github_api_key:
+        raise ValueError("Set GITHUB_API_KEY to analyse GitHub repositories")
+    return github_api_key
+
+def app_fingerprint(app, config, sections, threat_model_by_category):
+    """
+    Hash everything that decides an application's report, so a changed entry isn't skipped.
+
+    For a GitHub repository that includes the head commit of its default
+    branch, so a repository that has changed since its report is modelled again.
+
+    Raises:
+        OSError: If the description file can't be read
+        ValueError: If GITHUB_API_KEY isn't set for a GitHub repository
+        GithubException: If the repository's head commit can't be resolved
+    """
+    description_file = None
+    if app.get("description_file"):
+        with open(app["description_file"], encoding='utf-8') as f:
+            description_file = f.read()
+    commit = None
+    if app.get("github_url"):
+        commit = resolve_head_commit(app["github_url"], get_github_api_key())
+    key = {
+        "description": app.get("description"),
+        "description_file": description_file,
+        "github_url": app.get("github_url"),
+        "commit": commit,
+        "details": {name: app.get(name, default) for name, default in DEFAULT_APP_DETAILS.items()},
+        "provider": config.provider,
+        "model": config.model,
+        "sections": [section for section in REPORT_SECTIONS if section in sections],
+        "threat_model_by_category": threat_model_by_category,
+    }
+    return hashlib.sha256(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+def is_finished(directory, fingerprint):
+    """Whether the directory holds a complete report for these inputs."""
+    try:
+        with open(os.path.join(directory, REPORT_FILE), encoding='utf-8') as f:
+            report = json.load(f)
+    except (OSError, ValueError):
+        return False
+    return report.get("status") == "complete" and report.get("fingerprint") == fingerprint
+
+def describe_app(app, config, token_limit):
+    """Return the application description of a manifest entry, analysing its repository if it has one."""
+    parts = []
+    if app.get("github_url"):
+        parts.append(describe_repository(
+            app["github_url"],
+            get_github_api_key(),
+            token_limit=token_limit,
+            # Count tokens with the model's tokenizer where it is known, as the app does
+            token_estimation_model=config.model if config.provider == "OpenAI API" else "gpt-4o",
+            fetch_workers=DEFAULT_FETCH_WORKERS,
+            on_warning=lambda message: log(f"{app['name']}: {message}"),
+        ))
+    if app.get("description_file"):
+        with open(app["description_file"], encoding='utf-8') as f:
+            parts.append(f.read())
+    if app.get("description"):
+        parts.append(app["description"])
+    return "\n\n".join(parts)
+
+def render_markdown(report):
+    """Render a report as Markdown, one heading per section."""
+    lines = [f"# {report['name']}", "", f"Generated with {report['model']} ({report['provider']}).", ""]
+    for section, entry in report["sections"].items():
+        if section != "threat_model":
+            lines += [f"## {SECTION_TITLES[section]}", ""]
+        if entry.get("error"):
+            lines += [f"Error: {entry['error']}", ""]
+            continue
+        output = entry["output"]
+        if section == "threat_model":
+            lines.append(json_to_markdown(output.get("threat_model", []), output.get("improvement_suggestions", [])))
+        elif section == "attack_tree":
+            lines += ["```mermaid", output, "```", ""]
+        elif section == "dread_assessment":
+            lines += [dread_json_to_markdown(output), ""]
+        else:
+            lines += [output, ""]
+    return "\n".join(lines)
+
+def write_report(directory, report):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, MARKDOWN_FILE), 'w', encoding='utf-8') as f:
+        f.write(render_markdown(report))
+    # Written last and atomically, since its status marks the application as done
+    path = os.path.join(directory, REPORT_FILE)
+    with open(path + ".tmp", 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def model_app(app, config, args, cache, fingerprint):
+    """
+    Generate the report sections of one application and write them to its directory.
+
+    Returns:
+        dict: The report as written to report.json
+    """
+    start = time.monotonic()
+    report = {
+        "name": app["name"],
+        "fingerprint": fingerprint,
+        "provider": config.provider,
+        "model": config.model,
+        "status": "failed",
+        "sections": {},
+    }
+    try:
+        app_input = describe_app(app, config, args.token_limit)
+        details = {name: app.get(name, default) for name, default in DEFAULT_APP_DETAILS.items()}
+        report["sections"] = build_report(
+            config, details["app_type"], details["authentication"], details["internet_facing"], details["sensitive_data"],
+            app_input, sections=args.sections, cache=cache, store=cache, threat_model_by_category=args.by_category
+        )
+        if not any(entry.get("error") for entry in report["sections"].values()):
+            report["status"] = "complete"
+    except Exception as e:
+        report["error"] = str(e)
+    report["seconds"] = round(time.monotonic() - start, 1)
+    write_report(os.path.join(args.output, app["name"]), report)
+    return report
+
+def run_apps(apps, config, args, workers=1):
+    """
+    Threat model applications on a worker pool, skipping those with a complete report.
+
+    Returns:
+        int: The number of applications that failed
+    """
+    cache = None
+    if not args.no_cache:
+        try:
+            cache = get_response_cache("Disk")
+        except (OSError, sqlite3.Error) as e:
+            # Caching is best effort, e.g. the cache directory may not be writable
+            log(f"Not caching model responses: {e}")
+
+    pending = []
+    for app in apps:
+        try:
+            fingerprint = app_fingerprint(app, config, args.sections, args.by_category)
+        except Exception as e:
+            # Run it anyway, model_app records the error in the application's report if it persists
+            log(f"{app['name']}: can't check for a previous report: {e}")
+            fingerprint = None
+        if not args.force and fingerprint is not None and is_finished(os.path.join(args.output, app["name"]), fingerprint):
+            log(f"{app['name']}: already done, skipping")
+        else:
+            pending.append((app, fingerprint))
+
+    failures = 0
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="app")
+    try:
+        futures = {pool.submit(model_app, app, config, args, cache, fingerprint): app for app, fingerprint in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            report = future.result()
+            if report["status"] != "complete":
+                failures += 1
+                errors = [report.get("error")] + list(dict.fromkeys(
+                    entry["error"] for entry in report["sections"].values() if entry.get("error")
+                ))
+                log(f"[{done}/{len(pending)}] {report['name']}: failed after {report['seconds']}s: {'; '.join(filter(None, errors))}")
+            else:
+                log(f"[{done}/{len(pending)}] {report['name']}: done in {report['seconds']}s")
+    finally:
+        # On Ctrl-C, drop the applications that haven't started. Finished ones are already checkpointed.
+        pool.shutdown(wait=False, cancel_futures=True)
+    return failures
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tara", description=__doc__.strip().splitlines()[0])
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--provider', default="OpenAI API", choices=list(PROVIDERS), help='Model provider (default: %(default)s)')
+    common.add_argument('--model', help="Model, or the deployment name for Azure OpenAI. Defaults to the app's default for the provider.")
+    common.add_argument('--output', default="tara-reports", help='Directory the reports are written to (default: %(default)s)')
+    common.add_argument('--sections', nargs='+', choices=REPORT_SECTIONS, default=list(REPORT_SECTIONS), help='Report sections to generate (default: all)')
+    common.add_argument('--by-category', action='store_true', help='Generate the threat model with one call per STRIDE category')
+    common.add_argument('--token-limit', type=int, default=DEFAULT_ANALYSIS_TOKEN_LIMIT, help='Token budget of GitHub repository descriptions (default: %(default)s)')
+    common.add_argument('--no-cache', action='store_true', help="Don't reuse or store model responses in the on-disk response cache")
+    common.add_argument('--force', action='store_true', help='Regenerate applications that already have a complete report')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run = commands.add_parser('run', parents=[common], help='Threat model one application')
+    source = run.add_mutually_exclusive_group(required=True)
+    source.add_argument('--description', help='Application description')
+    source.add_argument('--description-file', help='File holding the application description')
+    source.add_argument('--github-url', help='GitHub repository to describe the application from')
+    run.add_argument('--name', help='Name of the application and its output directory')
+    run.add_argument('--app-type', default=DEFAULT_APP_DETAILS["app_type"])
+    run.add_argument('--authentication', nargs='*', default=DEFAULT_APP_DETAILS["authentication"])
+    run.add_argument('--internet-facing', default=DEFAULT_APP_DETAILS["internet_facing"], choices=["Yes", "No"])
+    run.add_argument('--sensitive-data', default=DEFAULT_APP_DETAILS["sensitive_data"])
+
+    batch = commands.add_parser('batch', parents=[common], help='Threat model every application in a manifest')
+    batch.add_argument('manifest', help='JSON list or JSON Lines file of applications')
+    batch.add_argument('--workers', type=int, default=DEFAULT_BATCH_WORKERS, help='Applications modelled at the same time (default: %(default)s)')
+    args = parser.parse_args(argv)
+
+    if os.path.exists('.env'):
+        load_dotenv('.env')
+    try:
+        config = get_provider_config(args.provider, args.model)
+        if args.command == 'run':
+            app = {
+                key: getattr(args, key)
+                for key in ("name", "description", "description_file", "github_url", *DEFAULT_APP_DETAILS)
+                if getattr(args, key) is not None
+            }
+            apps = [dict(app, name=app_name(app, 0))]
+            workers = 1
+        else:
+            apps = load_manifest(args.manifest)
+            workers = args.workers
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    failures = run_apps(apps, config, args, workers)
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,44 @@
+import time
+
+import hedging
+from providers import ProviderConfig, TaskResult, TaskSpec
+
+TASK = TaskSpec(name="threat_model", system_prompt="", json_output=True, stream_array_key="threat_model")
+
+
+class SlowStream:
+    """A stream that takes `seconds` to produce a complete response."""
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.result = TaskResult(output={"threat_model": []}, text="{}")
+
+    def __iter__(self):
+        end = time.monotonic() + self.seconds
+        while time.monotonic() < end:
+            time.sleep(0.01)
+            yield "chunk"
+
+
+def test_no_busy_wait_once_every_leg_has_started(monkeypatch):
+    monkeypatch.setattr(hedging, "stream_task", lambda task, config, prompt, cache=None: SlowStream(1.0))
+
+    real_wait = hedging.wait
+    calls = []
+
+    def counting_wait(*args, **kwargs):
+        calls.append(time.monotonic())
+        return real_wait(*args, **kwargs)
+
+    monkeypatch.setattr(hedging, "wait", counting_wait)
+
+    configs = [ProviderConfig("Test", "primary"), ProviderConfig("Test", "backup")]
+    start = time.monotonic()
+    result, config = hedging.run_hedged(TASK, configs, "prompt", hedge_after=0.1)
+
+    assert config.model == "primary"
+    assert not result.partial
+    # The backup starts after 0.1s. From then on the coordinator should block
+    # until a leg finishes rather than polling in a loop.
+    after_last_start = [called for called in calls if called > start + 0.2]
+    assert len(after_last_start) <= 2
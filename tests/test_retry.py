@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from providers import ProviderConfig, TaskSpec, run_task, stream_task, _build_result
+from retry import MalformedOutputError, RetryPolicy, RetryStats, classify_error, retry_call
+
+TASK = TaskSpec(name="threat_model", system_prompt="", json_output=True, stream_array_key="threat_model",
+                parse=json.loads)
+
+POLICY = RetryPolicy(max_attempts=4, base_delay=0, max_delay=0)
+
+
+def test_unsupported_provider_is_not_retried():
+    config = ProviderConfig("Unknown API", "model")
+    attempts = []
+
+    def attempt():
+        attempts.append(1)
+        for _ in stream_task(TASK, config, "prompt"):
+            pass
+
+    stats = RetryStats()
+    with pytest.raises(ValueError, match="Unsupported model provider"):
+        retry_call(attempt, POLICY, stats=stats, sleep=lambda seconds: None)
+    assert len(attempts) == 1
+    assert stats.stats()["retries"] == 0
+
+    with pytest.raises(ValueError, match="Unsupported model provider"):
+        run_task(TASK, config, "prompt", retry_policy=POLICY)
+
+
+def test_configuration_errors_are_not_retryable():
+    assert classify_error(ValueError("Set OPENAI_API_KEY")) == (False, None)
+    assert classify_error(KeyError("choices")) == (False, None)
+
+
+def test_unparseable_output_is_retryable():
+    with pytest.raises(MalformedOutputError) as excinfo:
+        _build_result(TASK, "not json at all", None)
+    assert classify_error(excinfo.value) == (True, None)
+    assert classify_error(json.JSONDecodeError("Expecting value", "", 0)) == (True, None)
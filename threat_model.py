@@ -1,26 +1,64 @@
-import json
-import requests
-from anthropic import Anthropic
-from mistralai import Mistral, UserMessage
-from openai import OpenAI, AzureOpenAI
-import streamlit as st
+import hashlib
 import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+
+from utils import create_reasoning_system_prompt, create_context_prompt, create_application_context
+from llm_clients import get_http_session
+from providers import ProviderConfig, TaskSpec, merge_results, parse_json_output, run_task, DEFAULT_TIMEOUT
+from hedging import run_hedged
+from rate_limit import get_rate_limiter
+from tokens import estimate_tokens
+
+# Rough token cost of one architecture diagram, reserved against the rate limit
+IMAGE_TOKEN_ESTIMATE = 1000
+
+# The STRIDE categories, in the order threat models list them
+STRIDE_CATEGORIES = (
+    "Spoofing",
+    "Tampering",
+    "Repudiation",
+    "Information Disclosure",
+    "Denial of Service",
+    "Elevation of Privilege",
+)
+
+# Threat IDs as assigned by threat_id(), e.g. "T-3f2a9c01"
+THREAT_ID_PATTERN = re.compile(r"\bT-[0-9a-f]{8}\b")
+
+# Function to derive a threat's ID from its content.
+# An unchanged threat keeps its ID when the threat model is regenerated, so results for it can be reused.
+def threat_id(threat):
+    material = "\n".join(
+        " ".join(str(threat.get(key, "")).split()).lower()
+        for key in ("Threat Type", "Scenario", "Potential Impact")
+    )
+    return "T-" + hashlib.sha256(material.encode("utf-8")).hexdigest()[:8]
 
-import google.generativeai as genai
-from groq import Groq
-from utils import process_groq_response, create_reasoning_system_prompt
+# Function to add an "ID" to every threat that doesn't have one yet
+def with_threat_ids(threats):
+    return [threat if threat.get("ID") else {**threat, "ID": threat_id(threat)} for threat in threats]
 
 # Function to convert JSON to Markdown for display.    
 def json_to_markdown(threat_model, improvement_suggestions):
     markdown_output = "## Threat Model\n\n"
     
+    # Threats with IDs get an ID column, so tasks built on the threat model can refer back to each threat
+    with_ids = any(threat.get("ID") for threat in threat_model)
+
     # Start the markdown table with headers
-    markdown_output += "| Threat Type | Scenario | Potential Impact |\n"
-    markdown_output += "|-------------|----------|------------------|\n"
+    if with_ids:
+        markdown_output += "| ID | Threat Type | Scenario | Potential Impact |\n"
+        markdown_output += "|----|-------------|----------|------------------|\n"
+    else:
+        markdown_output += "| Threat Type | Scenario | Potential Impact |\n"
+        markdown_output += "|-------------|----------|------------------|\n"
     
     # Fill the table rows with the threat model data
     for threat in threat_model:
-        markdown_output += f"| {threat['Threat Type']} | {threat['Scenario']} | {threat['Potential Impact']} |\n"
+        row = f"| {threat['Threat Type']} | {threat['Scenario']} | {threat['Potential Impact']} |\n"
+        markdown_output += f"| {threat.get('ID', '')} " + row if with_ids else row
     
     markdown_output += "\n\n## Improvement Suggestions\n\n"
     for suggestion in improvement_suggestions:
@@ -28,9 +66,10 @@ def json_to_markdown(threat_model, improvement_suggestions):
     
     return markdown_output
 
-# Function to create a prompt for generating a threat model
+# Function to create a prompt for generating a threat model.
+# The application details come first so other tasks on the same application can share a cached prefix.
 def create_threat_model_prompt(app_type, authentication, internet_facing, sensitive_data, app_input):
-    prompt = f"""
+    instructions = """
 Act as a cyber security expert with more than 20 years experience of using the STRIDE threat modelling methodology to produce comprehensive threat models for a wide range of applications. Your task is to analyze the provided code summary, README content, and application description to produce a list of specific threats for the application.
 
 Pay special attention to the README content as it often provides valuable context about the project's purpose, architecture, and potential security considerations.
@@ -49,27 +88,20 @@ Under "improvement_suggestions", include an array of strings that suggest what a
 
 Do not provide general security recommendations - focus only on what additional information would help create a better threat model.
 
-APPLICATION TYPE: {app_type}
-AUTHENTICATION METHODS: {authentication}
-INTERNET FACING: {internet_facing}
-SENSITIVE DATA: {sensitive_data}
-CODE SUMMARY, README CONTENT, AND APPLICATION DESCRIPTION:
-{app_input}
-
 Example of expected JSON response format:
   
-    {{
+    {
       "threat_model": [
-        {{
+        {
           "Threat Type": "Spoofing",
           "Scenario": "Example Scenario 1",
           "Potential Impact": "Example Potential Impact 1"
-        }},
-        {{
+        },
+        {
           "Threat Type": "Spoofing",
           "Scenario": "Example Scenario 2",
           "Potential Impact": "Example Potential Impact 2"
-        }},
+        },
         // ... more threats
       ],
       "improvement_suggestions": [
@@ -77,9 +109,51 @@ Example of expected JSON response format:
         "Consider adding information about how sensitive data is stored and transmitted to enable more precise data exposure threat analysis.",
         // ... more suggestions for improving the threat model input
       ]
+    }
+"""
+    return create_context_prompt(
+        create_application_context(app_type, authentication, internet_facing, sensitive_data, app_input),
+        instructions
+    )
+
+# Function to create a prompt for the threats of a single STRIDE category.
+# It shares its cached prefix, the application details, with the full threat model prompt.
+def create_threat_category_prompt(app_type, authentication, internet_facing, sensitive_data, app_input, category):
+    instructions = f"""
+Act as a cyber security expert with more than 20 years experience of using the STRIDE threat modelling methodology to produce comprehensive threat models for a wide range of applications. Your task is to analyze the provided code summary, README content, and application description to produce a list of specific {category} threats for the application.
+
+Pay special attention to the README content as it often provides valuable context about the project's purpose, architecture, and potential security considerations.
+
+Only consider the {category} category of STRIDE. List multiple (3 or 4) credible {category} threats if applicable. Each threat scenario should provide a credible scenario in which the threat could occur in the context of the application. It is very important that your responses are tailored to reflect the details you are given.
+
+When providing the threat model, use a JSON formatted response with the keys "threat_model" and "improvement_suggestions". Under "threat_model", include an array of objects with the keys "Threat Type", "Scenario", and "Potential Impact", where "Threat Type" is always "{category}".
+
+Under "improvement_suggestions", include an array of strings that suggest what additional information or details the user could provide to identify {category} threats more accurately in the next iteration. Do not provide general security recommendations.
+
+Example of expected JSON response format:
+
+    {{
+      "threat_model": [
+        {{
+          "Threat Type": "{category}",
+          "Scenario": "Example Scenario 1",
+          "Potential Impact": "Example Potential Impact 1"
+        }},
+        {{
+          "Threat Type": "{category}",
+          "Scenario": "Example Scenario 2",
+          "Potential Impact": "Example Potential Impact 2"
+        }}
+      ],
+      "improvement_suggestions": [
+        "Please provide more details about ..."
+      ]
     }}
 """
-    return prompt
+    return create_context_prompt(
+        create_application_context(app_type, authentication, internet_facing, sensitive_data, app_input),
+        instructions
+    )
 
 def create_image_analysis_prompt():
     prompt = """
@@ -133,29 +207,85 @@ def get_image_analysis(api_key, model_name, prompt, base64_image):
         "max_tokens": 4000
     }
 
-    response = requests.post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload)
+    # Image analysis shares the API key's rate limits with every other task
+    limiter = get_rate_limiter(ProviderConfig("OpenAI API", model_name, api_key=api_key))
+    reserved = 0
+    if limiter is not None:
+        reserved = limiter.acquire(estimate_tokens(prompt, model_name) + IMAGE_TOKEN_ESTIMATE + payload["max_tokens"])
 
-    # Log the response for debugging
+    # Tokens the request used, none unless a response comes back
+    used = 0
     try:
-        response.raise_for_status()  # Raise an HTTPError for bad responses
-        response_content = response.json()
-        return response_content
-    except requests.exceptions.HTTPError:
-        pass
-    except Exception:
-        pass
-    return None
-
-
-# Function to get threat model from the GPT response.
-def get_threat_model(api_key, model_name, prompt):
-    client = OpenAI(api_key=api_key)
-
-    # For reasoning models (o1, o3-mini), use a structured system prompt
-    if model_name in ["o1", "o3-mini"]:
-        system_prompt = create_reasoning_system_prompt(
-            task_description="Analyze the provided application description and generate a comprehensive threat model using the STRIDE methodology.",
-            approach_description="""1. Carefully read and understand the application description
+        response = get_http_session().post("https://api.openai.com/v1/chat/completions", headers=headers, json=payload,
+                                           timeout=DEFAULT_TIMEOUT)
+
+        # Log the response for debugging
+        try:
+            response.raise_for_status()  # Raise an HTTPError for bad responses
+            response_content = response.json()
+            used = response_content.get("usage", {}).get("total_tokens", reserved)
+            return response_content
+        except requests.exceptions.HTTPError:
+            pass
+        except Exception:
+            pass
+        return None
+    finally:
+        # Give back what the request didn't use, including when it failed or timed out
+        if limiter is not None:
+            limiter.settle(reserved, used)
+
+
+# Schema for threat model responses, used by LM Studio Server's structured output
+THREAT_MODEL_SCHEMA = {
+    "type": "json_schema",
+    "json_schema": {
+        "name": "threat_model_response",
+        "schema": {
+            "type": "object",
+            "properties": {
+                "threat_model": {
+                    "type": "array",
+                    "items": {
+                        "type": "object",
+                        "properties": {
+                            "Threat Type": {"type": "string"},
+                            "Scenario": {"type": "string"},
+                            "Potential Impact": {"type": "string"}
+                        },
+                        "required": ["Threat Type", "Scenario", "Potential Impact"]
+                    }
+                },
+                "improvement_suggestions": {
+                    "type": "array",
+                    "items": {"type": "string"}
+                }
+            },
+            "required": ["threat_model", "improvement_suggestions"]
+        }
+    }
+}
+
+# Function to check a parsed threat model against THREAT_MODEL_SCHEMA
+def is_valid_threat_model(output):
+    schema = THREAT_MODEL_SCHEMA["json_schema"]["schema"]
+    if not isinstance(output, dict) or any(key not in output for key in schema["required"]):
+        return False
+    threats = output["threat_model"]
+    required = schema["properties"]["threat_model"]["items"]["required"]
+    return (
+        isinstance(threats, list) and len(threats) > 0
+        and all(isinstance(threat, dict) and all(key in threat for key in required) for threat in threats)
+        and isinstance(output["improvement_suggestions"], list)
+    )
+
+# How every provider is asked for a threat model
+THREAT_MODEL_TASK = TaskSpec(
+    name="threat_model",
+    system_prompt="You are a helpful assistant designed to output JSON.",
+    reasoning_system_prompt=create_reasoning_system_prompt(
+        task_description="Analyze the provided application description and generate a comprehensive threat model using the STRIDE methodology.",
+        approach_description="""1. Carefully read and understand the application description
 2. For each component and data flow:
    - Identify potential Spoofing threats
    - Identify potential Tampering threats
@@ -168,340 +298,135 @@ def get_threat_model(api_key, model_name, prompt):
    - Analyze the potential impact
 4. Generate improvement suggestions based on identified threats
 5. Format the output as a JSON object with 'threat_model' and 'improvement_suggestions' arrays"""
-        )
-        # Create completion with max_completion_tokens for o1/o3-mini
-        response = client.chat.completions.create(
-            model=model_name,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            max_completion_tokens=4000
-        )
-    else:
-        system_prompt = "You are a helpful assistant designed to output JSON."
-        # Create completion with max_tokens for other models
-        response = client.chat.completions.create(
-            model=model_name,
-            response_format={"type": "json_object"},
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=4000
-        )
-
-    # Convert the JSON string in the 'content' field to a Python dictionary
-    response_content = json.loads(response.choices[0].message.content)
-
-    return response_content
-
-
-# Function to get threat model from the Azure OpenAI response.
-def get_threat_model_azure(azure_api_endpoint, azure_api_key, azure_api_version, azure_deployment_name, prompt):
-    client = AzureOpenAI(
-        azure_endpoint = azure_api_endpoint,
-        api_key = azure_api_key,
-        api_version = azure_api_version,
-    )
-
-    response = client.chat.completions.create(
-        model = azure_deployment_name,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-
-    # Convert the JSON string in the 'content' field to a Python dictionary
-    response_content = json.loads(response.choices[0].message.content)
-
-    return response_content
-
-
-# Function to get threat model from the Google response.
-def get_threat_model_google(google_api_key, google_model, prompt):
-    genai.configure(api_key=google_api_key)
-    model = genai.GenerativeModel(
-        google_model,
-        generation_config={"response_mime_type": "application/json"})
-    response = model.generate_content(
-        prompt,
-        safety_settings={
-            'DANGEROUS': 'block_only_high' # Set safety filter to allow generation of threat models
-        })
-    try:
-        # Access the JSON content from the 'parts' attribute of the 'content' object
-        response_content = json.loads(response.candidates[0].content.parts[0].text)
-    except json.JSONDecodeError:
-
-        return None
-
-    return response_content
-
-# Function to get threat model from the Mistral response.
-def get_threat_model_mistral(mistral_api_key, mistral_model, prompt):
-    client = Mistral(api_key=mistral_api_key)
-
-    response = client.chat.complete(
-        model = mistral_model,
-        response_format={"type": "json_object"},
-        messages=[
-            UserMessage(content=prompt)
-        ]
-    )
-
-    # Convert the JSON string in the 'content' field to a Python dictionary
-    response_content = json.loads(response.choices[0].message.content)
-
-    return response_content
-
-# Function to get threat model from Ollama hosted LLM.
-def get_threat_model_ollama(ollama_endpoint, ollama_model, prompt):
-    """
-    Get threat model from Ollama hosted LLM.
-    
-    Args:
-        ollama_endpoint (str): The URL of the Ollama endpoint (e.g., 'http://localhost:11434')
-        ollama_model (str): The name of the model to use
-        prompt (str): The prompt to send to the model
-        
-    Returns:
-        dict: The parsed JSON response from the model
-        
-    Raises:
-        requests.exceptions.RequestException: If there's an error communicating with the Ollama endpoint
-        json.JSONDecodeError: If the response cannot be parsed as JSON
-    """
-    if not ollama_endpoint.endswith('/'):
-        ollama_endpoint = ollama_endpoint + '/'
-    
-    url = ollama_endpoint + "api/generate"
-
-    system_prompt = "You are a helpful assistant designed to output JSON."
-    full_prompt = f"{system_prompt}\n\n{prompt}"
-
-    data = {
-        "model": ollama_model,
-        "prompt": full_prompt,
-        "stream": False,
-        "format": "json"
+    ),
+    parse=parse_json_output,
+    json_output=True,
+    local_response_schema=THREAT_MODEL_SCHEMA,
+    max_tokens=4000,
+    stream_array_key="threat_model",
+)
+
+# Scenarios whose words overlap at least this much (Jaccard similarity) are treated as the same threat.
+# High enough that short scenarios differing in a single word are kept apart.
+DUPLICATE_SCENARIO_SIMILARITY = 0.9
+
+# Function to drop threats whose scenario repeats an earlier one, e.g. the same attack listed under two categories
+def deduplicate_threats(threats):
+    kept = []
+    seen = []
+    for threat in threats:
+        words = set(re.findall(r"[a-z0-9]+", str(threat.get("Scenario", "")).lower()))
+        if words and any(len(words & other) / len(words | other) >= DUPLICATE_SCENARIO_SIMILARITY for other in seen):
+            continue
+        kept.append(threat)
+        seen.append(words)
+    return kept
+
+# Function to combine the threat models of several STRIDE categories, in order, into one
+def merge_threat_models(threat_models):
+    return {
+        "threat_model": deduplicate_threats(
+            [threat for threat_model in threat_models for threat in threat_model.get("threat_model", [])]
+        ),
+        "improvement_suggestions": list(dict.fromkeys(
+            suggestion for threat_model in threat_models for suggestion in threat_model.get("improvement_suggestions", [])
+            if isinstance(suggestion, str)
+        )),
     }
 
+# How every provider is asked for the threats of one STRIDE category
+THREAT_CATEGORY_TASK = TaskSpec(
+    name="threat_category",
+    system_prompt=THREAT_MODEL_TASK.system_prompt,
+    reasoning_system_prompt=create_reasoning_system_prompt(
+        task_description="Analyze the provided application description and identify the threats of one STRIDE category.",
+        approach_description="""1. Carefully read and understand the application description
+2. For each component and data flow, identify potential threats of the requested STRIDE category
+3. For each identified threat:
+   - Describe the specific scenario
+   - Analyze the potential impact
+4. Generate improvement suggestions for identifying threats of this category
+5. Format the output as a JSON object with 'threat_model' and 'improvement_suggestions' arrays"""
+    ),
+    parse=parse_json_output,
+    json_output=True,
+    local_response_schema=THREAT_MODEL_SCHEMA,
+    max_tokens=2000,
+    stream_array_key="threat_model",
+    merge=merge_threat_models,
+)
+
+# Function to get a threat model from the selected provider and model, see providers.ProviderConfig.
+def get_threat_model(config, prompt, cache=None):
+    return run_task(THREAT_MODEL_TASK, config, prompt, cache=cache).output
+
+# Function to get a threat model from the first of several providers to answer.
+# Backups are started when the primary is slow or fails, see hedging.run_hedged.
+def get_threat_model_hedged(configs, prompt, hedge_after=None, cache=None):
+    return run_hedged(THREAT_MODEL_TASK, configs, prompt, cache=cache, hedge_after=hedge_after,
+                      validate=is_valid_threat_model)
+
+# Function to generate the threats of several STRIDE categories, one model call per category, all at once.
+# Returns a dict mapping each category to its TaskResult, in the order given, with every threat's "Threat Type"
+# set to the category. on_category(category, result) is called from the calling thread as each category finishes.
+def get_threat_categories(config, categories, app_type, authentication, internet_facing, sensitive_data, app_input,
+                          cache=None, on_category=None):
+    categories = list(dict.fromkeys(categories))
+    if not categories:
+        return {}
+    results = {}
+    pool = ThreadPoolExecutor(max_workers=len(categories), thread_name_prefix="category")
     try:
-        response = requests.post(url, json=data, timeout=60)  # Add timeout
-        response.raise_for_status()  # Raise exception for bad status codes
-        outer_json = response.json()
-        
-        try:
-            # Parse the JSON response from the model's response field
-            inner_json = json.loads(outer_json['response'])
-            return inner_json
-        except (json.JSONDecodeError, KeyError):
-
-            raise
-            
-    except requests.exceptions.RequestException:
-
-        raise
-
-# Function to get threat model from the Claude response.
-def get_threat_model_anthropic(anthropic_api_key, anthropic_model, prompt):
-    client = Anthropic(api_key=anthropic_api_key)
-    
-    # Check if we're using Claude 3.7
-    is_claude_3_7 = "claude-3-7" in anthropic_model.lower()
-    
-    # Check if we're using extended thinking mode
-    is_thinking_mode = "thinking" in anthropic_model.lower()
-    
-    # If using thinking mode, use the actual model name without the "thinking" suffix
-    actual_model = "claude-3-7-sonnet-latest" if is_thinking_mode else anthropic_model
-    
-    try:
-        # For Claude 3.7, use a more explicit prompt structure
-        if is_claude_3_7:
-            # Add explicit JSON formatting instructions to the prompt
-            json_prompt = prompt + "\n\nIMPORTANT: Your response MUST be a valid JSON object with the exact structure shown in the example above. Do not include any explanatory text, markdown formatting, or code blocks. Return only the raw JSON object."
-            
-            # Configure the request based on whether thinking mode is enabled
-            if is_thinking_mode:
-                response = client.messages.create(
-                    model=actual_model,
-                    max_tokens=24000,
-                    thinking={
-                        "type": "enabled",
-                        "budget_tokens": 16000
-                    },
-                    system="You are a JSON-generating assistant. You must ONLY output valid, parseable JSON with no additional text or formatting.",
-                    messages=[
-                        {"role": "user", "content": json_prompt}
-                    ],
-                    timeout=600  # 10-minute timeout
-                )
-            else:
-                response = client.messages.create(
-                    model=actual_model,
-                    max_tokens=4096,
-                    system="You are a JSON-generating assistant. You must ONLY output valid, parseable JSON with no additional text or formatting.",
-                    messages=[
-                        {"role": "user", "content": json_prompt}
-                    ],
-                    timeout=300  # 5-minute timeout
-                )
-        else:
-            # Standard handling for other Claude models
-            response = client.messages.create(
-                model=actual_model,
-                max_tokens=4096,
-                system="You are a helpful assistant designed to output JSON. Your response must be a valid, parseable JSON object with no additional text, markdown formatting, or explanation. Do not include ```json code blocks or any other formatting - just return the raw JSON object.",
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                timeout=300  # 5-minute timeout
-            )
-        
-        # Combine all text blocks into a single string
-        if is_thinking_mode:
-            # For thinking mode, we need to extract only the text content blocks
-            full_content = ''.join(block.text for block in response.content if block.type == "text")
-            
-            # Store thinking content in session state for debugging/transparency (optional)
-            thinking_content = ''.join(block.thinking for block in response.content if block.type == "thinking")
-            if thinking_content:
-                st.session_state['last_thinking_content'] = thinking_content
-        else:
-            # Standard handling for regular responses
-            full_content = ''.join(block.text for block in response.content)
-        
-        # Parse the JSON response
-        try:
-            # Check for and fix common JSON formatting issues
-            if is_claude_3_7:
-                # Sometimes Claude 3.7 adds trailing commas which are invalid in JSON
-                full_content = full_content.replace(",\n  ]", "\n  ]").replace(",\n]", "\n]")
-                
-                # Sometimes it adds comments which are invalid in JSON
-                full_content = re.sub(r'//.*?\n', '\n', full_content)
-            
-            response_content = json.loads(full_content)
-            return response_content
-        except json.JSONDecodeError as e:
-            # Create a fallback response
-            fallback_response = {
+        futures = {
+            pool.submit(
+                run_task, THREAT_CATEGORY_TASK, config,
+                create_threat_category_prompt(app_type, authentication, internet_facing, sensitive_data, app_input, category),
+                cache,
+            ): category
+            for category in categories
+        }
+        for future in as_completed(futures):
+            category = futures[future]
+            result = future.result()
+            output = result.output if isinstance(result.output, dict) else {}
+            result.output = {
                 "threat_model": [
-                    {
-                        "Threat Type": "Error",
-                        "Scenario": "Failed to parse Claude response",
-                        "Potential Impact": "Unable to generate threat model"
-                    }
+                    {**threat, "Threat Type": category}
+                    for threat in output.get("threat_model", []) if isinstance(threat, dict)
                 ],
-                "improvement_suggestions": [
-                    "Try again - sometimes the model returns a properly formatted response on subsequent attempts",
-                    "Check the logs for detailed error information"
-                ]
+                "improvement_suggestions": output.get("improvement_suggestions", []),
             }
-            return fallback_response
-            
-    except Exception as e:
-        # Handle timeout and other errors
-        error_message = str(e)
-        st.error(f"Error with Anthropic API: {error_message}")
-        
-        # Create a fallback response for timeout or other errors
-        fallback_response = {
-            "threat_model": [
-                {
-                    "Threat Type": "Error",
-                    "Scenario": f"API Error: {error_message}",
-                    "Potential Impact": "Unable to generate threat model"
-                }
-            ],
-            "improvement_suggestions": [
-                "For complex applications, try simplifying the input or breaking it into smaller components",
-                "If you're using extended thinking mode and encountering timeouts, try the standard model instead",
-                "Consider reducing the complexity of the application description"
-            ]
-        }
-        return fallback_response
-
-# Function to get threat model from LM Studio Server response.
-def get_threat_model_lm_studio(lm_studio_endpoint, model_name, prompt):
-    client = OpenAI(
-        base_url=f"{lm_studio_endpoint}/v1",
-        api_key="not-needed"  # LM Studio Server doesn't require an API key
-    )
-
-    # Define the expected response structure
-    threat_model_schema = {
-        "type": "json_schema",
-        "json_schema": {
-            "name": "threat_model_response",
-            "schema": {
-                "type": "object",
-                "properties": {
-                    "threat_model": {
-                        "type": "array",
-                        "items": {
-                            "type": "object",
-                            "properties": {
-                                "Threat Type": {"type": "string"},
-                                "Scenario": {"type": "string"},
-                                "Potential Impact": {"type": "string"}
-                            },
-                            "required": ["Threat Type", "Scenario", "Potential Impact"]
-                        }
-                    },
-                    "improvement_suggestions": {
-                        "type": "array",
-                        "items": {"type": "string"}
-                    }
-                },
-                "required": ["threat_model", "improvement_suggestions"]
-            }
-        }
-    }
-
-    response = client.chat.completions.create(
-        model=model_name,
-        response_format=threat_model_schema,
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
-            {"role": "user", "content": prompt}
-        ],
-        max_tokens=4000,
-    )
-
-    # Convert the JSON string in the 'content' field to a Python dictionary
-    response_content = json.loads(response.choices[0].message.content)
-
-    return response_content
-
-# Function to get threat model from the Groq response.
-def get_threat_model_groq(groq_api_key, groq_model, prompt):
-    client = Groq(api_key=groq_api_key)
-
-    response = client.chat.completions.create(
-        model=groq_model,
-        response_format={"type": "json_object"},
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant designed to output JSON."},
-            {"role": "user", "content": prompt}
-        ]
-    )
-
-    # Process the response using our utility function
-    reasoning, response_content = process_groq_response(
-        response.choices[0].message.content,
-        groq_model,
-        expect_json=True
-    )
-    
-    # If we got reasoning, display it in an expander in the UI
-    if reasoning:
-        with st.expander("View model's reasoning process", expanded=False):
-            st.write(reasoning)
-
-    return response_content
\ No newline at end of file
+            results[category] = result
+            if on_category is not None:
+                on_category(category, result)
+    finally:
+        # Drop the calls that haven't started if one of them failed
+        pool.shutdown(wait=False, cancel_futures=True)
+    return {category: results[category] for category in categories}
+
+# Function to generate a whole threat model with one smaller model call per STRIDE category, all at once.
+# Returns a TaskResult with the same output as THREAT_MODEL_TASK: the categories' threats in STRIDE order,
+# without duplicates, and their improvement suggestions.
+def get_threat_model_by_category(config, app_type, authentication, internet_facing, sensitive_data, app_input,
+                                 cache=None, on_category=None):
+    results = get_threat_categories(config, STRIDE_CATEGORIES, app_type, authentication, internet_facing, sensitive_data,
+                                    app_input, cache=cache, on_category=on_category)
+    return merge_results(THREAT_CATEGORY_TASK, list(results.values()))
+
+# Function to find the STRIDE category a threat belongs to, or its own "Threat Type" if it isn't one of them
+def threat_category(threat):
+    threat_type = " ".join(str(threat.get("Threat Type", "")).split())
+    for category in STRIDE_CATEGORIES:
+        if threat_type.lower() == category.lower():
+            return category
+    return threat_type
+
+# Function to replace the threats of some STRIDE categories with newly generated ones.
+# Threats of every other category are kept as they are, IDs included, and the result is in STRIDE order.
+def replace_threat_categories(threats, new_threats, categories):
+    categories = set(categories)
+    kept = [threat for threat in threats if threat_category(threat) not in categories]
+    combined = kept + with_threat_ids(new_threats)
+    order = {category: index for index, category in enumerate(STRIDE_CATEGORIES)}
+    # sorted() is stable, so threats keep their order within a category
+    return sorted(combined, key=lambda threat: order.get(threat_category(threat), len(order)))
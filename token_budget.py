@@ -0,0 +1,241 @@
+import os
+import re
+
+from tokens import estimate_tokens_batch
+
+# File names (without extension) that usually hold an application's entry point or wiring
+ENTRY_POINT_NAMES = {
+    'main', 'app', 'index', 'server', 'application', 'program', 'startup',
+    'manage', 'wsgi', 'asgi', 'routes', 'urls', 'router'
+}
+
+# File names that usually hold configuration
+CONFIG_NAMES = {'package.json', 'config.json', 'settings.py', 'config.py', 'appsettings.json'}
+
+# Path fragments that point at security relevant code
+SECURITY_HINTS = (
+    'auth', 'login', 'session', 'token', 'password', 'crypto', 'security',
+    'permission', 'acl', 'middleware', 'oauth', 'jwt', 'secret'
+)
+
+# Path fragments that point at request handling code
+HANDLER_HINTS = ('route', 'api', 'controller', 'handler', 'view', 'endpoint', 'resolver')
+
+# Summary sections that can be trimmed when shrinking a summary
+SUMMARY_SECTIONS = (
+    'Imports:', 'Classes:', 'Functions:', 'Routes:', 'Auth:',
+    'Configuration Content Preview:', 'Content Preview:'
+)
+
+# Sections that hold free text previews rather than lists of items
+PREVIEW_SECTIONS = ('Configuration Content Preview:', 'Content Preview:')
+
+# Maximum items kept per section at each shrink level, None keeps the summary as is
+SHRINK_LEVELS = [
+    None,
+    {'Imports:': 2, 'Classes:': 3, 'Functions:': 4, 'Routes:': 5, 'Auth:': 3, 'preview': 150},
+    {'Imports:': 0, 'Classes:': 0, 'Functions:': 0, 'Routes:': 0, 'Auth:': 0, 'preview': 0},
+]
+
+# Share of a file's value kept at each shrink level
+SHRINK_VALUES = [1.0, 0.6, 0.25]
+
+_MORE_ITEMS_PATTERN = re.compile(r'^\.\.\. \((\d+) more \w+\)$')
+
+def file_importance(path):
+    """
+    Rank a file path for analysis order.
+
+    Args:
+        path (str): Repository-relative path of the file
+
+    Returns:
+        int: 0 for entry points and config, 1 for main source files, 2 for
+             other files and 3 for tests. Lower means more important.
+    """
+    if path.lower() in ['main.py', 'app.py', 'index.js', 'package.json', 'config.json']:
+        return 0
+    if 'test' in path.lower() or 'spec' in path.lower():
+        return 3
+    if path.endswith(('.py', '.js', '.ts', '.java', '.go')):
+        return 1
+    return 2
+
+def score_summary(path, summary):
+    """
+    Score how useful a file summary is for threat modelling.
+
+    Combines the file_importance ranking with entry point, configuration and
+    security signals from the path and summary, and slightly prefers files near
+    the repository root.
+
+    Args:
+        path (str): Repository-relative path of the file
+        summary (str): The file summary
+
+    Returns:
+        float: The score, higher is more useful
+    """
+    lowered = path.lower()
+    name = os.path.basename(lowered)
+    stem = name.rsplit('.', 1)[0]
+
+    score = {0: 10.0, 1: 4.0, 2: 2.0, 3: 0.5}[file_importance(path)]
+    if stem in ENTRY_POINT_NAMES:
+        score += 4
+    if name in CONFIG_NAMES:
+        score += 3
+    if any(hint in lowered for hint in SECURITY_HINTS):
+        score += 3
+    if any(hint in lowered for hint in HANDLER_HINTS):
+        score += 2
+
+    # Summaries that list routes or auth checks carry the most threat relevant detail
+    if '\nRoutes:\n' in summary or '\nAuth:\n' in summary:
+        score += 2
+
+    depth = lowered.count('/')
+    return score / (1 + 0.1 * depth)
+
+def _parse_summary(summary):
+    """Split a summary into its leading lines and a list of (header, items, total) sections."""
+    head = []
+    sections = []
+    for line in summary.split('\n'):
+        if line in SUMMARY_SECTIONS:
+            sections.append([line, [], 0])
+        elif not sections:
+            head.append(line)
+        else:
+            section = sections[-1]
+            more = _MORE_ITEMS_PATTERN.match(line)
+            if more and section[0] not in PREVIEW_SECTIONS:
+                section[2] += int(more.group(1))
+            elif line or section[0] in PREVIEW_SECTIONS:
+                section[1].append(line)
+                if section[0] not in PREVIEW_SECTIONS:
+                    section[2] += 1
+    return head, sections
+
+def shrink_summary(summary, level):
+    """
+    Produce a shorter version of a file summary.
+
+    Level 1 keeps only the first few imports, classes and functions, and level 2
+    keeps just the file name with a count of the items in each section.
+
+    Args:
+        summary (str): A summary produced by summarize_file
+        level (int): Index into SHRINK_LEVELS
+
+    Returns:
+        str: The shrunk summary
+    """
+    limits = SHRINK_LEVELS[level]
+    if limits is None:
+        return summary
+
+    head, sections = _parse_summary(summary)
+    lines = [line for line in head if line]
+    counts = []
+    for header, items, total in sections:
+        if header in PREVIEW_SECTIONS:
+            preview = '\n'.join(items).strip()[:limits['preview']]
+            if preview:
+                lines.append(header)
+                lines.append(preview + "...")
+            continue
+
+        limit = limits.get(header, 0)
+        if limit == 0:
+            counts.append(f"{total} {header[:-1].lower()}")
+            continue
+        lines.append(header)
+        lines.extend(items[:limit])
+        if total > limit:
+            lines.append(f"... ({total - limit} more {header[:-1].lower()})")
+
+    if counts:
+        lines.append("Contains: " + ", ".join(counts))
+    return '\n'.join(lines) + '\n'
+
+def _hull(variants):
+    """Drop variants that are never worth choosing (upper concave hull of value against tokens)."""
+    hull = [(0, 0.0, None)]
+    for tokens, value, level in sorted(variants):
+        if value <= hull[-1][1]:
+            continue
+        while len(hull) >= 2:
+            (t1, v1, _), (t2, v2, _) = hull[-2], hull[-1]
+            # Remove the middle point if it lies on or below the line to the new point
+            if (v2 - v1) * (tokens - t1) <= (value - v1) * (t2 - t1):
+                hull.pop()
+            else:
+                break
+        hull.append((tokens, value, level))
+    return hull
+
+def pack_summaries(candidates, token_budget, model="gpt-4o"):
+    """
+    Choose which file summaries to include, and at what level of detail, to get
+    the most value out of a token budget.
+
+    Every summary is offered at each shrink level and the choice is made with the
+    greedy solution to the multiple-choice knapsack problem: upgrades (none to
+    minimal, minimal to compact, compact to full) are applied in order of value
+    gained per token for as long as they fit. Unlike stopping at the first summary
+    that overflows, small important files still get in after a large one is skipped.
+
+    Args:
+        candidates (list): (path, summary) tuples, in priority order
+        token_budget (int): Maximum number of tokens the packed summaries may use
+        model (str): The model to use for token estimation
+
+    Returns:
+        tuple: (packed, stats)
+            - packed: (path, summary) tuples for the chosen summaries, in the original order
+            - stats: dict with 'tokens', 'full', 'shrunk' and 'omitted' counts
+    """
+    variants = []
+    for path, summary in candidates:
+        variants.append([shrink_summary(summary, level) for level in range(len(SHRINK_LEVELS))])
+
+    flat_tokens = iter(estimate_tokens_batch([text for texts in variants for text in texts], model))
+
+    steps = []
+    for index, (path, summary) in enumerate(candidates):
+        score = score_summary(path, summary)
+        options = [
+            (next(flat_tokens), score * SHRINK_VALUES[level], level)
+            for level in range(len(SHRINK_LEVELS))
+        ]
+        hull = _hull(options)
+        for step, ((t0, v0, _), (t1, v1, level)) in enumerate(zip(hull, hull[1:])):
+            steps.append(((v1 - v0) / max(t1 - t0, 1), index, step, t1 - t0, level))
+
+    # Best value per token first, ties broken by the original priority order
+    steps.sort(key=lambda item: (-item[0], item[1], item[2]))
+
+    chosen = {}
+    next_step = {}
+    used = 0
+    for _, index, step, tokens, level in steps:
+        # Upgrades for a file must be applied in order
+        if next_step.get(index, 0) != step or used + tokens > token_budget:
+            continue
+        used += tokens
+        chosen[index] = level
+        next_step[index] = step + 1
+
+    packed = [
+        (path, variants[index][chosen[index]])
+        for index, (path, _) in enumerate(candidates)
+        if index in chosen
+    ]
+    stats = {
+        'tokens': used,
+        'full': sum(1 for level in chosen.values() if level == 0),
+        'shrunk': sum(1 for level in chosen.values() if level != 0),
+        'omitted': len(candidates) - len(chosen),
+    }
+    return packed, stats
@@ -0,0 +1,130 @@
+import re
+from functools import lru_cache
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+# Encoding used for models tiktoken doesn't know about (e.g. Claude, Gemini, local models)
+DEFAULT_ENCODING = "o200k_base"
+
+# Split text into the pieces a BPE tokenizer typically emits as separate tokens:
+# letter runs, digit runs, single CJK characters, whitespace runs and punctuation
+_APPROX_TOKEN_PATTERN = re.compile(
+    r"[A-Za-z\u00c0-\u024f]+"
+    r"|\d+"
+    r"|[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af]"
+    r"|\s+"
+    r"|[^\sA-Za-z\d]"
+)
+
+@lru_cache(maxsize=64)
+def encoding_name_for_model(model):
+    """
+    Map a model name to its tiktoken encoding name.
+
+    Args:
+        model (str): The model name, e.g. 'gpt-4o' or 'o3-mini'
+
+    Returns:
+        str: The encoding name, falling back to DEFAULT_ENCODING for unknown models
+    """
+    if tiktoken is not None:
+        try:
+            return tiktoken.encoding_name_for_model(model)
+        except KeyError:
+            pass
+    return DEFAULT_ENCODING
+
+@lru_cache(maxsize=8)
+def get_encoder(encoding_name):
+    """
+    Load a tiktoken encoder once per process.
+
+    Loading an encoder parses a large BPE file (and downloads it on first use),
+    so it is cached here rather than rebuilt for every call. Failures are cached
+    too, so an offline deployment only pays for the failed load once.
+
+    Args:
+        encoding_name (str): The tiktoken encoding name
+
+    Returns:
+        tiktoken.Encoding: The encoder, or None if tiktoken is unavailable
+    """
+    if tiktoken is None:
+        return None
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception:
+        # tiktoken raises a variety of errors when the BPE file can't be fetched
+        return None
+
+def approximate_tokens(text):
+    """
+    Estimate the token count of text without a tokenizer.
+
+    Counts the pieces a BPE tokenizer would normally split on, which tracks
+    real token counts for code and non-English text much more closely than a
+    flat characters-per-token ratio.
+
+    Args:
+        text (str): The text to estimate tokens for
+
+    Returns:
+        int: Estimated token count
+    """
+    count = 0
+    for piece in _APPROX_TOKEN_PATTERN.findall(text):
+        first = piece[0]
+        if first.isspace():
+            # A single space is merged into the following word, longer runs
+            # (indentation, blank lines) are usually one token
+            if len(piece) > 1:
+                count += 1
+        elif first.isdigit():
+            # Digits are grouped in threes
+            count += (len(piece) + 2) // 3
+        elif first.isalpha() and len(piece) > 1:
+            # Common words are a single token, long identifiers split into several
+            count += (len(piece) + 5) // 6
+        else:
+            count += 1
+    return count
+
+def estimate_tokens(text, model="gpt-4o"):
+    """
+    Estimate the number of tokens in a text string.
+    Uses tiktoken for OpenAI models, or falls back to an offline approximation.
+
+    Args:
+        text: The text to estimate tokens for
+        model: The model to use for estimation (default: gpt-4o)
+
+    Returns:
+        Estimated token count
+    """
+    encoder = get_encoder(encoding_name_for_model(model))
+    if encoder is None:
+        return approximate_tokens(text)
+    # encode_ordinary treats special-token text such as <|endoftext|> as plain text
+    return len(encoder.encode_ordinary(text))
+
+def estimate_tokens_batch(texts, model="gpt-4o"):
+    """
+    Estimate token counts for many strings in one pass.
+
+    Args:
+        texts (list): The texts to estimate tokens for
+        model: The model to use for estimation (default: gpt-4o)
+
+    Returns:
+        list: Estimated token count for each text, in the same order
+    """
+    texts = list(texts)
+    if not texts:
+        return []
+    encoder = get_encoder(encoding_name_for_model(model))
+    if encoder is None:
+        return [approximate_tokens(text) for text in texts]
+    return [len(tokens) for tokens in encoder.encode_ordinary_batch(texts)]
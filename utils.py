@@ -1,5 +1,7 @@
 import re
-import json
+
+# Separates the context shared by several tasks from a task's own instructions, see split_context
+CONTEXT_END = "\n\n--- END OF CONTEXT ---\n"
 
 def extract_deepseek_reasoning(response_text):
     """
@@ -110,43 +112,6 @@ def clean_mermaid_syntax(code):
     
     return code
 
-def process_groq_response(response_text, model_name, expect_json=True):
-    """
-    Process a Groq API response, handling special cases for different models.
-    
-    Args:
-        response_text (str): The raw response text from the model
-        model_name (str): The name of the model used
-        expect_json (bool): Whether the response is expected to be JSON
-        
-    Returns:
-        tuple: (reasoning, processed_output)
-            - reasoning: The extracted reasoning if available, otherwise None
-            - processed_output: The processed final output (parsed JSON if expect_json=True)
-    """
-    reasoning = None
-    final_output = response_text
-    
-    # Handle DeepSeek R1 model's special case
-    if model_name == "deepseek-r1-distill-llama-70b":
-        reasoning, final_output = extract_deepseek_reasoning(response_text)
-    
-    # Process the final output based on whether we expect JSON
-    if expect_json:
-        try:
-            processed_output = json.loads(final_output)
-        except json.JSONDecodeError as e:
-            # If JSON parsing fails, return the raw text
-            processed_output = final_output
-    else:
-        # For non-JSON responses, check if it's a Mermaid diagram
-        if 'graph ' in final_output:
-            processed_output = extract_mermaid_code(final_output)
-        else:
-            processed_output = final_output
-    
-    return reasoning, processed_output
-
 def create_reasoning_system_prompt(task_description, approach_description):
     """
     Creates a system prompt formatted for OpenAI's reasoning models (o1, o3-mini).
@@ -161,4 +126,144 @@ def create_reasoning_system_prompt(task_description, approach_description):
     return f"""Task: {task_description}
 
 Approach:
-{approach_description}""" 
\ No newline at end of file
+{approach_description}""" 
+
+def create_context_prompt(context, instructions):
+    """
+    Build a prompt that starts with context shared by several tasks.
+
+    The large, stable part of a prompt goes first and is kept byte for byte
+    identical between tasks, so providers with prompt caching can reuse it
+    instead of processing it again for every task.
+
+    Args:
+        context (str): Context shared between tasks, e.g. the application description
+        instructions (str): What this particular task should do with the context
+
+    Returns:
+        str: The prompt, which split_context() can take apart again
+    """
+    return context.strip('\n') + CONTEXT_END + instructions
+
+def split_context(prompt):
+    """
+    Split a prompt built by create_context_prompt() into its two parts.
+
+    Returns:
+        tuple: (context, instructions), or (None, prompt) if the prompt has no shared context
+    """
+    # The instructions are fixed templates, so the last marker is the real one
+    context, marker, instructions = prompt.rpartition(CONTEXT_END)
+    if not marker:
+        return None, prompt
+    return context, instructions
+
+def create_application_context(app_type, authentication, internet_facing, sensitive_data, app_input):
+    """Describe the application, identically for every task that analyses it."""
+    return f"""APPLICATION TYPE: {app_type}
+AUTHENTICATION METHODS: {authentication}
+INTERNET FACING: {internet_facing}
+SENSITIVE DATA: {sensitive_data}
+CODE SUMMARY, README CONTENT, AND APPLICATION DESCRIPTION:
+{app_input}"""
+
+def create_threats_context(threats):
+    """List the threats from the threat model, identically for every task built on it."""
+    return f"""Below is the list of identified threats:
+{threats}"""
+
+def merge_markdown_tables(tables):
+    """
+    Merge Markdown tables with the same columns into one.
+
+    The first table is kept as it is, including any text around it. Only the
+    rows of the later tables are appended, after the first table's last row.
+    Outputs without a table are appended as they are.
+
+    Args:
+        tables (list): Markdown texts each containing a table, in order
+
+    Returns:
+        str: The merged Markdown
+    """
+    lines = None
+    insert_at = 0
+    extra = []
+    for text in tables:
+        text_lines = (text or "").strip().splitlines()
+        table_rows = [index for index, line in enumerate(text_lines) if line.lstrip().startswith('|')]
+        if lines is None:
+            if table_rows:
+                lines = text_lines
+                insert_at = table_rows[-1] + 1
+            else:
+                extra.append(text.strip())
+            continue
+        if not table_rows:
+            extra.append(text.strip())
+            continue
+        # Skip the header and separator rows the later tables repeat
+        rows = [text_lines[index] for index in table_rows]
+        if len(rows) >= 2 and set(rows[1].replace('|', '').strip()) <= set('-: '):
+            rows = rows[2:]
+        lines[insert_at:insert_at] = rows
+        insert_at += len(rows)
+    merged = "\n".join(lines) if lines is not None else ""
+    return "\n\n".join(part for part in [merged] + extra if part)
+
+def split_markdown_table(text, key_pattern):
+    """
+    Split a Markdown table into one table per row, keyed by the first match of a pattern in the row.
+
+    The reverse of merge_markdown_tables(): each part keeps the header, so
+    merging the parts again gives back the table.
+
+    Args:
+        text (str): Markdown containing a table
+        key_pattern (re.Pattern): Finds the key in a row, e.g. a threat ID
+
+    Returns:
+        list: (key, markdown) pairs in order. Rows without a key, and any text
+              outside the table, have None as their key.
+    """
+    lines = (text or "").strip().splitlines()
+    table_rows = [index for index, line in enumerate(lines) if line.lstrip().startswith('|')]
+    if len(table_rows) < 2 or not set(lines[table_rows[1]].replace('|', '').strip()) <= set('-: '):
+        return [(None, text)] if (text or "").strip() else []
+
+    header = lines[table_rows[0]] + "\n" + lines[table_rows[1]]
+    in_table = set(table_rows)
+    parts = []
+    for index in table_rows[2:]:
+        match = key_pattern.search(lines[index])
+        parts.append((match.group(0) if match else None, header + "\n" + lines[index]))
+    other = "\n".join(line for index, line in enumerate(lines) if index not in in_table).strip()
+    if other:
+        parts.append((None, other))
+    return parts
+
+def split_markdown_sections(text, key_pattern):
+    """
+    Split Markdown into sections, each starting at a line that contains a key.
+
+    Lines inside code blocks never start a section, so a key mentioned in a
+    code block stays with the section it belongs to.
+
+    Args:
+        text (str): Markdown, e.g. titled Gherkin test cases
+        key_pattern (re.Pattern): Finds the key in a line, e.g. a threat ID
+
+    Returns:
+        list: (key, markdown) pairs in order. Text before the first key has None as its key.
+    """
+    sections = [[None, []]]
+    in_code = False
+    for line in (text or "").splitlines():
+        if line.strip().startswith("```"):
+            in_code = not in_code
+        elif not in_code:
+            match = key_pattern.search(line)
+            if match:
+                sections.append([match.group(0), []])
+        sections[-1][1].append(line)
+    return [(key, "\n".join(lines).strip()) for key, lines in sections if "\n".join(lines).strip()]